@@ -1,21 +1,43 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
-import requests
+import io
 import json
 import time
-from config import API_KEY, API_URL,API_MODEL
+import uuid
+import hashlib
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+from config import FORMAT_CONFIG, GENERATE_CONFIG, JOB_CONFIG, WECHAT_CONFIG, METRICS_CONFIG, COMPRESSION_CONFIG
 import logging
-from utils.wechat import WeChatAPI
+from utils.wechat import get_wechat_api
 from utils.document import DocumentProcessor
 from utils.ai_generator import AIGenerator
+from utils.formatter import ArticleFormatter, FORMAT_MODES
+from utils.styler import LocalStyler
+from utils.incremental import IncrementalFormatter
+from utils.chunker import chunk_text
+from utils.cache import llm_cache
+from utils.jobs import JobManager
+from utils.summarizer import DocumentSummarizer
+from utils.batch import BatchGenerator
+from utils.oplog import OperationRecord, current_operation, operation_log, record_operation
+from utils.metrics import registry, REQUEST_SECONDS
+from utils.ratelimit import current_client, client_identity
+from utils.warmup import warmup
+from utils.compression import DecompressRequestMiddleware, DECODED_ENCODING_KEY, compressible, compress_body
+from utils.uploads import UploadRequest, read_upload
 
 app = Flask(__name__)
+# 上传的文件边接收边写入内存缓冲区；请求体（解压后）超过上限时在读取过程中中止
+app.request_class = UploadRequest
+app.config['MAX_CONTENT_LENGTH'] = COMPRESSION_CONFIG['MAX_REQUEST_BYTES']
+app.wsgi_app = DecompressRequestMiddleware(app.wsgi_app)
 
 # 配置 CORS，允许所有来源
 CORS(app, resources={
     r"/*": {
         "origins": "*",
-        "methods": ["GET", "POST", "OPTIONS"],
+        "methods": ["GET", "POST", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"]
     }
 })
@@ -24,40 +46,148 @@ CORS(app, resources={
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 初始化微信API
-wechat_api = WeChatAPI()
+@app.before_request
+def start_operation():
+    """为每个请求创建操作记录，沿用客户端传入的请求ID"""
+    g.operation = OperationRecord(
+        request.headers.get('X-Request-ID') or uuid.uuid4().hex,
+        request.method,
+        request.path
+    )
+    current_operation.set(g.operation)
+    current_client.set(client_identity(request.headers, request.remote_addr))
 
-def log_to_markdown(question, purpose):
-    """记录操作日志到markdown文件"""
-    with open("../log.md", "a", encoding="utf-8") as f:
-        log_entry = f"""
-**时间**：{time.strftime('%Y-%m-%d %H:%M:%S')}
+@app.before_request
+def check_request_body():
+    """请求体有误时直接返回错误，不进入接口：声明的长度超过上限时不读取请求体；压缩的请求体
+    （上传文件除外）在这里先解压读入，压缩数据有误或解压后超过上限时同样直接返回"""
+    try:
+        if request.content_length is not None and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+            raise RequestEntityTooLarge("请求体超过大小限制")
+        if request.environ.get(DECODED_ENCODING_KEY) and request.mimetype != 'multipart/form-data':
+            request.get_data()
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
 
-**问题描述**：{question}
+@app.after_request
+def finish_operation(response):
+    """响应发送完毕后统计接口耗时，并把操作记录交给后台线程写入日志，查询类请求不写日志"""
+    record = g.get('operation')
+    if record is None:
+        return response
 
-**目的**：{purpose}
+    response.headers['X-Request-ID'] = record.request_id
+    if METRICS_CONFIG['SERVER_TIMING'] and not response.is_streamed:
+        # 流式响应的响应头先于处理完成发送，无法附带耗时明细
+        response.headers['Server-Timing'] = record.server_timing()
 
----
-"""
-        f.write(log_entry)
+    method = request.method
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = response.status_code
+    write_log = method not in ('GET', 'HEAD', 'OPTIONS')
+    if write_log:
+        record.update(status=status, request_bytes=request.content_length)
+        if not response.is_streamed:
+            record.update(response_bytes=response.calculate_content_length())
 
-def chunk_text(text, max_length=2000):
-    """将长文本分块处理"""
-    sentences = text.split('。')
-    chunks = []
-    current_chunk = ''
-    
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) < max_length:
-            current_chunk += sentence + '。'
-        else:
-            chunks.append(current_chunk)
-            current_chunk = sentence + '。'
-    
-    if current_chunk:
-        chunks.append(current_chunk)
-    
-    return chunks
+    def on_close():
+        # 流式响应在全部发送后才关闭，此时记录的耗时包含整个流
+        REQUEST_SECONDS.observe(time.time() - record.started, method=method, endpoint=endpoint, status=status)
+        if write_log:
+            operation_log.write(record.to_dict())
+
+    response.call_on_close(on_close)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """按 Accept-Encoding 压缩响应；after_request 按注册的逆序执行，记录的响应大小为压缩后的大小"""
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+
+    body = response.get_data()
+    if not compressible(response.content_type, len(body)):
+        return response
+    response.vary.add('Accept-Encoding')
+    body, encoding = compress_body(body, request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def sse_event(event, data):
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def wants_stream(data):
+    """判断客户端是否请求流式返回"""
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+def stream_events(events):
+    """以SSE方式转发 (事件名, 数据) 事件，出错时发送 error 事件"""
+    def generate():
+        sent = 0
+        try:
+            for event, payload in events:
+                message = sse_event(event, payload)
+                sent += len(message.encode('utf-8'))
+                yield message
+        except Exception as e:
+            logger.error(f"流式排版出错: {str(e)}")
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            record_operation(response_bytes=sent)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 关闭反向代理缓冲，保证分块及时送达
+        }
+    )
+
+def stream_format(chunks, mode='llm'):
+    """以SSE方式逐块返回排版结果"""
+    def events():
+        yield from ArticleFormatter.format_chunks_stream(chunks, mode)
+        yield "done", {"total": len(chunks)}
+
+    return stream_events(events())
+
+def validate_format_request(data):
+    """检查排版请求的参数，有问题时返回错误信息"""
+    if not data:
+        return "请求数据为空"
+    content = data.get('content')
+    if not content or not content.strip():
+        return "请提供需要排版的文本"
+    if data.get('mode', 'llm') not in FORMAT_MODES:
+        return "不支持的排版模式"
+    return None
+
+def validate_generate_batch_request(data):
+    """检查批量生成请求的参数，有问题时返回错误信息"""
+    if not data:
+        return "请求数据为空"
+    prompts = data.get('prompts')
+    if not isinstance(prompts, list) or not prompts:
+        return "请提供文章主题列表"
+    if len(prompts) > GENERATE_CONFIG['MAX_BATCH_PROMPTS']:
+        return f"单次最多生成{GENERATE_CONFIG['MAX_BATCH_PROMPTS']}篇文章"
+    for i, prompt in enumerate(prompts):
+        if not isinstance(prompt, str) or not prompt.strip():
+            return f"第{i+1}个主题不能为空"
+    if data.get('format') is not None and data['format'] not in FORMAT_MODES:
+        return "不支持的排版模式"
+    return None
+
+def batch_format_mode(data):
+    """批量生成后的排版模式：发布到草稿箱时必须是HTML，未指定排版时使用本地排版"""
+    format_mode = data.get('format')
+    if data.get('publish') and not format_mode:
+        return 'local'
+    return format_mode
 
 @app.route('/format', methods=['POST'])
 def format_article():
@@ -65,110 +195,47 @@ def format_article():
     try:
         # 获取请求数据
         data = request.get_json()
-        if not data:
-            return jsonify({"error": "请求数据为空"}), 400
-            
-        content = data.get('content')
-        if not content or not content.strip():
-            return jsonify({"error": "请提供需要排版的文本"}), 400
-            
+        error = validate_format_request(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        content = data['content']
+        mode = data.get('mode', 'llm')
+
         # 记录日志
-        log_to_markdown(
-            question="文章排版请求",
-            purpose="将普通文本转换为微信公众号格式"
-        )
+        record_operation(operation="format", mode=mode, input_bytes=len(content.encode('utf-8')))
         
         logger.info(f"接收到的内容: {content[:100]}...") # 记录前100个字符用于调试
         
-        # 分块处理长文本
-        chunks = chunk_text(content)
-        formatted_chunks = []
-        
-        # 调用 DeepSeek API
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {API_KEY}"
-        }
-        
-        session = requests.Session()
-        retries = requests.adapters.Retry(
-            total=3,  # 最多重试3次
-            backoff_factor=1,  # 重试间隔
-            status_forcelist=[500, 502, 503, 504]  # 这些状态码会触发重试
-        )
-        session.mount('https://', requests.adapters.HTTPAdapter(max_retries=retries))
-        
-        for i, chunk in enumerate(chunks):
-            api_data = {
-                "model": API_MODEL,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": """你是一个专业的微信公众号排版专家。请按照以下规则对文章进行排版：
-1. 标题层级：
-   - 主标题使用24px，加粗，#333333
-   - 二级标题使用18px，加粗，#666666
-   - 三级标题使用16px，#888888
-2. 正文：
-   - 字体大小15px
-   - 行高1.75
-   - 颜色#333333
-3. 段落间距：
-   - 段落之间空一行
-   - 标题与正文之间留适当间距
-4. 特殊格式：
-   - 重要内容使用加粗标签
-   - 引用使用blockquote标签
-   - 列表使用ul/ol和li标签
-5. 图片：
-   - 图片使用img标签，宽度自适应
-   - 图片下方留适当的空白
-6. 超链接：
-   - 超链接使用a标签，颜色#1E9FFF
-7. 代码：
-   - 代码使用pre标签，字体大小14px，#888888
-   - 代码块使用code标签，字体大小14px，#888888
-8. 表格：
-   - 表格使用table标签
-   - 表头使用thead标签
-   - 表体使用tbody标签
-   - 单元格使用td标签
-9. 其他：
-   - 保持原文的意思，只对原文进行排版，不要添加任何新的内容
-  
-
-请将输入的文本转换为带有适当HTML标签和样式的格式。保持文章的整体结构清晰，视觉层次分明。
-
-注意：这是文章的第 {current} 部分，共 {total} 部分。请保持格式一致性。""".format(
-                            current=i+1, 
-                            total=len(chunks)
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": chunk
-                    }
-                ],
-                "temperature": 0.6
-            }
-            
+        doc_id = data.get('doc_id')
+        if doc_id:
+            # 增量排版：只重新排版有变化的分块，返回相对于客户端当前版本的补丁
+            revision = data.get('revision')
+            if wants_stream(data):
+                return stream_events(IncrementalFormatter.format_stream(doc_id, revision, content, mode))
             try:
-                response = session.post(
-                    API_URL,
-                    headers=headers,
-                    json=api_data,
-                    timeout=(10, 120)
-                )
-                
-                result = response.json()
-                if "choices" in result and len(result["choices"]) > 0:
-                    formatted_chunks.append(result["choices"][0]["message"]["content"])
-                else:
-                    raise Exception("AI返回结果格式错误")
-                    
+                return jsonify(IncrementalFormatter.format(doc_id, revision, content, mode))
             except Exception as e:
-                logger.error(f"处理第{i+1}块文本时出错: {str(e)}")
-                return jsonify({"error": f"处理第{i+1}块文本时出错"}), 500
+                logger.error(f"{str(e)}: {str(e.__cause__)}")
+                return jsonify({"error": str(e)}), 500
+
+        if mode == 'local':
+            # 本地样式引擎无需调用AI，整篇一次渲染
+            if wants_stream(data):
+                return stream_format([content], mode)
+            return jsonify(LocalStyler.render(content))
+
+        # 分块处理长文本，并发调用 DeepSeek API
+        chunks = chunk_text(content, FORMAT_CONFIG['CHUNK_MAX_TOKENS'])
+        record_operation(chunks=len(chunks))
+        if wants_stream(data):
+            return stream_format(chunks, mode)
+
+        try:
+            formatted_chunks = ArticleFormatter.format_chunks(chunks, mode)
+        except Exception as e:
+            logger.error(f"{str(e)}: {str(e.__cause__)}")
+            return jsonify({"error": str(e)}), 500
 
         # 合并处理结果
         formatted_text = "\n".join(formatted_chunks)
@@ -178,55 +245,66 @@ def format_article():
         logger.error(f"处理请求错误: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+FILE_INSTRUCTION = "请分析以下PDF文档内容并生成一篇公众号文章："
+URL_INSTRUCTION = "请分析以下内容并生成一篇公众号文章："
+
+def analyze_file(file, on_stage=None):
+    """分析上传的文件并生成文章"""
+    result = DocumentProcessor.process_uploaded_file(file)
+    
+    # 记录日志
+    record_operation(operation="analyze_file", filename=result['filename'], text_chars=len(result['text']))
+    
+    # 调用AI生成文章摘要，长文档先分块提炼要点再合并
+    summary = DocumentSummarizer.generate_article(
+        result['text'],
+        FILE_INSTRUCTION,
+        on_stage=on_stage
+    )
+    
+    return {
+        "success": True,
+        "content": summary,
+        "message": f"已成功分析文件：{result['filename']}（{result['size']}）"
+    }
+
+def analyze_url(url, on_stage=None):
+    """分析URL内容并生成文章"""
+    result = DocumentProcessor.download_and_process_file(url)
+    
+    # 记录日志
+    record_operation(operation="analyze_url", url=url, text_chars=len(result['text']))
+    
+    # 调用AI生成文章摘要，长文档先分块提炼要点再合并
+    summary = DocumentSummarizer.generate_article(
+        result['text'],
+        URL_INSTRUCTION,
+        on_stage=on_stage
+    )
+    
+    return {
+        "success": True,
+        "content": summary,
+        "message": f"已成功分析URL内容"
+    }
+
 @app.route('/analyze', methods=['POST'])
 def analyze_document():
     """分析文档并生成文章"""
     try:
         if 'file' in request.files:
             # 处理文件上传
-            file = request.files['file']
-            result = DocumentProcessor.process_uploaded_file(file)
-            
-            # 记录日志
-            log_to_markdown(
-                question="PDF文件分析",
-                purpose=f"分析文件：{result['filename']}（{result['size']}）"
-            )
-            
-            # 调用AI生成文章摘要
-            prompt = f"请分析以下PDF文档内容并生成一篇公众号文章：\n\n{result['text']}"
-            summary = AIGenerator.generate_article(prompt)
-            
-            return jsonify({
-                "success": True,
-                "content": summary,
-                "message": f"已成功分析文件：{result['filename']}（{result['size']}）"
-            })
-            
+            return jsonify(analyze_file(request.files['file']))
         else:
             # 处理URL
             data = request.get_json()
             if not data or 'url' not in data:
-                return jsonify({"error": "请提供PDF文件或URL"}), 400
+                return jsonify({"error": "请提供PDF、Word文件或URL"}), 400
                 
-            result = DocumentProcessor.download_and_process_file(data['url'])
-            
-            # 记录日志
-            log_to_markdown(
-                question="URL内容分析",
-                purpose=f"分析URL：{data['url']}"
-            )
-            
-            # 调用AI生成文章摘要
-            prompt = f"请分析以下内容并生成一篇公众号文章：\n\n{result['text']}"
-            summary = AIGenerator.generate_article(prompt)
-            
-            return jsonify({
-                "success": True,
-                "content": summary,
-                "message": f"已成功分析URL内容"
-            })
+            return jsonify(analyze_url(data['url']))
 
+    except RequestEntityTooLarge as e:
+        return jsonify({"success": False, "error": e.description}), 413
     except Exception as e:
         logger.error(f"文档分析错误: {str(e)}")
         return jsonify({
@@ -243,12 +321,37 @@ def generate_article():
             return jsonify({"error": "请提供文章主题或关键词"}), 400
 
         prompt = data['prompt']
+        record_operation(operation="generate", input_bytes=len(prompt.encode('utf-8')))
         content = AIGenerator.generate_article(prompt)
         return jsonify({"content": content})
 
     except Exception as e:
         logger.error(f"文章生成错误: {str(e)}")
         return jsonify({"error": str(e)}), 500
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """批量生成文章，可选生成后排版并保存到草稿箱；每篇文章完成后即可流式返回"""
+    try:
+        data = request.get_json()
+        error = validate_generate_batch_request(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        prompts = data['prompts']
+        format_mode = batch_format_mode(data)
+        publisher = (lambda title, content: get_wechat_api().add_draft(title, content)) if data.get('publish') else None
+        record_operation(operation="generate_batch", prompts=len(prompts), format=format_mode, publish=bool(publisher))
+
+        events = BatchGenerator.generate_stream(prompts, data.get('context'), format_mode, publisher)
+        if wants_stream(data):
+            return stream_events(events)
+        return jsonify(BatchGenerator.collect(events))
+
+    except Exception as e:
+        logger.error(f"批量生成错误: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/publish', methods=['POST'])
 def publish_to_wechat():
     """发布到微信公众号草稿箱"""
@@ -267,14 +370,11 @@ def publish_to_wechat():
             return jsonify({"error": "文章内容不能为空"}), 400
 
         # 记录日志
-        log_to_markdown(
-            question="发布文章到微信公众号",
-            purpose=f"将文章《{title}》发布到微信公众号草稿箱"
-        )
+        record_operation(operation="publish", title=title, input_bytes=len(content.encode('utf-8')))
 
         try:
             # 发布到草稿箱，传递摘要参数
-            media_id = wechat_api.add_draft(title, content, digest=digest)
+            media_id = get_wechat_api().add_draft(title, content, digest=digest)
             return jsonify({
                 "success": True,
                 "media_id": media_id,
@@ -291,5 +391,186 @@ def publish_to_wechat():
         logger.error(f"处理发布请求失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/publish/batch', methods=['POST'])
+def publish_batch_to_wechat():
+    """批量发布到微信公众号草稿箱，多篇文章合并为多图文草稿"""
+    try:
+        data = request.get_json()
+        if not data or not data.get('articles'):
+            return jsonify({"error": "请提供需要发布的文章列表"}), 400
+
+        articles = data['articles']
+        if not isinstance(articles, list):
+            return jsonify({"error": "请提供需要发布的文章列表"}), 400
+        if len(articles) > WECHAT_CONFIG['MAX_BATCH_ARTICLES']:
+            return jsonify({"error": f"单次最多发布{WECHAT_CONFIG['MAX_BATCH_ARTICLES']}篇文章"}), 400
+
+        for i, article in enumerate(articles):
+            if not isinstance(article, dict):
+                return jsonify({"error": f"第{i+1}篇文章格式不正确"}), 400
+            if not article.get('title'):
+                return jsonify({"error": f"第{i+1}篇文章标题不能为空"}), 400
+            if not article.get('content'):
+                return jsonify({"error": f"第{i+1}篇文章内容不能为空"}), 400
+
+        # 记录日志
+        record_operation(operation="publish_batch", articles=len(articles))
+
+        try:
+            drafts = get_wechat_api().add_drafts(articles)
+            return jsonify({
+                "success": True,
+                "drafts": drafts,
+                "message": f"{len(articles)}篇文章已保存为{len(drafts)}个草稿"
+            })
+        except Exception as e:
+            logger.error(f"批量发布到微信失败: {str(e)}")
+            return jsonify({
+                "success": False,
+                "error": f"发布失败: {str(e)}"
+            }), 500
+
+    except Exception as e:
+        logger.error(f"处理批量发布请求失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def run_format_job(job, payload):
+    """后台排版任务：逐块汇报进度，取消后停止剩余分块"""
+    mode = payload.get('mode', 'llm')
+    if mode == 'local':
+        return LocalStyler.render(payload['content'])
+
+    chunks = chunk_text(payload['content'], FORMAT_CONFIG['CHUNK_MAX_TOKENS'])
+    formatted_chunks = [None] * len(chunks)
+    job.report(stage="format", current=0, total=len(chunks))
+
+    events = ArticleFormatter.format_chunks_stream(chunks, mode)
+    try:
+        for event, data in events:
+            if event == "chunk":
+                formatted_chunks[data["index"]] = data["content"]
+            elif event == "progress":
+                job.report(**data)
+            else:
+                job.check_cancelled()
+    finally:
+        events.close()
+
+    return "\n".join(formatted_chunks)
+
+def run_analyze_job(job, payload):
+    """后台文档分析任务"""
+    on_stage = lambda stage: job.report(stage=stage)
+    job.report(stage="extract")
+    if 'file' in payload:
+        file = FileStorage(stream=io.BytesIO(payload['file']), filename=payload['filename'])
+        return analyze_file(file, on_stage=on_stage)
+    return analyze_url(payload['url'], on_stage=on_stage)
+
+job_manager = JobManager(max_workers=JOB_CONFIG['MAX_WORKERS'], result_ttl=JOB_CONFIG['RESULT_TTL'])
+job_manager.register('format', run_format_job)
+job_manager.register('analyze', run_analyze_job)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """提交后台任务，立即返回任务ID"""
+    try:
+        if 'file' in request.files:
+            # 上传文件的分析任务
+            file = request.files['file']
+            file_bytes = read_upload(file)
+            kind = 'analyze'
+            payload = {'file': file_bytes, 'filename': file.filename}
+            dedupe_key = hashlib.sha256(file_bytes).hexdigest()
+        else:
+            data = request.get_json()
+            if not data:
+                return jsonify({"error": "请求数据为空"}), 400
+
+            kind = data.get('type')
+            if kind == 'format':
+                content = data.get('content')
+                if not content or not content.strip():
+                    return jsonify({"error": "请提供需要排版的文本"}), 400
+                mode = data.get('mode', 'llm')
+                if mode not in FORMAT_MODES:
+                    return jsonify({"error": "不支持的排版模式"}), 400
+                payload = {'content': content, 'mode': mode}
+                dedupe_key = hashlib.sha256(f"{mode}:{content}".encode('utf-8')).hexdigest()
+            elif kind == 'analyze':
+                if not data.get('url'):
+                    return jsonify({"error": "请提供PDF、Word文件或URL"}), 400
+                payload = {'url': data['url']}
+                dedupe_key = hashlib.sha256(data['url'].encode('utf-8')).hexdigest()
+            else:
+                return jsonify({"error": "不支持的任务类型"}), 400
+
+        job = job_manager.submit(kind, payload, dedupe_key=dedupe_key)
+        record_operation(operation=f"job_{kind}", job_id=job.id)
+        return jsonify(job.to_dict()), 202
+
+    except RequestEntityTooLarge as e:
+        return jsonify({"error": e.description}), 413
+    except Exception as e:
+        logger.error(f"提交任务失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询任务状态和结果"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消任务"""
+    job = job_manager.cancel(job_id)
+    if not job:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """以SSE方式推送任务进度，任务结束后关闭"""
+    if not job_manager.get(job_id):
+        return jsonify({"error": "任务不存在"}), 404
+
+    def generate():
+        for snapshot in job_manager.events(job_id):
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield sse_event(snapshot["status"], snapshot)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """就绪检查：预热完成前返回503；启动入口未执行预热时（如开发服务器）在此触发"""
+    warmup.start()
+    status = warmup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus格式的监控指标"""
+    if not METRICS_CONFIG['ENABLED']:
+        return jsonify({"error": "监控指标未开启"}), 404
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """查看AI响应缓存的命中统计"""
+    return jsonify(llm_cache.stats())
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
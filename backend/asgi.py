@@ -0,0 +1,357 @@
+"""异步服务模式（ASGI）
+
+排版、生成和分析接口在事件循环中处理：AI请求和URL下载使用异步HTTP客户端，等待上游时
+不占用线程，单个进程可以同时处理数百个排版请求；PDF解析、网页正文提取、本地排版等
+CPU密集的处理放到线程池中执行。其余接口（发布、后台任务、监控等）交给原有的Flask应用，
+在独立的线程池中处理。
+
+启动：python serve.py（生产环境），或 uvicorn asgi:app --port 5000（开发调试）
+"""
+import time
+import uuid
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, Mount
+from a2wsgi import WSGIMiddleware
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+from config import FORMAT_CONFIG, METRICS_CONFIG, SERVER_CONFIG, COMPRESSION_CONFIG
+from app import (
+    app as flask_app, sse_event, validate_format_request, validate_generate_batch_request, batch_format_mode,
+    FILE_INSTRUCTION, URL_INSTRUCTION
+)
+from utils.ai_generator import AIGenerator
+from utils.batch import BatchGenerator
+from utils.async_http import async_http_client
+from utils.chunker import chunk_text
+from utils.document import DocumentProcessor
+from utils.formatter import ArticleFormatter
+from utils.incremental import IncrementalFormatter
+from utils.styler import LocalStyler
+from utils.wechat import get_wechat_api
+from utils.summarizer import DocumentSummarizer
+from utils.oplog import OperationRecord, current_operation, operation_log, record_operation
+from utils.metrics import REQUEST_SECONDS
+from utils.ratelimit import current_client, client_identity
+from utils.warmup import warmup
+from utils.compression import BodyDecoder, request_encodings, compressible, compress_body
+from utils.uploads import aread_upload
+
+logger = logging.getLogger(__name__)
+
+
+def error_response(message, status):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+async def read_json(request):
+    """读取JSON请求体，内容为空或格式错误时返回None
+
+    请求体超过大小限制或解压失败时抛出 HTTPException，由调用方返回对应的状态码。
+    """
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def wants_stream(request, data):
+    """判断客户端是否请求流式返回"""
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('accept', '')
+
+
+def limited_request(request, encoding):
+    """请求体逐块解压，读取过程中（解压后的）大小超过上限时抛出 RequestEntityTooLarge"""
+    limit = COMPRESSION_CONFIG['MAX_REQUEST_BYTES']
+    decoder = BodyDecoder(encoding, limit) if encoding else None
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message['type'] != 'http.request':
+            return message
+        body = message.get('body', b'')
+        if decoder is not None:
+            body = decoder.decode(body)
+            if not message.get('more_body'):
+                decoder.finish()
+            return dict(message, body=body)
+        received += len(body)
+        if received > limit:
+            raise RequestEntityTooLarge("请求体超过大小限制")
+        return message
+
+    scope = request.scope
+    if decoder is not None:
+        headers = [(k, v) for k, v in scope['headers'] if k not in (b'content-encoding', b'content-length')]
+        scope = dict(scope, headers=headers)
+    return Request(scope, receive)
+
+
+async def prepare_request(request):
+    """与Flask应用的 DecompressRequestMiddleware、check_request_body 相同，返回 (请求, 错误响应)"""
+    encoding = request.headers.get('content-encoding', '').strip().lower()
+    if encoding == 'identity':
+        encoding = ''
+    if encoding and encoding not in request_encodings():
+        return request, error_response(f"不支持的请求体编码: {encoding}", 415)
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > COMPRESSION_CONFIG['MAX_REQUEST_BYTES']:
+        return request, error_response("请求体超过大小限制", 413)
+
+    request = limited_request(request, encoding)
+    if encoding and not request.headers.get('content-type', '').startswith('multipart/form-data'):
+        try:
+            await request.body()
+        except HTTPException as e:
+            return request, error_response(e.description, e.code)
+    return request, None
+
+
+def compress_response(request, response):
+    """按 Accept-Encoding 压缩非流式响应"""
+    if 'content-encoding' in response.headers or not compressible(response.headers.get('content-type'), len(response.body)):
+        return
+    response.headers.add_vary_header('Accept-Encoding')
+    body, encoding = compress_body(response.body, request.headers.get('accept-encoding'))
+    if encoding:
+        response.body = body
+        response.headers['content-encoding'] = encoding
+        response.headers['content-length'] = str(len(body))
+
+
+def tracked(endpoint):
+    """与Flask应用的 before_request/after_request 相同：创建操作记录，响应发送完毕后统计耗时并写日志"""
+    async def handler(request):
+        record = OperationRecord(
+            request.headers.get('x-request-id') or uuid.uuid4().hex,
+            request.method,
+            request.url.path
+        )
+        current_operation.set(record)
+        current_client.set(client_identity(request.headers, request.client.host if request.client else None))
+        request, response = await prepare_request(request)
+        if response is None:
+            response = await endpoint(request)
+
+        response.headers['X-Request-ID'] = record.request_id
+        streamed = isinstance(response, StreamingResponse)
+        if not streamed:
+            compress_response(request, response)
+        if METRICS_CONFIG['SERVER_TIMING'] and not streamed:
+            response.headers['Server-Timing'] = record.server_timing()
+
+        method = request.method
+        status = response.status_code
+        content_length = request.headers.get('content-length')
+        record.update(status=status, request_bytes=int(content_length) if content_length else None)
+        if not streamed:
+            record.update(response_bytes=len(response.body))
+
+        def on_close():
+            REQUEST_SECONDS.observe(time.time() - record.started, method=method, endpoint=request.url.path, status=status)
+            operation_log.write(record.to_dict())
+
+        response.background = BackgroundTask(on_close)
+        return response
+
+    return handler
+
+
+def stream_events(events):
+    """以SSE方式转发异步产出的 (事件名, 数据) 事件，出错时发送 error 事件
+
+    客户端断开时Starlette取消发送任务，事件源随之关闭并取消尚未完成的分块。
+    """
+    async def generate():
+        sent = 0
+        try:
+            async for event, payload in events:
+                message = sse_event(event, payload)
+                sent += len(message.encode('utf-8'))
+                yield message
+        except Exception as e:
+            logger.error(f"流式排版出错: {str(e)}")
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            record_operation(response_bytes=sent)
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+def stream_format(chunks, mode='llm'):
+    async def events():
+        async for event, data in ArticleFormatter.aformat_chunks_stream(chunks, mode):
+            yield event, data
+        yield "done", {"total": len(chunks)}
+
+    return stream_events(events())
+
+
+@tracked
+async def format_article(request):
+    """处理文章排版请求，参数和返回值与同步模式相同"""
+    try:
+        data = await read_json(request)
+        error = validate_format_request(data)
+        if error:
+            return error_response(error, 400)
+
+        content = data['content']
+        mode = data.get('mode', 'llm')
+        record_operation(operation="format", mode=mode, input_bytes=len(content.encode('utf-8')))
+
+        doc_id = data.get('doc_id')
+        if doc_id:
+            revision = data.get('revision')
+            if wants_stream(request, data):
+                return stream_events(IncrementalFormatter.aformat_stream(doc_id, revision, content, mode))
+            return JSONResponse(await IncrementalFormatter.aformat(doc_id, revision, content, mode))
+
+        if mode == 'local':
+            if wants_stream(request, data):
+                return stream_format([content], mode)
+            return JSONResponse(await asyncio.to_thread(LocalStyler.render, content))
+
+        chunks = await asyncio.to_thread(chunk_text, content, FORMAT_CONFIG['CHUNK_MAX_TOKENS'])
+        record_operation(chunks=len(chunks))
+        if wants_stream(request, data):
+            return stream_format(chunks, mode)
+
+        formatted_chunks = await ArticleFormatter.aformat_chunks(chunks, mode)
+        return JSONResponse("\n".join(formatted_chunks))
+
+    except HTTPException as e:
+        return error_response(e.description, e.code)
+    except Exception as e:
+        logger.error(f"处理请求错误: {str(e)}")
+        return error_response(str(e), 500)
+
+
+@tracked
+async def analyze_document(request):
+    """分析上传的PDF、Word文件或URL并生成文章"""
+    try:
+        if request.headers.get('content-type', '').startswith('multipart/form-data'):
+            # 边接收边解析，文件内容直接写入内存缓冲区，超过大小上限时立即中止
+            filename, upload = await aread_upload(request)
+            if upload is None:
+                return error_response("请提供PDF、Word文件或URL", 400)
+            file = FileStorage(stream=upload, filename=filename)
+            result = await asyncio.to_thread(DocumentProcessor.process_uploaded_file, file)
+            record_operation(operation="analyze_file", filename=result['filename'], text_chars=len(result['text']))
+            summary = await DocumentSummarizer.agenerate_article(result['text'], FILE_INSTRUCTION)
+            message = f"已成功分析文件：{result['filename']}（{result['size']}）"
+        else:
+            data = await read_json(request)
+            if not data or 'url' not in data:
+                return error_response("请提供PDF、Word文件或URL", 400)
+            result = await DocumentProcessor.adownload_and_process_file(data['url'])
+            record_operation(operation="analyze_url", url=data['url'], text_chars=len(result['text']))
+            summary = await DocumentSummarizer.agenerate_article(result['text'], URL_INSTRUCTION)
+            message = "已成功分析URL内容"
+
+        return JSONResponse({"success": True, "content": summary, "message": message})
+
+    except HTTPException as e:
+        # 上传超过大小上限、请求体解压失败或格式错误
+        return JSONResponse({"success": False, "error": e.description}, status_code=e.code)
+    except Exception as e:
+        logger.error(f"文档分析错误: {str(e)}")
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+@tracked
+async def generate_article(request):
+    """根据用户输入生成文章"""
+    try:
+        data = await read_json(request)
+        if not data or 'prompt' not in data:
+            return error_response("请提供文章主题或关键词", 400)
+
+        prompt = data['prompt']
+        record_operation(operation="generate", input_bytes=len(prompt.encode('utf-8')))
+        content = await AIGenerator.agenerate_article(prompt)
+        return JSONResponse({"content": content})
+
+    except HTTPException as e:
+        return error_response(e.description, e.code)
+    except Exception as e:
+        logger.error(f"文章生成错误: {str(e)}")
+        return error_response(str(e), 500)
+
+
+@tracked
+async def generate_batch(request):
+    """批量生成文章，参数和返回值与同步模式相同；保存草稿仍使用同步的微信接口，在线程池中执行"""
+    try:
+        data = await read_json(request)
+        error = validate_generate_batch_request(data)
+        if error:
+            return error_response(error, 400)
+
+        prompts = data['prompts']
+        format_mode = batch_format_mode(data)
+        publisher = None
+        if data.get('publish'):
+            publisher = lambda title, content: asyncio.to_thread(get_wechat_api().add_draft, title, content)
+        record_operation(operation="generate_batch", prompts=len(prompts), format=format_mode, publish=bool(publisher))
+
+        events = BatchGenerator.agenerate_stream(prompts, data.get('context'), format_mode, publisher)
+        if wants_stream(request, data):
+            return stream_events(events)
+
+        collected = []
+        async for event in events:
+            collected.append(event)
+        return JSONResponse(BatchGenerator.collect(collected))
+
+    except HTTPException as e:
+        return error_response(e.description, e.code)
+    except Exception as e:
+        logger.error(f"批量生成错误: {str(e)}")
+        return error_response(str(e), 500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # 预热完成前 uvicorn 不接收请求；AI服务的 httpx 客户端绑定事件循环，只能在这里预热
+    await warmup.arun()
+    yield
+    await async_http_client.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/format', format_article, methods=['POST']),
+        Route('/analyze', analyze_document, methods=['POST']),
+        Route('/generate', generate_article, methods=['POST']),
+        Route('/generate/batch', generate_batch, methods=['POST']),
+        # 其余接口由Flask应用处理
+        Mount('/', app=WSGIMiddleware(flask_app, workers=SERVER_CONFIG['WSGI_THREADS']))
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["*"],
+            allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+            allow_headers=["Content-Type", "Authorization"]
+        )
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,91 @@
+"""上传文档文本提取基准测试
+
+用同一批文章分别生成PDF和DOCX，对比以下提取方式的耗时和峰值内存：
+- pdf：PyMuPDF 逐页提取（DocumentProcessor.extract_text_from_pdf）
+- docx：流式解析 document.xml 并转为Markdown（DocumentProcessor.extract_text_from_docx）
+- docx-tree：一次性把 document.xml 解析为完整的元素树再取文字，作为流式解析的对照
+
+每种方式在独立的子进程中运行，峰值内存为提取过程中进程常驻内存（RSS）的增量，
+包含 PyMuPDF 在C层面的分配。PDF默认在单进程中提取（--pdf-workers 1），与DOCX对比。
+
+用法（在 backend 目录下运行）：
+    python benchmarks/bench_document_extract.py [--scale 倍数] [--repeat 次数] [--pdf-workers 进程数]
+"""
+import io
+import os
+import sys
+import time
+import zipfile
+import argparse
+import resource
+import multiprocessing
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus_loader import load_articles, make_pdf, make_docx  # noqa: E402
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def extract_docx_tree(data):
+    """对照组：读出整个 document.xml 并构建完整的元素树"""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        root = ET.fromstring(archive.read('word/document.xml'))
+    return '\n\n'.join(
+        ''.join(node.text or '' for node in paragraph.iter(f'{W}t'))
+        for paragraph in root.iter(f'{W}p')
+    )
+
+
+def run(method, data, repeat, pdf_workers):
+    """在子进程中执行：返回 (平均耗时毫秒, 峰值内存增量MB, 输出字符数)"""
+    from config import DOC_CONFIG
+    from utils.document import DocumentProcessor
+
+    DOC_CONFIG['PDF_WORKERS'] = pdf_workers
+    extract = {
+        'pdf': DocumentProcessor.extract_text_from_pdf,
+        'docx': DocumentProcessor.extract_text_from_docx,
+        'docx-tree': extract_docx_tree
+    }[method]
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for _ in range(repeat):
+        text = extract(data)
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    return elapsed, peak / 1024, len(text)
+
+
+def measure(method, data, repeat, pdf_workers):
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(run, (method, data, repeat, pdf_workers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传文档文本提取基准测试")
+    parser.add_argument('--scale', type=int, default=100, help="把语料文章重复拼接的倍数，生成大文档")
+    parser.add_argument('--repeat', type=int, default=3, help="每个文档重复提取的次数")
+    parser.add_argument('--pdf-workers', type=int, default=1, help="PDF提取使用的进程数")
+    args = parser.parse_args()
+
+    articles = load_articles(args.scale)
+    if not articles:
+        print("语料目录中没有文章")
+        return
+
+    print(f"文章数: {len(articles)}  倍数: {args.scale}  重复次数: {args.repeat}")
+    print(f"{'文档':<20}{'方式':<12}{'文件大小(KB)':>14}{'耗时(ms)':>12}{'峰值内存(MB)':>14}{'输出字符':>10}")
+    for name, text in articles:
+        files = {'pdf': make_pdf(text), 'docx': make_docx(text)}
+        for method, kind in (('pdf', 'pdf'), ('docx', 'docx'), ('docx-tree', 'docx')):
+            data = files[kind]
+            elapsed, peak, chars = measure(method, data, args.repeat, args.pdf_workers)
+            print(f"{os.path.splitext(name)[0]:<20}{method:<12}{len(data) / 1024:>14.1f}{elapsed:>12.1f}{peak:>14.1f}{chars:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""草稿正文整理基准测试
+
+对比 build_article 原来的多遍处理（按字符位置截断、正则去标签取摘要、unicode_escape
+往返解码）与 normalize_content 的单遍处理在大篇幅文章上的耗时，并检查两者输出的
+标签是否配对、中文是否保持原样。文章取自语料目录，先用本地排版转为HTML。
+
+另外检查一组含脚本、事件属性和 javascript: 地址的片段，未超长（先快速检查）和超长
+（逐个标签处理）时是否都已清理干净。
+
+用法（在 backend 目录下运行）：
+    python benchmarks/bench_draft_content.py [--scale 倍数] [--repeat 次数]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus_loader import load_articles  # noqa: E402
+from config import WECHAT_CONFIG  # noqa: E402
+from utils.styler import LocalStyler  # noqa: E402
+from utils.draft_content import normalize_content, TOKEN_PATTERN  # noqa: E402
+from utils.html_extract import VOID_TAGS  # noqa: E402
+
+
+def legacy_normalize(content, max_length, digest_length):
+    """原 build_article 中的处理步骤"""
+    digest = None
+    if len(content) > max_length:
+        content = content[:max_length]
+        last_period = content.rfind('。')
+        if last_period > 0:
+            content = content[:last_period + 1]
+        content += "\n...(由于内容长度限制，部分内容已省略)"
+
+    if digest is None:
+        clean_content = re.sub(r'<[^>]+>', '', content)
+        digest = clean_content[:digest_length].strip()
+        if len(digest) >= digest_length:
+            digest = digest[:digest_length - 3] + "..."
+
+    try:
+        content = content.encode('utf-8').decode('unicode_escape')
+        digest = digest.encode('utf-8').decode('unicode_escape')
+    except Exception:
+        pass
+    return content, digest
+
+
+UNSAFE_SAMPLES = (
+    '<p onclick="alert(1)">文字</p>',
+    '<a href="javascript:alert(1)">链接</a>',
+    '<script>alert(1)</script><p>文字</p>',
+    '<img/src=x/onerror=alert(1)>',
+    '<svg/onload=alert(1)></svg>',
+    '<img src="a.png"/onerror=alert(1)>'
+)
+# 独立于被测模块的检查规则：属性前可以是空白或 /
+UNSAFE_OUTPUT_PATTERN = re.compile(r'<script|[\s/]on\w+\s*=|javascript:', re.I)
+
+
+def sanitized(html):
+    """输出中是否已没有脚本标签、事件属性和 javascript: 地址"""
+    return not UNSAFE_OUTPUT_PATTERN.search(html)
+
+
+def balanced(html):
+    """检查开始和结束标签是否一一配对"""
+    stack = []
+    for match in TOKEN_PATTERN.finditer(html):
+        tag = (match.group(2) or '').lower()
+        if not tag or tag in VOID_TAGS or match.group(3).rstrip().endswith('/'):
+            continue
+        if match.group(1):
+            if not stack or stack.pop() != tag:
+                return False
+        else:
+            stack.append(tag)
+    return not stack and html.count('<') == html.count('>')
+
+
+def measure(func, html, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(html, WECHAT_CONFIG['MAX_CONTENT_LENGTH'], WECHAT_CONFIG['MAX_DIGEST_LENGTH'])
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="草稿正文整理基准测试")
+    parser.add_argument('--scale', type=int, default=8, help="把语料文章重复拼接的倍数，使正文超过长度限制")
+    parser.add_argument('--repeat', type=int, default=50, help="每篇文章重复处理的次数")
+    args = parser.parse_args()
+
+    articles = [(name, LocalStyler.render(text)) for name, text in load_articles(args.scale)]
+    if not articles:
+        print("语料目录中没有文章")
+        return
+
+    print(f"文章数: {len(articles)}  重复次数: {args.repeat}  长度限制: {WECHAT_CONFIG['MAX_CONTENT_LENGTH']}")
+    print(f"{'文章':<24}{'原长度':>8}{'实现':>8}{'耗时(ms)':>10}{'输出长度':>10}{'标签配对':>10}{'中文保留':>10}")
+    totals = {'legacy': 0.0, 'single': 0.0}
+    for name, html in articles:
+        for label, func in (('legacy', legacy_normalize), ('single', normalize_content)):
+            elapsed, (content, digest) = measure(func, html, args.repeat)
+            totals[label] += elapsed
+            intact = set(digest) - set('. ') <= set(html)
+            print(f"{name:<24}{len(html):>8}{label:>8}{elapsed:>10.3f}{len(content):>10}"
+                  f"{'是' if balanced(content) else '否':>10}{'是' if intact else '否':>10}")
+
+    print()
+    max_length = WECHAT_CONFIG['MAX_CONTENT_LENGTH']
+    print(f"{'清理检查':<44}{'未超长':>8}{'超长':>8}")
+    for sample in UNSAFE_SAMPLES:
+        short, _ = normalize_content(sample, max_length, WECHAT_CONFIG['MAX_DIGEST_LENGTH'])
+        long, _ = normalize_content(sample + '文' * max_length, max_length, WECHAT_CONFIG['MAX_DIGEST_LENGTH'])
+        print(f"{sample:<44}{'通过' if sanitized(short) else '失败':>8}{'通过' if sanitized(long) else '失败':>8}")
+
+    print()
+    for label, elapsed in totals.items():
+        print(f"{label:<8}总耗时 {elapsed:.3f} ms")
+    if totals['single']:
+        print(f"加速比: {totals['legacy'] / totals['single']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
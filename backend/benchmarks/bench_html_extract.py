@@ -0,0 +1,91 @@
+"""网页正文提取基准测试
+
+对比各解析引擎在保存的网页样本上的解析耗时和提取质量。
+质量以与人工标注正文（同名 .txt 文件）的字符二元组 F1 值衡量；没有标注文件的
+样本只统计耗时。
+
+用法（在 backend 目录下运行）：
+    python benchmarks/bench_html_extract.py [--dir 网页目录] [--repeat 次数]
+"""
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.html_extract import HTMLExtractor  # noqa: E402
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus', 'html')
+
+
+def bigrams(text):
+    text = ''.join(text.split())
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def f1_score(extracted, expected):
+    """按字符二元组计算提取结果与标注正文的F1值"""
+    got, want = bigrams(extracted), bigrams(expected)
+    overlap = sum((got & want).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(got.values())
+    recall = overlap / sum(want.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def load_corpus(directory):
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(('.html', '.htm')):
+            continue
+        with open(os.path.join(directory, name), 'rb') as f:
+            html = f.read()
+        expected = None
+        gold_path = os.path.join(directory, os.path.splitext(name)[0] + '.txt')
+        if os.path.exists(gold_path):
+            with open(gold_path, 'r', encoding='utf-8') as f:
+                expected = f.read()
+        samples.append((name, html, expected))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="网页正文提取基准测试")
+    parser.add_argument('--dir', default=DEFAULT_DIR, help="保存的网页目录")
+    parser.add_argument('--repeat', type=int, default=20, help="每个样本重复解析的次数")
+    args = parser.parse_args()
+
+    samples = load_corpus(args.dir)
+    if not samples:
+        print(f"目录中没有网页样本: {args.dir}")
+        return
+
+    engines = HTMLExtractor.available_engines()
+    print(f"样本数: {len(samples)}  重复次数: {args.repeat}  引擎: {', '.join(engines)}")
+    print(f"{'样本':<20}{'引擎':<14}{'平均耗时(ms)':>14}{'F1':>8}")
+
+    totals = {engine: [0.0, []] for engine in engines}
+    for name, html, expected in samples:
+        for engine in engines:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                text = HTMLExtractor.extract(html, engine=engine)
+            elapsed = (time.perf_counter() - start) / args.repeat * 1000
+            score = f1_score(text, expected) if expected is not None else None
+            totals[engine][0] += elapsed
+            if score is not None:
+                totals[engine][1].append(score)
+            print(f"{name:<20}{engine:<14}{elapsed:>14.2f}{'-' if score is None else f'{score:.3f}':>8}")
+
+    print()
+    print(f"{'合计':<20}{'引擎':<14}{'总耗时(ms)':>14}{'平均F1':>8}")
+    for engine, (elapsed, scores) in totals.items():
+        average = f"{sum(scores) / len(scores):.3f}" if scores else '-'
+        print(f"{'':<20}{engine:<14}{elapsed:>14.2f}{average:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""请求体和响应体基准测试
+
+1. 传输字节数：用本地排版处理语料文章，对比 /format 请求体和响应体在不压缩、gzip、
+   brotli（已安装时）下的大小
+2. 上传文件接收：对比原来的接收方式（Flask/Starlette 默认的表单解析，文件超过500KB/1MB
+   后转存临时文件，再整体读回内存）与边接收边写入内存缓冲区的方式，每次上传的耗时、
+   接收过程中Python内存分配的峰值（tracemalloc，不含转存到临时文件的部分）和从请求体
+   读取的字节数。请求体不带 Content-Length（分块传输），超过文件大小上限的上传可以看出
+   是否在读取过程中中止
+
+每种接收方式在独立的子进程中运行。
+
+用法（在 backend 目录下运行）：
+    python benchmarks/bench_request_body.py [--scale 倍数] [--sizes 1,5,9,20]
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tracemalloc
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus_loader import load_articles  # noqa: E402
+
+BOUNDARY = 'benchmark-boundary-7f3a'
+CHUNK = 64 * 1024
+METHODS = ('flask-before', 'flask-after', 'asgi-before', 'asgi-after')
+
+
+def multipart_body(filename, size):
+    """生成上传指定大小PDF文件的multipart请求体；预先分配好整个请求体，逐块填充，不产生临时副本"""
+    head = (
+        f'--{BOUNDARY}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        'Content-Type: application/pdf\r\n\r\n%PDF-1.4\n'
+    ).encode()
+    tail = f'\r\n--{BOUNDARY}--\r\n'.encode()
+    body = bytearray(len(head) + size + len(tail))
+    body[:len(head)] = head
+    for start in range(0, size, CHUNK):
+        end = min(start + CHUNK, size)
+        body[len(head) + start:len(head) + end] = os.urandom(end - start)
+    body[len(head) + size:] = tail
+    return body
+
+
+class CountingStream:
+    """模拟从网络读取请求体，统计应用读取的字节数"""
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.consumed = 0
+
+    def read(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else self.consumed + size
+        data = bytes(self.view[self.consumed:end])
+        self.consumed += len(data)
+        return data
+
+
+def receive_flask(method, stream):
+    from flask import Request
+    from werkzeug.test import create_environ
+    from utils.uploads import UploadRequest, read_upload
+
+    environ = create_environ(method='POST')
+    environ.update({
+        'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+        'wsgi.input': stream,
+        'wsgi.input_terminated': True
+    })
+    environ.pop('CONTENT_LENGTH', None)
+    request_class = Request if method == 'flask-before' else UploadRequest
+    return len(read_upload(request_class(environ).files['file']))
+
+
+async def receive_asgi(method, stream, total):
+    from starlette.requests import Request
+    from werkzeug.datastructures import FileStorage
+    from utils.uploads import aread_upload, read_upload
+
+    async def receive():
+        chunk = stream.read(CHUNK)
+        return {'type': 'http.request', 'body': chunk, 'more_body': stream.consumed < total}
+
+    scope = {
+        'type': 'http', 'method': 'POST', 'path': '/analyze', 'query_string': b'',
+        'headers': [(b'content-type', f'multipart/form-data; boundary={BOUNDARY}'.encode())]
+    }
+    request = Request(scope, receive)
+    if method == 'asgi-before':
+        form = await request.form()
+        try:
+            upload = form['file']
+            data = read_upload(FileStorage(stream=upload.file, filename=upload.filename))
+        finally:
+            await form.close()
+    else:
+        filename, buffer = await aread_upload(request)
+        data = read_upload(FileStorage(stream=buffer, filename=filename))
+    return len(data)
+
+
+def receive(method, body):
+    """接收一次上传，返回 (结果, 读取的字节数)"""
+    from werkzeug.exceptions import RequestEntityTooLarge
+
+    stream = CountingStream(body)
+    try:
+        if method.startswith('flask'):
+            length = receive_flask(method, stream)
+        else:
+            length = asyncio.run(receive_asgi(method, stream, len(body)))
+        outcome = f"{length / 1024 / 1024:.1f}MB"
+    except RequestEntityTooLarge:
+        outcome = '413'
+    return outcome, stream.consumed
+
+
+def run(method, size):
+    """在子进程中执行：返回 (结果, 耗时毫秒, 峰值内存MB, 读取的字节数)"""
+    # 先接收一次小文件，导入占用的时间和内存不计入结果
+    receive(method, multipart_body('warmup.pdf', 1024))
+
+    body = multipart_body('upload.pdf', size)
+    start = time.perf_counter()
+    outcome, consumed = receive(method, body)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    # 再接收一次统计内存：tracemalloc 会拖慢执行，不与计时放在同一次
+    tracemalloc.start()
+    receive(method, body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return outcome, elapsed, peak / 1024 / 1024, consumed
+
+
+def measure(method, size):
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(run, (method, size))
+
+
+def wire_bytes(scale):
+    """用Flask测试客户端请求 /format（本地排版），返回各篇文章请求体和响应体的大小"""
+    from app import app
+    from utils.compression import response_encodings
+
+    logging.disable(logging.INFO)  # 排版接口会把收到的内容写入日志
+    client = app.test_client()
+    rows = []
+    for name, text in load_articles(scale):
+        body = json.dumps({'content': text, 'mode': 'local'}, ensure_ascii=False).encode('utf-8')
+        sizes = {'request': len(body), 'request-gzip': len(gzip.compress(body))}
+        for encoding in ('identity',) + response_encodings():
+            response = client.post('/format', data=body, content_type='application/json',
+                                   headers={'Accept-Encoding': encoding})
+            sizes[encoding] = len(response.data)
+        rows.append((name, sizes))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求体和响应体基准测试")
+    parser.add_argument('--scale', type=int, default=4, help="把语料文章重复拼接的倍数")
+    parser.add_argument('--sizes', default='1,5,9,20', help="上传文件大小（MB），逗号分隔；超过上限的用于测试中止")
+    args = parser.parse_args()
+
+    from config import DOC_CONFIG
+
+    rows = wire_bytes(args.scale)
+    if rows:
+        print(f"/format 传输字节数（倍数: {args.scale}）")
+        print(f"{'文章':<24}{'请求':>10}{'请求gzip':>10}{'响应':>10}{'响应gzip':>10}{'响应br':>10}")
+        for name, sizes in rows:
+            print(f"{name:<24}{sizes['request']:>10}{sizes['request-gzip']:>10}{sizes['identity']:>10}"
+                  f"{sizes['gzip']:>10}{sizes.get('br', '-'):>10}")
+        print()
+
+    print(f"上传文件接收（文件大小上限: {DOC_CONFIG['MAX_FILE_SIZE'] / 1024 / 1024:.0f}MB）")
+    print(f"{'文件(MB)':<10}{'方式':<14}{'结果':>8}{'耗时(ms)':>10}{'峰值内存(MB)':>14}{'读取(MB)':>10}")
+    for size_mb in [float(size) for size in args.sizes.split(',') if size.strip()]:
+        for method in METHODS:
+            outcome, elapsed, peak, consumed = measure(method, int(size_mb * 1024 * 1024))
+            print(f"{size_mb:<10g}{method:<14}{outcome:>8}{elapsed:>10.1f}{peak:>14.1f}{consumed / 1024 / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""启动耗时基准测试
+
+1. 导入耗时：在新的解释器中导入 app / asgi 模块的耗时（不含解释器本身启动），与提前导入
+   PDF解析、lxml、httpx 等依赖（即改为按需导入之前的情况）对比
+2. 冷启动：用 serve.py 启动多个工作进程，测量从启动到 GET /ready 返回200的时间，以及
+   主进程和工作进程合计的按比例分摊内存（PSS，仅Linux），对比是否预加载（SERVER_PRELOAD）
+
+用法（在 backend 目录下运行，需要已有 config.py）：
+    python benchmarks/bench_startup.py [--repeat 5] [--workers 4] [--mode wsgi]
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_CASES = (
+    ("app（按需导入）", "import app"),
+    ("app（提前导入依赖）", "import fitz, lxml.etree, httpx; import app"),
+    ("asgi", "import asgi")
+)
+
+
+def import_seconds(statement):
+    """在新进程中执行导入语句，返回导入耗时（秒）"""
+    code = f"import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def pss_mb(pids):
+    """进程的按比例分摊内存合计（MB），共享的页面按共享进程数分摊；不支持时返回None"""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith('Pss:'):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return total / 1024
+
+
+def cold_start(args, preload, data_dir):
+    """启动 serve.py，返回 (到就绪的秒数, 合计PSS MB)"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        SERVER_MODE=args.mode,
+        SERVER_HOST='127.0.0.1',
+        SERVER_PORT=str(port),
+        SERVER_WORKERS=str(args.workers),
+        SERVER_PRELOAD='true' if preload else 'false',
+        SERVER_WARMUP='imports',
+        LLM_CACHE_PATH=os.path.join(data_dir, 'llm_cache.db'),
+        FETCH_CACHE_DIR=os.path.join(data_dir, 'fetch_cache'),
+        WECHAT_TOKEN_DB=os.path.join(data_dir, 'wechat_token.db'),
+        WECHAT_IMAGE_DB=os.path.join(data_dir, 'wechat_images.db'),
+        OPLOG_PATH=os.path.join(data_dir, 'operations.jsonl'),
+        LLM_RATE_LIMIT_DB=os.path.join(data_dir, 'rate_limit.db')
+    )
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, 'serve.py'], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.time() + 60
+        while True:
+            if process.poll() is not None or time.time() > deadline:
+                raise SystemExit("后端启动失败，请确认 backend/config.py 存在且已安装 gunicorn")
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+
+        # 等所有工作进程都启动后再统计内存
+        while len(child_pids(process.pid)) < args.workers and time.time() < deadline:
+            time.sleep(0.1)
+        time.sleep(1)
+        memory = pss_mb([process.pid] + child_pids(process.pid))
+        return elapsed, memory
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument('--repeat', type=int, default=5, help="导入耗时的测量次数，取中位数")
+    parser.add_argument('--workers', type=int, default=4, help="冷启动测试的工作进程数")
+    parser.add_argument('--mode', default='wsgi', choices=('wsgi', 'asgi'), help="冷启动测试的服务模式")
+    parser.add_argument('--skip-serve', action='store_true', help="只测量导入耗时")
+    args = parser.parse_args()
+
+    print(f"{'导入':<24}{'中位数(ms)':>12}{'最小(ms)':>12}")
+    for label, statement in IMPORT_CASES:
+        try:
+            samples = [import_seconds(statement) * 1000 for _ in range(args.repeat)]
+        except subprocess.CalledProcessError:
+            print(f"{label:<24}{'导入失败（缺少依赖）':>24}")
+            continue
+        print(f"{label:<24}{statistics.median(samples):>12.1f}{min(samples):>12.1f}")
+
+    if args.skip_serve:
+        return
+
+    print()
+    print(f"{'冷启动':<24}{'就绪(ms)':>12}{'PSS合计(MB)':>14}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        for preload in (False, True):
+            elapsed, memory = cold_start(args, preload, data_dir)
+            label = f"{args.mode} x{args.workers} {'预加载' if preload else '不预加载'}"
+            print(f"{label:<24}{elapsed * 1000:>12.0f}{'-' if memory is None else f'{memory:.1f}':>14}")
+
+
+if __name__ == '__main__':
+    main()
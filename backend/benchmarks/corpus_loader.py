@@ -0,0 +1,179 @@
+"""读取基准测试语料
+
+语料目录结构：
+    corpus/articles/  示例文章（.md / .txt），用于 /format、/generate、/publish
+    corpus/html/      保存的网页（.html），用于 /analyze 的URL分析
+    corpus/pdf/       PDF文件（可选）；目录为空时用 PyMuPDF 把示例文章生成为PDF
+    corpus/docx/      Word文件（可选）；目录为空时把示例文章生成为DOCX，标题、列表和表格使用Word的样式
+"""
+import os
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+
+def read_files(subdir, extensions, mode='r'):
+    directory = os.path.join(CORPUS_DIR, subdir)
+    if not os.path.isdir(directory):
+        return []
+    files = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(extensions):
+            kwargs = {} if 'b' in mode else {'encoding': 'utf-8'}
+            with open(os.path.join(directory, name), mode, **kwargs) as f:
+                files.append((name, f.read()))
+    return files
+
+
+def load_articles(scale=1):
+    """返回 [(文件名, 文章内容)]，scale大于1时把文章重复拼接成长文"""
+    return [(name, '\n\n'.join([text] * scale)) for name, text in read_files('articles', ('.md', '.txt'))]
+
+
+def load_html_pages():
+    return read_files('html', ('.html', '.htm'), 'rb')
+
+
+def make_pdf(text):
+    """把文本排成A4页面的PDF，返回字节"""
+    import fitz  # PyMuPDF，仅生成语料时需要
+
+    doc = fitz.open()
+    lines = text.splitlines()
+    per_page = 10  # 每页放的段落数，段落较长会自动换行
+    for start in range(0, max(len(lines), 1), per_page):
+        page = doc.new_page(width=595, height=842)
+        page.insert_textbox(
+            fitz.Rect(50, 50, 545, 792),
+            '\n'.join(lines[start:start + per_page]),
+            fontsize=11,
+            fontname='china-s'
+        )
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def load_pdfs(scale=1):
+    """返回 [(文件名, PDF字节)]"""
+    pdfs = read_files('pdf', ('.pdf',), 'rb')
+    if pdfs:
+        return pdfs
+    return [(os.path.splitext(name)[0] + '.pdf', make_pdf(text)) for name, text in load_articles(scale)]
+
+
+def load_static_files(scale=1):
+    """静态文件服务提供的文件：{URL路径: 内容}"""
+    files = {f"/html/{name}": data for name, data in load_html_pages()}
+    files.update({f"/pdf/{name}": data for name, data in load_pdfs(scale)})
+    return files
+
+
+DOCX_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+DOCX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '<Override PartName="/word/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+        '<Override PartName="/word/numbering.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.numbering+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/></Relationships>'
+    ),
+    'word/_rels/document.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/numbering" '
+        'Target="numbering.xml"/></Relationships>'
+    ),
+    'word/styles.xml': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles {DOCX_NS}>'
+        + ''.join(
+            f'<w:style w:type="paragraph" w:styleId="Heading{i}"><w:name w:val="heading {i}"/></w:style>'
+            for i in range(1, 4)
+        )
+        + '</w:styles>'
+    ),
+    'word/numbering.xml': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:numbering {DOCX_NS}>'
+        '<w:abstractNum w:abstractNumId="0"><w:lvl w:ilvl="0"><w:numFmt w:val="bullet"/></w:lvl></w:abstractNum>'
+        '<w:abstractNum w:abstractNumId="1"><w:lvl w:ilvl="0"><w:numFmt w:val="decimal"/></w:lvl></w:abstractNum>'
+        '<w:num w:numId="1"><w:abstractNumId w:val="0"/></w:num>'
+        '<w:num w:numId="2"><w:abstractNumId w:val="1"/></w:num>'
+        '</w:numbering>'
+    )
+}
+
+
+def docx_paragraph(text, props=''):
+    return f'<w:p>{props}<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+
+def docx_table(rows):
+    cells = lambda row: ''.join(f'<w:tc>{docx_paragraph(cell.strip())}</w:tc>' for cell in row)
+    return '<w:tbl>' + ''.join(f'<w:tr>{cells(row)}</w:tr>' for row in rows) + '</w:tbl>'
+
+
+def make_docx(text):
+    """把Markdown格式的文章生成为DOCX，返回字节；标题、列表和表格转为Word的对应结构"""
+    body = []
+    table = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('|'):
+            if not re.match(r'^\|[\s:|-]+\|$', stripped):
+                table.append(stripped.strip('|').split('|'))
+            continue
+        if table:
+            body.append(docx_table(table))
+            table = []
+        if not stripped:
+            continue
+        heading = re.match(r'^(#{1,3})\s+(.*)$', stripped)
+        bullet = re.match(r'^[-*]\s+(.*)$', stripped)
+        ordered = re.match(r'^\d+[.)]\s+(.*)$', stripped)
+        if heading:
+            body.append(docx_paragraph(heading.group(2), f'<w:pPr><w:pStyle w:val="Heading{len(heading.group(1))}"/></w:pPr>'))
+        elif bullet or ordered:
+            num_id = 1 if bullet else 2
+            item = (bullet or ordered).group(1)
+            body.append(docx_paragraph(item, f'<w:pPr><w:numPr><w:ilvl w:val="0"/><w:numId w:val="{num_id}"/></w:numPr></w:pPr>'))
+        else:
+            body.append(docx_paragraph(stripped))
+    if table:
+        body.append(docx_table(table))
+
+    document = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document {DOCX_NS}>'
+        f'<w:body>{"".join(body)}<w:sectPr/></w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in DOCX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('word/document.xml', document)
+    return buffer.getvalue()
+
+
+def load_docx(scale=1):
+    """返回 [(文件名, DOCX字节)]"""
+    files = read_files('docx', ('.docx',), 'rb')
+    if files:
+        return files
+    return [(os.path.splitext(name)[0] + '.docx', make_docx(text)) for name, text in load_articles(scale)]
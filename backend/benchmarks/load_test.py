@@ -0,0 +1,242 @@
+"""端到端压测：在本地模拟的AI和微信服务下测量各接口的延迟和吞吐
+
+默认（--launch）会启动模拟服务和一个指向它们的后端进程，数据目录放在临时目录，
+AI响应缓存默认关闭以测量完整链路；也可以用 --target 压测已经启动的后端。
+
+用法（在 backend 目录下运行，需要已有 config.py）：
+    python benchmarks/load_test.py [--scenario all] [--concurrency 8] [--requests 40]
+        [--latency 300] [--jitter 100] [--error-rate 0] [--stream] [--cache]
+    python benchmarks/load_test.py --target http://127.0.0.1:5000 --no-launch
+
+输出每个场景的请求数、失败数、每秒请求数以及平均、p50、p95、p99 延迟（毫秒）。
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import itertools
+import threading
+import subprocess
+from collections import Counter
+
+import requests
+
+import mock_servers
+from corpus_loader import load_articles, load_html_pages, load_pdfs, load_static_files
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ('format', 'analyze', 'generate', 'publish')
+TOPICS = ['春季养生', '城市骑行', '家庭理财', '职场沟通', '读书方法', '露营装备', '儿童编程', '早餐搭配']
+
+
+def percentile(sorted_values, p):
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class ScenarioResult:
+    def __init__(self, name, latencies, errors, wall):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.wall = wall
+
+    def to_dict(self):
+        n = len(self.latencies)
+        return {
+            "scenario": self.name,
+            "requests": n,
+            "failed": sum(self.errors.values()),
+            "errors": dict(self.errors),
+            "rps": round(n / self.wall, 2) if self.wall else 0,
+            "mean_ms": round(sum(self.latencies) / n * 1000, 1) if n else 0,
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 1)
+        }
+
+
+def build_requests(args, static_base):
+    """为每个场景生成请求构造函数：输入序号，返回 (方法, 路径, requests参数)"""
+    articles = load_articles(args.scale)
+    html_pages = [name for name, _ in load_html_pages()]
+    pdfs = load_pdfs(args.scale)
+
+    def format_request(i):
+        _, text = articles[i % len(articles)]
+        payload = {"content": text, "mode": args.mode}
+        if args.stream:
+            payload["stream"] = True
+        return 'POST', '/format', {"json": payload}
+
+    def analyze_request(i):
+        # 轮流测试上传PDF、PDF链接和网页链接
+        kind = i % 3
+        if kind == 0:
+            name, data = pdfs[i % len(pdfs)]
+            return 'POST', '/analyze', {"files": {"file": (name, data, 'application/pdf')}}
+        if kind == 1 or not html_pages:
+            name, _ = pdfs[i % len(pdfs)]
+            return 'POST', '/analyze', {"json": {"url": f"{static_base}/pdf/{name}"}}
+        return 'POST', '/analyze', {"json": {"url": f"{static_base}/html/{html_pages[i % len(html_pages)]}"}}
+
+    def generate_request(i):
+        return 'POST', '/generate', {"json": {"prompt": f"写一篇关于{TOPICS[i % len(TOPICS)]}的公众号文章"}}
+
+    def publish_request(i):
+        name, text = articles[i % len(articles)]
+        return 'POST', '/publish', {"json": {"title": f"{os.path.splitext(name)[0]}-{i}", "content": text}}
+
+    return {
+        'format': format_request,
+        'analyze': analyze_request,
+        'generate': generate_request,
+        'publish': publish_request
+    }
+
+
+def run_scenario(target, name, make_request, concurrency, total, timeout):
+    """用 concurrency 个并发客户端发送 total 个请求"""
+    latencies = []
+    errors = Counter()
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def client():
+        session = requests.Session()
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            method, path, kwargs = make_request(i)
+            start = time.perf_counter()
+            try:
+                response = session.request(method, target + path, timeout=timeout, **kwargs)
+                body = response.content  # 读完整个响应，流式响应计到最后一个事件
+                error = response.status_code if response.status_code >= 400 else None
+                if error is None and b'event: error' in body:
+                    error = 'stream_error'
+            except requests.RequestException as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if error is not None:
+                    errors[str(error)] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return ScenarioResult(name, latencies, errors, time.perf_counter() - start)
+
+
+def launch_backend(args, data_dir):
+    """启动一个上游指向模拟服务的后端进程"""
+    env = dict(
+        os.environ,
+        DEEPSEEK_API_URL=f"http://127.0.0.1:{args.llm_port}/v1/chat/completions",
+        DEEPSEEK_API_KEY='mock',
+        DEEPSEEK_API_MODEL='mock',
+        WECHAT_API_BASE=f"http://127.0.0.1:{args.wechat_port}/cgi-bin",
+        WECHAT_APPID='mock',
+        WECHAT_SECRET='mock',
+        LLM_CACHE_ENABLED='true' if args.cache else 'false',
+        LLM_CACHE_PATH=os.path.join(data_dir, 'llm_cache.db'),
+        FETCH_CACHE_DIR=os.path.join(data_dir, 'fetch_cache'),
+        WECHAT_TOKEN_DB=os.path.join(data_dir, 'wechat_token.db'),
+        WECHAT_IMAGE_DB=os.path.join(data_dir, 'wechat_images.db'),
+        OPLOG_PATH=os.path.join(data_dir, 'operations.jsonl'),
+        LLM_RATE_LIMIT_DB=os.path.join(data_dir, 'rate_limit.db'),
+        LLM_RPM=str(args.limit_rpm),
+        LLM_TPM=str(args.limit_tpm)
+    )
+    port = args.target.rsplit(':', 1)[-1].strip('/')
+    if args.server == 'asgi':
+        # 异步模式：单个 uvicorn 进程
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', port, '--no-access-log']
+    else:
+        command = [sys.executable, '-c', f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("后端进程启动失败，请确认 backend/config.py 存在且依赖已安装")
+        try:
+            requests.get(f"{args.target}/cache/stats", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("等待后端启动超时")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端压测")
+    parser.add_argument('--target', default='http://127.0.0.1:15000', help="后端地址")
+    parser.add_argument('--no-launch', dest='launch', action='store_false', help="不启动模拟服务和后端，直接压测 --target")
+    parser.add_argument('--scenario', default='all', choices=('all',) + SCENARIOS)
+    parser.add_argument('--concurrency', type=int, default=8, help="并发客户端数")
+    parser.add_argument('--requests', type=int, default=40, help="每个场景的请求数")
+    parser.add_argument('--warmup', type=int, default=2, help="每个场景正式计时前的预热请求数")
+    parser.add_argument('--timeout', type=float, default=300, help="单个请求超时（秒）")
+    parser.add_argument('--scale', type=int, default=1, help="把示例文章重复拼接的次数，用于测试长文")
+    parser.add_argument('--mode', default='llm', choices=('llm', 'local', 'hybrid'), help="/format 的排版模式")
+    parser.add_argument('--stream', action='store_true', help="/format 使用SSE流式返回")
+    parser.add_argument('--cache', action='store_true', help="开启后端的AI响应缓存")
+    parser.add_argument('--limit-rpm', type=int, default=0, help="后端限流的每分钟请求数（LLM_RPM），0表示不限制")
+    parser.add_argument('--limit-tpm', type=int, default=0, help="后端限流的每分钟token数（LLM_TPM），0表示不限制")
+    parser.add_argument('--server', default='wsgi', choices=('wsgi', 'asgi'), help="启动后端的方式：Flask多线程（wsgi）或异步模式（asgi）")
+    parser.add_argument('--output', help="把结果保存为JSON文件，便于和之后的结果对比")
+    mock_servers.add_arguments(parser)
+    args = parser.parse_args()
+    random.seed(0)
+
+    process = None
+    static_base = f"http://127.0.0.1:{args.static_port}"
+    if args.launch:
+        mock_servers.start_mock_servers(
+            args.llm_port, args.wechat_port, args.static_port,
+            mock_servers.options_from_args(args), load_static_files(args.scale)
+        )
+        process = launch_backend(args, tempfile.mkdtemp(prefix='bench-'))
+
+    try:
+        builders = build_requests(args, static_base)
+        scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+        print(f"目标: {args.target}  并发: {args.concurrency}  每场景请求数: {args.requests}  "
+              f"模拟延迟: {args.latency:.0f}±{args.jitter:.0f}ms  错误率: {args.error_rate}")
+        print(f"{'场景':<10}{'请求数':>8}{'失败':>6}{'RPS':>9}{'平均':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+
+        results = []
+        for name in scenarios:
+            if args.warmup:
+                run_scenario(args.target, name, builders[name], min(args.concurrency, args.warmup), args.warmup, args.timeout)
+            result = run_scenario(args.target, name, builders[name], args.concurrency, args.requests, args.timeout).to_dict()
+            results.append(result)
+            print(f"{name:<10}{result['requests']:>8}{result['failed']:>6}{result['rps']:>9.2f}"
+                  f"{result['mean_ms']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}")
+            if result['errors']:
+                print(f"{'':<10}错误: {result['errors']}")
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""基准测试用的本地模拟服务
+
+- AI服务：模拟 OpenAI 格式的 POST /v1/chat/completions，支持 stream: true
+- 微信服务：模拟 GET /cgi-bin/token、POST /cgi-bin/draft/add、media/uploadimg、material/add_material
+- 静态文件服务：提供语料目录中的网页和PDF，供 /analyze 的URL分析使用
+
+延迟和错误率均可配置，错误时AI服务返回HTTP 500/429，微信服务返回 errcode；
+AI服务还可以模拟每分钟请求数上限，超出时返回429和 Retry-After。
+
+用法（在 backend 目录下运行）：
+    python benchmarks/mock_servers.py [--llm-port 18001] [--wechat-port 18002] [--static-port 18003]
+        [--latency 300] [--jitter 100] [--error-rate 0.0] [--chars-per-second 2000] [--rpm 0]
+
+启动后按以下方式配置后端：
+    DEEPSEEK_API_URL=http://127.0.0.1:18001/v1/chat/completions
+    WECHAT_API_BASE=http://127.0.0.1:18002/cgi-bin
+"""
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import threading
+import collections
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+from corpus_loader import load_static_files
+
+
+class MockOptions:
+    def __init__(self, latency=0.3, jitter=0.1, error_rate=0.0, chars_per_second=2000, rpm=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chars_per_second = chars_per_second
+        self.rpm = rpm
+        self.recent = collections.deque()
+        self.lock = threading.Lock()
+
+    def delay(self):
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+    def rate_limited(self):
+        """超过每分钟请求数上限时返回需要等待的秒数，否则记录本次请求并返回0"""
+        if not self.rpm:
+            return 0
+        now = time.time()
+        with self.lock:
+            while self.recent and now - self.recent[0] >= 60:
+                self.recent.popleft()
+            if len(self.recent) >= self.rpm:
+                return 60 - (now - self.recent[0])
+            self.recent.append(now)
+            return 0
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    options = MockOptions()
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def send_json(self, data, status=200, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class LLMHandler(MockHandler):
+    """模拟 chat/completions：把用户消息包装为HTML段落返回"""
+
+    def do_POST(self):
+        body = json.loads(self.read_body() or b'{}')
+        wait = self.options.rate_limited()
+        if wait:
+            self.send_json(
+                {"error": {"message": "rate limit reached (mock)"}},
+                status=429,
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+            return
+
+        self.options.delay()
+        if self.options.should_fail():
+            status = random.choice((500, 429))
+            self.send_json({"error": {"message": "mock upstream error"}}, status=status, headers={"Retry-After": "1"})
+            return
+
+        text = body.get('messages', [{}])[-1].get('content', '')
+        paragraphs = [line.strip() for line in text.splitlines() if line.strip()]
+        content = '\n'.join(f'<p style="font-size: 15px; line-height: 1.75;">{line}</p>' for line in paragraphs)
+        if body.get('max_tokens'):
+            content = content[:body['max_tokens'] * 2]
+        usage = {
+            "prompt_tokens": sum(len(m.get('content', '')) for m in body.get('messages', [])),
+            "completion_tokens": len(content)
+        }
+
+        if not body.get('stream'):
+            self.send_json({"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        step = 20
+        pause = step / self.options.chars_per_second if self.options.chars_per_second else 0
+        try:
+            for i in range(0, len(content), step):
+                self.write_chunk({"choices": [{"delta": {"content": content[i:i + step]}}]})
+                if pause:
+                    time.sleep(pause)
+            self.write_chunk({"choices": [], "usage": usage})
+            self.write_raw(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端读到 [DONE] 后可能直接断开连接
+            self.close_connection = True
+
+    def write_chunk(self, data):
+        self.write_raw(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+    def write_raw(self, payload):
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+
+class WeChatHandler(MockHandler):
+    """模拟微信公众号接口"""
+
+    def fail(self):
+        self.send_json({"errcode": 45009, "errmsg": "reach max api daily quota limit (mock)"})
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        self.options.delay()
+        if path.endswith('/token'):
+            if self.options.should_fail():
+                return self.fail()
+            return self.send_json({"access_token": uuid.uuid4().hex, "expires_in": 7200})
+        self.send_json({"errcode": 404, "errmsg": "not found"}, status=404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        self.read_body()
+        self.options.delay()
+        if self.options.should_fail():
+            return self.fail()
+        if path.endswith('/draft/add'):
+            return self.send_json({"media_id": uuid.uuid4().hex})
+        if path.endswith('/media/uploadimg'):
+            return self.send_json({"url": f"http://mmbiz.qpic.cn/mock/{uuid.uuid4().hex}/0"})
+        if path.endswith('/material/add_material'):
+            return self.send_json({"media_id": uuid.uuid4().hex, "url": "http://mmbiz.qpic.cn/mock/cover/0"})
+        self.send_json({"errcode": 404, "errmsg": "not found"}, status=404)
+
+
+class StaticHandler(MockHandler):
+    """提供语料文件，路径为 /<子目录>/<文件名>"""
+
+    files = {}
+
+    def do_GET(self):
+        data = self.files.get(urlparse(self.path).path)
+        if data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        content_type = 'application/pdf' if self.path.endswith('.pdf') else 'text/html; charset=utf-8'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 压测客户端关闭长连接属于正常情况，不打印异常
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def serve(handler, port, options, **attrs):
+    """在后台线程启动一个模拟服务，返回服务对象"""
+    handler_class = type(handler.__name__, (handler,), dict(options=options, **attrs))
+    server = MockServer(('127.0.0.1', port), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_mock_servers(llm_port, wechat_port, static_port=None, options=None, static_files=None):
+    options = options or MockOptions()
+    servers = [serve(LLMHandler, llm_port, options), serve(WeChatHandler, wechat_port, options)]
+    if static_port:
+        servers.append(serve(StaticHandler, static_port, MockOptions(latency=0, jitter=0), files=static_files or {}))
+    return servers
+
+
+def add_arguments(parser):
+    parser.add_argument('--llm-port', type=int, default=18001)
+    parser.add_argument('--wechat-port', type=int, default=18002)
+    parser.add_argument('--static-port', type=int, default=18003)
+    parser.add_argument('--latency', type=float, default=300, help="模拟上游延迟（毫秒）")
+    parser.add_argument('--jitter', type=float, default=100, help="延迟的随机波动范围（毫秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="模拟上游出错的概率（0~1）")
+    parser.add_argument('--chars-per-second', type=float, default=2000, help="流式返回的速度（每秒字符数），0表示不限速")
+    parser.add_argument('--rpm', type=int, default=0, help="模拟AI服务的每分钟请求数上限，超出返回429和Retry-After，0表示不限制")
+
+
+def options_from_args(args):
+    return MockOptions(args.latency / 1000, args.jitter / 1000, args.error_rate, args.chars_per_second, args.rpm)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基准测试用的本地模拟服务")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    start_mock_servers(args.llm_port, args.wechat_port, args.static_port, options_from_args(args), load_static_files())
+    print(f"AI服务:   http://127.0.0.1:{args.llm_port}/v1/chat/completions")
+    print(f"微信服务: http://127.0.0.1:{args.wechat_port}/cgi-bin")
+    print(f"静态文件: http://127.0.0.1:{args.static_port}/")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -22,19 +22,248 @@ STYLE_CONFIG = {
         "size": "15px",
         "color": "#333333",
         "lineHeight": "1.75"
-    }
+    },
+    "section": {
+        "size": "16px",
+        "color": "#888888"
+    },
+    "link": {
+        "color": "#1E9FFF"
+    },
+    "code": {
+        "size": "14px",
+        "color": "#888888",
+        "background": "#f6f8fa"
+    },
+    "quote": {
+        "color": "#666666",
+        "background": "#f4f4f4",
+        "border": "#dddddd"
+    },
+    "table": {
+        "border": "#dddddd",
+        "headerBackground": "#f6f8fa"
+    },
+    "spacing": "1em"  # 段落、列表、引用等块之间的间距
 }
 
 # 微信公众号配置
 WECHAT_CONFIG = {
     "APPID": os.environ.get("WECHAT_APPID", "your_appid_here"),
     "SECRET": os.environ.get("WECHAT_SECRET", "your_secret_here"),
+    "API_BASE": os.environ.get("WECHAT_API_BASE", "https://api.weixin.qq.com/cgi-bin"),  # 接口地址，基准测试时可指向本地模拟服务
     "DEFAULT_THUMB_MEDIA_ID": os.environ.get("DEFAULT_THUMB_MEDIA_ID", "your_media_id_here"),
-    "MAX_CONTENT_LENGTH": 20000  # 微信图文内容字数限制
+    "MAX_CONTENT_LENGTH": 20000,  # 微信图文正文须少于2万字符（按HTML长度计算），超出时截断
+    "MAX_TITLE_LENGTH": 64,  # 标题长度上限
+    "MAX_DIGEST_LENGTH": 120,  # 摘要长度上限，未提供摘要时取正文开头的文字
+    "MAX_ARTICLES_PER_DRAFT": 8,  # 一个草稿最多包含的图文数（微信限制为8篇）
+    "MAX_BATCH_ARTICLES": 40,  # 批量发布单次请求最多的文章数
+    "MAX_CONCURRENT_DRAFTS": 4,  # 同时提交 draft/add 的请求数上限
+    "TOKEN_DB_PATH": os.environ.get(
+        "WECHAT_TOKEN_DB",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "wechat_token.db")
+    )  # 多个工作进程共享 access_token 的存储位置
 }
 
 # 文档处理配置
 DOC_CONFIG = {
     "ALLOWED_EXTENSIONS": ['pdf', 'doc', 'docx'],
-    "MAX_FILE_SIZE": 10 * 1024 * 1024  # 10MB
-}
\ No newline at end of file
+    "MAX_FILE_SIZE": 10 * 1024 * 1024,  # 10MB
+    "PDF_WORKERS": int(os.environ.get("PDF_WORKERS", os.cpu_count() or 1)),  # PDF并行提取的进程数
+    "PDF_PARALLEL_PAGES": 40,  # 页数达到该值时才使用进程池并行提取
+    "PDF_PAGES_PER_TASK": 20,  # 每个子进程任务处理的页数
+    "DOCX_MAX_XML_BYTES": 200 * 1024 * 1024  # DOCX正文解压后的大小上限，防止压缩炸弹
+}
+
+# AI调用配置
+LLM_CONFIG = {
+    "MAX_CONCURRENT_CALLS": int(os.environ.get("LLM_MAX_CONCURRENT_CALLS", 8)),  # 整个进程同时发往AI的请求数上限
+    "ASYNC_MAX_CONCURRENT_CALLS": int(os.environ.get("LLM_ASYNC_MAX_CONCURRENT_CALLS", 64))  # 异步模式下每个进程同时发往AI的请求数上限，等待上游时不占用线程
+}
+
+# AI上游限流配置，令牌桶状态保存在SQLite中，多个工作进程共用同一份额度
+RATE_LIMIT_CONFIG = {
+    "ENABLED": os.environ.get("LLM_RATE_LIMIT_ENABLED", "true").lower() == "true",
+    "RPM": int(os.environ.get("LLM_RPM", 0)),  # 每分钟请求数上限，0表示不限制
+    "TPM": int(os.environ.get("LLM_TPM", 0)),  # 每分钟token数上限（提示词加输出，按估算值预扣、按实际用量修正），0表示不限制
+    "BURST_SECONDS": 10,  # 允许瞬时用掉的额度，相当于多少秒的配额
+    "MAX_WAIT": 120,  # 单个请求排队等待额度的最长时间（秒），超出后报错
+    "RETRIES_429": 3,  # 上游返回429后的重试次数，重试前所有进程按 Retry-After 暂停发送
+    "DEFAULT_RETRY_AFTER": 5,  # 429响应未带 Retry-After 时的暂停时间（秒）
+    "DB_PATH": os.environ.get(
+        "LLM_RATE_LIMIT_DB",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rate_limit.db")
+    )
+}
+
+# 排版并发配置
+FORMAT_CONFIG = {
+    "MAX_WORKERS": int(os.environ.get("FORMAT_MAX_WORKERS", 4)),  # 同时发送给AI的分块数上限
+    "CHUNK_MAX_TOKENS": 2000,  # 每个分块的token预算
+    "CHUNK_RETRIES": 2,  # 单个分块失败后的重试次数
+    "RETRY_BACKOFF": 1,  # 分块重试的基础间隔（秒），按指数增长
+    "UPSTREAM_STREAM": os.environ.get("FORMAT_UPSTREAM_STREAM", "true").lower() == "true",  # 流式排版时是否向AI请求 stream: true
+    "INCREMENTAL_TARGET_TOKENS": 800,  # 增量排版时的平均分块大小，越小修改后需要重新排版的内容越少
+    "MAX_DOCUMENTS": 200,  # 服务端保存排版结果的文档数上限
+    "DOCUMENT_TTL": 24 * 3600  # 文档排版结果的保存时间（秒）
+}
+
+
+# AI响应缓存配置
+CACHE_CONFIG = {
+    "ENABLED": os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true",
+    "ENABLE_DISK": True,  # 是否启用SQLite磁盘缓存，重启后仍可命中
+    "DB_PATH": os.environ.get(
+        "LLM_CACHE_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_cache.db")
+    ),
+    "MAX_MEMORY_ENTRIES": 512,  # 内存LRU最多缓存的条目数
+    "MAX_DISK_ENTRIES": 20000,  # 磁盘最多缓存的条目数，超出按最近访问时间淘汰
+    "TTL": 7 * 24 * 3600  # 缓存有效期（秒），0表示不过期
+}
+
+
+# 上游HTTP连接配置，每个上游使用独立的连接池、超时和重试策略
+HTTP_CONFIG = {
+    "llm": {
+        "POOL_CONNECTIONS": 2,  # 缓存的主机连接池数量
+        "POOL_SIZE": 16,  # 每个主机保持的长连接数，应不小于排版并发数
+        "CONNECT_TIMEOUT": 10,
+        "READ_TIMEOUT": 120,
+        "RETRIES": 3,
+        "BACKOFF": 1,  # 指数退避的基础间隔（秒）
+        "JITTER": 0.5,  # 退避时间上叠加的随机抖动上限（秒）
+        "STATUS_FORCELIST": [500, 502, 503, 504],
+        "RETRY_METHODS": ["POST"],
+        # 带 Retry-After 的429/503是否由连接池自行等待后重试；AI服务的429交给共享限流器处理，
+        # 所有工作进程一起暂停，不在连接池中等待
+        "RESPECT_RETRY_AFTER": False
+    },
+    "wechat": {
+        "POOL_CONNECTIONS": 1,
+        "POOL_SIZE": 8,
+        "CONNECT_TIMEOUT": 5,
+        "READ_TIMEOUT": 30,
+        "RETRIES": 2,
+        "BACKOFF": 0.5,
+        "JITTER": 0.3,
+        "STATUS_FORCELIST": [500, 502, 503, 504],
+        "RETRY_METHODS": ["GET"],  # 新建草稿等POST请求不是幂等的，只在连接失败时重试
+        "RESPECT_RETRY_AFTER": True
+    },
+    "fetch": {
+        "POOL_CONNECTIONS": 10,
+        "POOL_SIZE": 4,
+        "CONNECT_TIMEOUT": 10,
+        "READ_TIMEOUT": 30,
+        "RETRIES": 2,
+        "BACKOFF": 0.5,
+        "JITTER": 0.3,
+        "STATUS_FORCELIST": [502, 503, 504],
+        "RETRY_METHODS": ["GET", "HEAD"],
+        "RESPECT_RETRY_AFTER": True
+    }
+}
+
+
+# 批量生成配置
+GENERATE_CONFIG = {
+    "MAX_BATCH_PROMPTS": 50,  # 单次批量生成最多的主题数
+    "MAX_WORKERS": int(os.environ.get("GENERATE_MAX_WORKERS", 4))  # 同一批中同时生成的文章数
+}
+
+
+# 后台任务配置
+JOB_CONFIG = {
+    "MAX_WORKERS": int(os.environ.get("JOB_MAX_WORKERS", 4)),  # 同时执行的后台任务数
+    "RESULT_TTL": 3600  # 已结束任务的结果保留时间（秒）
+}
+
+
+# 文档分析配置，长文档使用分块提炼要点再合并的方式生成文章
+ANALYZE_CONFIG = {
+    "DIRECT_MAX_TOKENS": 6000,  # 文档（或要点汇总）不超过该长度时直接生成文章
+    "MAP_CHUNK_TOKENS": 3000,  # 提炼要点时每个分块的token预算
+    "PART_MAX_TOKENS": 800,  # 每段要点的最大输出token数
+    "REDUCE_FAN_IN": 5,  # 每次合并的要点段数
+    "MAX_WORKERS": 4  # 单个文档同时提炼的分块数
+}
+
+
+# URL下载配置
+FETCH_CONFIG = {
+    "MAX_BYTES": DOC_CONFIG["MAX_FILE_SIZE"],  # 下载内容大小上限，边下载边检查
+    "ENABLE_CACHE": True,  # 按URL缓存内容，再次请求时用ETag/Last-Modified做条件请求
+    "CACHE_DIR": os.environ.get(
+        "FETCH_CACHE_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fetch_cache")
+    ),
+    "MAX_CACHE_ENTRIES": 200
+}
+
+
+# 网页正文提取配置
+HTML_CONFIG = {
+    "ENGINE": os.environ.get("HTML_ENGINE", "auto")  # auto（有lxml时使用lxml）、lxml、html.parser 或 bs4（原有方式）
+}
+
+
+# 正文图片转存配置，发布前把外部图片上传到微信并按内容去重
+IMAGE_CONFIG = {
+    "ENABLED": True,
+    "MAX_BYTES": 1024 * 1024,  # 单张图片大小上限（微信 uploadimg 限制为1MB）
+    "MAX_WORKERS": 4,  # 同时下载和上传的图片数
+    "DB_PATH": os.environ.get(
+        "WECHAT_IMAGE_DB",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "wechat_images.db")
+    )  # 图片内容哈希到微信地址的索引
+}
+
+
+# 操作日志配置，JSONL格式，由后台线程批量写入
+OPLOG_CONFIG = {
+    "ENABLED": os.environ.get("OPLOG_ENABLED", "true").lower() == "true",
+    "PATH": os.environ.get(
+        "OPLOG_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "operations.jsonl")
+    ),
+    "MAX_QUEUE": 10000,  # 待写入记录的队列上限，写满时丢弃新记录而不阻塞请求
+    "BATCH_SIZE": 200,  # 每批最多写入的记录数
+    "FLUSH_INTERVAL": 1.0,  # 攒批的最长等待时间（秒）
+    "MAX_BYTES": 10 * 1024 * 1024,  # 单个日志文件大小上限，超出后轮转
+    "BACKUP_COUNT": 5  # 保留的历史日志文件数
+}
+
+
+# 监控指标配置
+METRICS_CONFIG = {
+    "ENABLED": os.environ.get("METRICS_ENABLED", "true").lower() == "true",  # 是否开放 GET /metrics（Prometheus格式）
+    "SERVER_TIMING": os.environ.get("METRICS_SERVER_TIMING", "false").lower() == "true"  # 是否在响应头 Server-Timing 中返回各阶段耗时
+}
+
+
+# 请求和响应压缩配置
+COMPRESSION_CONFIG = {
+    "ENABLED": os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true",  # 是否按 Accept-Encoding 压缩响应
+    "MIN_BYTES": 1024,  # 小于该大小的响应不压缩
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 5,  # 需安装 brotli，未安装时只使用gzip
+    # 请求体（解压后）大小上限，读取过程中超出即返回413；需大于上传文件的大小上限
+    "MAX_REQUEST_BYTES": int(os.environ.get("MAX_REQUEST_BYTES", DOC_CONFIG["MAX_FILE_SIZE"] + 1024 * 1024))
+}
+
+
+# 服务启动配置，生产环境通过 python serve.py 启动
+SERVER_CONFIG = {
+    "MODE": os.environ.get("SERVER_MODE", "asgi"),  # asgi：异步模式（uvicorn），等待上游时不占用线程；wsgi：同步模式（gunicorn多线程）
+    "HOST": os.environ.get("SERVER_HOST", "0.0.0.0"),
+    "PORT": int(os.environ.get("SERVER_PORT", 5000)),
+    "WORKERS": int(os.environ.get("SERVER_WORKERS", 1)),  # 工作进程数；后台任务和增量排版的状态保存在进程内，多进程时需要反向代理按客户端保持会话
+    "THREADS": int(os.environ.get("SERVER_THREADS", 16)),  # 同步模式下每个进程的线程数
+    "WSGI_THREADS": int(os.environ.get("SERVER_WSGI_THREADS", 16)),  # 异步模式下其余接口（发布、后台任务等）交给Flask处理时使用的线程数
+    "TIMEOUT": int(os.environ.get("SERVER_TIMEOUT", 300)),  # 同步模式下单个请求的最长处理时间（秒）
+    "PRELOAD": os.environ.get("SERVER_PRELOAD", "true").lower() == "true",  # 在主进程中加载应用和较重的依赖后再fork工作进程，各进程共享这部分内存
+    # 工作进程接收请求前的预热步骤（逗号分隔）：imports 导入较重的依赖，llm 建立到AI服务的连接，
+    # wechat 建立到微信接口的连接并获取access_token；预热完成前 GET /ready 返回503
+    "WARMUP": [step.strip() for step in os.environ.get("SERVER_WARMUP", "").split(',') if step.strip()]
+}
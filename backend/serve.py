@@ -0,0 +1,85 @@
+"""生产环境启动入口，替代 app.run 的调试服务器
+
+    python serve.py
+
+按 SERVER_CONFIG（可用环境变量覆盖）启动：
+- asgi 模式（默认）：gunicorn 管理多个 uvicorn 工作进程运行 asgi:app，排版、生成和分析接口
+  在事件循环中等待上游，不占用线程
+- wsgi 模式：gunicorn 多线程工作进程运行 app:app，每个请求在处理期间占用一个线程
+
+PRELOAD 开启时主进程先加载应用和PDF解析等较重的依赖，再fork出工作进程，各进程按写时复制
+共享这部分内存，新工作进程也无需重新导入；每个工作进程在接收请求前按 WARMUP 执行预热：
+wsgi 模式在 post_worker_init 中执行，asgi 模式在应用启动（lifespan）时于工作进程的事件循环中
+执行。
+
+没有 gunicorn 的平台（如 Windows）上，asgi 模式直接由 uvicorn 启动多个工作进程（不预加载）。
+"""
+from config import SERVER_CONFIG
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # gunicorn 不支持 Windows
+    BaseApplication = None
+
+
+def warm_worker(worker):
+    """工作进程初始化完成、开始接收请求前执行预热（连接和token不能在fork前建立）"""
+    from utils.warmup import warmup
+    warmup.run()
+
+
+def gunicorn_options(mode):
+    options = {
+        "bind": f"{SERVER_CONFIG['HOST']}:{SERVER_CONFIG['PORT']}",
+        "workers": SERVER_CONFIG['WORKERS'],
+        "timeout": SERVER_CONFIG['TIMEOUT'],
+        "accesslog": "-",
+        "preload_app": SERVER_CONFIG['PRELOAD']
+    }
+    if mode == 'asgi':
+        # 预热在 lifespan 中执行：post_worker_init 时事件循环尚未启动，无法预热异步客户端
+        options["worker_class"] = "uvicorn_worker.UvicornWorker"
+    else:
+        options["worker_class"] = "gthread"
+        options["threads"] = SERVER_CONFIG['THREADS']
+        options["post_worker_init"] = warm_worker
+    return options
+
+
+if BaseApplication is not None:
+    class StandaloneApplication(BaseApplication):
+        def __init__(self, app_uri, options):
+            self.app_uri = app_uri
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            if self.options.get('preload_app'):
+                # 较重的依赖平时在首次使用时才导入，预加载时在fork前导入以便各工作进程共享
+                from utils.warmup import preload_modules
+                preload_modules()
+            module, _, name = self.app_uri.partition(':')
+            return getattr(__import__(module), name)
+
+
+def main():
+    mode = SERVER_CONFIG['MODE']
+    if mode not in ('asgi', 'wsgi'):
+        raise Exception(f"不支持的服务模式: {mode}")
+
+    app_uri = 'asgi:app' if mode == 'asgi' else 'app:app'
+    if BaseApplication is not None:
+        StandaloneApplication(app_uri, gunicorn_options(mode)).run()
+    elif mode == 'asgi':
+        import uvicorn
+        uvicorn.run(app_uri, host=SERVER_CONFIG['HOST'], port=SERVER_CONFIG['PORT'], workers=SERVER_CONFIG['WORKERS'])
+    else:
+        raise Exception("wsgi 模式需要安装 gunicorn")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,43 @@
-import requests
-from config import API_KEY, API_URL, API_MODEL
+from utils.llm import LLMClient
 
-class AIGenerator:
-    @staticmethod
-    def generate_article(prompt, max_tokens=2000):
-        """使用AI生成文章内容"""
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {API_KEY}"
-        }
-        
-        data = {
-            "model": API_MODEL,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": """你是一个专业的公众号文章写手，请根据用户的要求生成一篇内容丰富、结构清晰的文章。
+GENERATE_PROMPT = """你是一个专业的公众号文章写手，请根据用户的要求生成一篇内容丰富、结构清晰的文章。
 要求：
 1. 文章结构完整，包含标题、引言、主体和总结
 2. 语言通俗易懂，适合大众阅读
 3. 内容真实可靠，有数据支撑
 4. 适当使用小标题划分段落
 5. 字数控制在2000字以内"""
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "temperature": 0.7,
-            "max_tokens": max_tokens
-        }
-        
-        response = requests.post(API_URL, headers=headers, json=data)
-        result = response.json()
-        
-        if "choices" in result and len(result["choices"]) > 0:
-            return result["choices"][0]["message"]["content"]
-        else:
-            raise Exception("AI生成文章失败") 
\ No newline at end of file
+
+class AIGenerator:
+    @staticmethod
+    def build_messages(prompt, context=None):
+        """系统提示词固定不变，context（批量生成时各篇共用的背景说明）放在每篇主题之前，
+        使同一批请求的开头完全相同，可以命中AI服务端的前缀缓存"""
+        return [
+            {
+                "role": "system",
+                "content": GENERATE_PROMPT
+            },
+            {
+                "role": "user",
+                "content": f"{context}\n\n{prompt}" if context else prompt
+            }
+        ]
+
+    @staticmethod
+    def generate_article(prompt, max_tokens=2000, context=None):
+        """使用AI生成文章内容，相同提示词直接命中缓存"""
+        messages = AIGenerator.build_messages(prompt, context)
+        try:
+            return LLMClient.chat(messages, temperature=0.7, max_tokens=max_tokens)
+        except Exception as e:
+            raise Exception(f"AI生成文章失败: {str(e)}") from e
+
+    @staticmethod
+    async def agenerate_article(prompt, max_tokens=2000, context=None):
+        """generate_article 的异步版本"""
+        messages = AIGenerator.build_messages(prompt, context)
+        try:
+            return await LLMClient.achat(messages, temperature=0.7, max_tokens=max_tokens)
+        except Exception as e:
+            raise Exception(f"AI生成文章失败: {str(e)}") from e
@@ -0,0 +1,115 @@
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from config import HTTP_CONFIG
+from utils.metrics import observe_upstream
+
+# 只有异步模式（asgi.py）需要 httpx，首次创建客户端时才导入，同步模式不承担导入开销
+httpx = None
+
+
+def load_httpx():
+    global httpx
+    if httpx is None:
+        try:
+            import httpx as module
+        except ImportError:
+            raise Exception("异步模式需要安装 httpx")
+        httpx = module
+    return httpx
+
+
+def async_http_errors():
+    """下载失败等HTTP错误的基类，调用方据此区分网络错误和其他错误；尚未发起过异步请求时为空元组"""
+    return httpx.HTTPError if httpx else ()
+
+
+class AsyncHttpClient:
+    """异步模式使用的HTTP客户端，每个上游一个 httpx.AsyncClient，超时和重试策略与 HttpClient 一致
+
+    连接数不设上限（并发由调用方的信号量控制），只限制保持的长连接数。
+    客户端绑定创建时的事件循环，循环变化时重新创建。
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._clients = {}
+        self._loop = None
+
+    def get_client(self, upstream):
+        load_httpx()
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._clients = {}
+            self._loop = loop
+        client = self._clients.get(upstream)
+        if client is None:
+            options = self.config[upstream]
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(options['READ_TIMEOUT'], connect=options['CONNECT_TIMEOUT'], pool=None),
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=options['POOL_SIZE'])
+            )
+            self._clients[upstream] = client
+        return client
+
+    def backoff(self, upstream, attempt):
+        """第 attempt 次重试前的等待时间：指数退避加随机抖动"""
+        options = self.config[upstream]
+        return options['BACKOFF'] * (2 ** (attempt - 1)) + random.uniform(0, options['JITTER'])
+
+    async def send(self, upstream, method, url, stream=False, **kwargs):
+        """发起请求，连接失败时总是重试，读取失败和 STATUS_FORCELIST 中的状态码只对 RETRY_METHODS 重试"""
+        options = self.config[upstream]
+        retryable = method.upper() in options['RETRY_METHODS']
+        client = self.get_client(upstream)
+        attempt = 0
+        while True:
+            request = client.build_request(method, url, **kwargs)
+            try:
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                attempt += 1
+                can_retry = retryable or isinstance(e, httpx.ConnectError)
+                if not can_retry or attempt > options['RETRIES']:
+                    raise
+                await asyncio.sleep(self.backoff(upstream, attempt))
+                continue
+
+            if retryable and response.status_code in options['STATUS_FORCELIST'] and attempt < options['RETRIES']:
+                attempt += 1
+                await response.aclose()
+                await asyncio.sleep(self.backoff(upstream, attempt))
+                continue
+            return response
+
+    async def request(self, upstream, method, url, **kwargs):
+        """非流式请求，耗时计入当前请求的操作记录"""
+        start = time.perf_counter()
+        response = await self.send(upstream, method, url, **kwargs)
+        observe_upstream(upstream, time.perf_counter() - start)
+        return response
+
+    async def get(self, upstream, url, **kwargs):
+        return await self.request(upstream, 'GET', url, **kwargs)
+
+    async def post(self, upstream, url, **kwargs):
+        return await self.request(upstream, 'POST', url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, upstream, method, url, **kwargs):
+        """流式请求，退出时关闭响应；耗时由调用方读完响应后自行记录"""
+        response = await self.send(upstream, method, url, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def close(self):
+        """关闭所有客户端及其连接池"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+async_http_client = AsyncHttpClient(HTTP_CONFIG)
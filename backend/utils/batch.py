@@ -0,0 +1,151 @@
+import re
+import queue
+import asyncio
+from config import GENERATE_CONFIG
+from utils.ai_generator import AIGenerator
+from utils.formatter import ArticleFormatter
+from utils.oplog import ContextThreadPoolExecutor
+
+TITLE_PATTERN = re.compile(r'^\s*(?:#{1,6}\s*|标题[:：]\s*)?(.+?)\s*$')
+
+
+def extract_title(content):
+    """取生成文章的第一行非空文字作为标题，去掉Markdown标题符号、加粗和HTML标签"""
+    for line in content.splitlines():
+        line = re.sub(r'<[^>]+>|\*\*|__', '', line).strip()
+        if line:
+            return TITLE_PATTERN.match(line).group(1)[:64]
+    return "未命名文章"
+
+
+class BatchProgress:
+    """统计批量生成的成功和失败数"""
+
+    def __init__(self, total):
+        self.total = total
+        self.succeeded = 0
+        self.failed = 0
+
+    def add(self, event, data):
+        """记录一篇文章的结果，返回该结果事件和随后的进度事件"""
+        if event == "result":
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        return [(event, data), ("progress", {
+            "completed": self.succeeded + self.failed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "total": self.total
+        })]
+
+    def done(self):
+        return "done", {"total": self.total, "succeeded": self.succeeded, "failed": self.failed}
+
+
+class BatchGenerator:
+    """批量生成文章
+
+    各主题并发生成，同时处理的数量不超过 GENERATE_CONFIG['MAX_WORKERS']（AI请求仍受全局限流
+    约束）。每篇文章依次经过 生成 → 排版（可选）→ 发布到草稿箱（可选），某一篇失败只产出该篇的
+    failed 事件，不影响其他文章。
+
+    依次产出 (事件名, 数据) 元组：
+    - result: 某篇文章完成，包含序号、主题、生成内容，以及排版结果、标题和草稿 media_id
+    - failed: 某篇文章失败，包含失败的阶段和错误信息，已完成阶段的结果仍然返回
+    - progress: 已完成数、成功数、失败数和总数
+    - done: 全部结束
+    """
+
+    @staticmethod
+    def run_item(index, prompt, context=None, format_mode=None, publisher=None):
+        result = {"index": index, "prompt": prompt}
+        stage = "generate"
+        try:
+            content = AIGenerator.generate_article(prompt, context=context)
+            result["content"] = content
+            if format_mode:
+                stage = "format"
+                result["formatted"] = ArticleFormatter.format_article(content, format_mode)
+            if publisher:
+                stage = "publish"
+                result["title"] = extract_title(content)
+                result["media_id"] = publisher(result["title"], result.get("formatted", content))
+            return "result", result
+        except Exception as e:
+            return "failed", dict(result, stage=stage, error=str(e))
+
+    @staticmethod
+    async def arun_item(index, prompt, context=None, format_mode=None, publisher=None):
+        """run_item 的异步版本，publisher 为异步函数"""
+        result = {"index": index, "prompt": prompt}
+        stage = "generate"
+        try:
+            content = await AIGenerator.agenerate_article(prompt, context=context)
+            result["content"] = content
+            if format_mode:
+                stage = "format"
+                result["formatted"] = await ArticleFormatter.aformat_article(content, format_mode)
+            if publisher:
+                stage = "publish"
+                result["title"] = extract_title(content)
+                result["media_id"] = await publisher(result["title"], result.get("formatted", content))
+            return "result", result
+        except Exception as e:
+            return "failed", dict(result, stage=stage, error=str(e))
+
+    @staticmethod
+    def generate_stream(prompts, context=None, format_mode=None, publisher=None):
+        """并发处理所有主题，每完成一篇立即产出事件"""
+        total = len(prompts)
+        events = queue.Queue()
+        max_workers = max(1, min(GENERATE_CONFIG['MAX_WORKERS'], total))
+        executor = ContextThreadPoolExecutor(max_workers=max_workers)
+
+        def worker(index, prompt):
+            events.put(BatchGenerator.run_item(index, prompt, context, format_mode, publisher))
+
+        progress = BatchProgress(total)
+        try:
+            for i, prompt in enumerate(prompts):
+                executor.submit(worker, i, prompt)
+            for _ in range(total):
+                yield from progress.add(*events.get())
+            yield progress.done()
+        finally:
+            # 客户端断开时不再处理尚未开始的主题
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    async def agenerate_stream(prompts, context=None, format_mode=None, publisher=None):
+        """generate_stream 的异步版本"""
+        total = len(prompts)
+        slots = asyncio.Semaphore(max(1, GENERATE_CONFIG['MAX_WORKERS']))
+
+        async def worker(index, prompt):
+            async with slots:
+                return await BatchGenerator.arun_item(index, prompt, context, format_mode, publisher)
+
+        progress = BatchProgress(total)
+        tasks = [asyncio.create_task(worker(i, prompt)) for i, prompt in enumerate(prompts)]
+        try:
+            for future in asyncio.as_completed(tasks):
+                for event, data in progress.add(*await future):
+                    yield event, data
+            yield progress.done()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def collect(events):
+        """把事件汇总为非流式返回的结果，按主题顺序排列"""
+        results = []
+        summary = {}
+        for event, data in events:
+            if event in ("result", "failed"):
+                results.append(dict(data, success=event == "result"))
+            elif event == "done":
+                summary = data
+        results.sort(key=lambda item: item["index"])
+        return dict(summary, results=results)
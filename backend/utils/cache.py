@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from config import CACHE_CONFIG
+
+
+class LLMCache:
+    """两级AI响应缓存：内存LRU + SQLite磁盘持久化
+
+    缓存键由模型、提示词、温度和文本内容计算哈希得到，内容不变即可命中。
+    """
+
+    def __init__(self, db_path, max_memory_entries=512, max_disk_entries=20000, ttl=7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0
+        }
+        if self.db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "created REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed)")
+
+    @staticmethod
+    def make_key(model, messages, temperature, max_tokens=None):
+        """根据请求参数计算缓存键"""
+        payload = json.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            },
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _connect(self):
+        """每个线程复用一个SQLite连接"""
+        conn = getattr(self._local, 'conn', None)
+        # 预加载后 fork 出的工作进程不能沿用父进程打开的连接
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _remember(self, key, value, created):
+        """写入内存层，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._memory[key] = (value, created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _expired(self, created):
+        return bool(self.ttl) and time.time() - created > self.ttl
+
+    def get(self, key):
+        """读取缓存，先查内存再查磁盘，未命中返回None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+
+        if self.db_path:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and not self._expired(row[1]):
+                with conn:
+                    conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+                self._remember(key, row[0], row[1])
+                self._count("disk_hits")
+                return row[0]
+
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        """写入两级缓存"""
+        now = time.time()
+        self._remember(key, value, now)
+        self._count("sets")
+
+        if self.db_path:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+            with self._lock:
+                self._writes += 1
+                should_purge = self._writes % 100 == 0
+            if should_purge:
+                self.purge()
+
+    def purge(self):
+        """清理磁盘层中过期和超出容量的条目"""
+        if not self.db_path:
+            return
+        conn = self._connect()
+        with conn:
+            removed = 0
+            if self.ttl:
+                removed += conn.execute(
+                    "DELETE FROM llm_cache WHERE created < ?", (time.time() - self.ttl,)
+                ).rowcount
+            removed += conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,)
+            ).rowcount
+        self._count("evictions", removed)
+
+    def clear(self):
+        """清空所有缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        """返回命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        if self.db_path:
+            stats["disk_entries"] = self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+llm_cache = LLMCache(
+    CACHE_CONFIG['DB_PATH'] if CACHE_CONFIG['ENABLE_DISK'] else None,
+    max_memory_entries=CACHE_CONFIG['MAX_MEMORY_ENTRIES'],
+    max_disk_entries=CACHE_CONFIG['MAX_DISK_ENTRIES'],
+    ttl=CACHE_CONFIG['TTL']
+)
@@ -0,0 +1,214 @@
+import re
+import math
+import hashlib
+from utils.metrics import timed_stage
+
+# 中日韩文字、全角标点按每字一个token估算，其余字符按约4个字符一个token估算
+CJK_PATTERN = re.compile(r'[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef\u3000-\u303f]')
+SENTENCE_PATTERN = re.compile(r'[^\n]*?(?:[。！？!?]+[”’"\')）]*|\.(?=\s)|\n|$)')
+FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+HEADING_PATTERN = re.compile(r'^\s{0,3}#{1,6}\s')
+LIST_PATTERN = re.compile(r'^\s*(?:[-*+]|\d+[.)、])\s')
+TABLE_PATTERN = re.compile(r'^\s*\|')
+
+
+def estimate_tokens(text):
+    """估算文本的token数"""
+    cjk = len(CJK_PATTERN.findall(text))
+    other = len(text) - cjk - text.count(' ') - text.count('\n')
+    return cjk + math.ceil(max(other, 0) / 4)
+
+
+def split_blocks(text):
+    """单次遍历按行切分为结构块，返回 (类型, 行列表)
+
+    类型包括 heading、code、table、list、paragraph，代码块和表格不会被拆开。
+    """
+    blocks = []
+    kind = None
+    lines = []
+
+    def flush():
+        nonlocal kind, lines
+        if lines:
+            blocks.append((kind, lines))
+        kind, lines = None, []
+
+    for line in text.splitlines():
+        if kind == 'code':
+            lines.append(line)
+            if FENCE_PATTERN.match(line):
+                flush()
+            continue
+
+        if FENCE_PATTERN.match(line):
+            flush()
+            kind, lines = 'code', [line]
+        elif not line.strip():
+            flush()
+        elif HEADING_PATTERN.match(line):
+            flush()
+            blocks.append(('heading', [line]))
+        elif TABLE_PATTERN.match(line):
+            if kind != 'table':
+                flush()
+                kind = 'table'
+            lines.append(line)
+        elif LIST_PATTERN.match(line) or (kind == 'list' and line[:1].isspace()):
+            if kind != 'list':
+                flush()
+                kind = 'list'
+            lines.append(line)
+        else:
+            if kind != 'paragraph':
+                flush()
+                kind = 'paragraph'
+            lines.append(line)
+
+    flush()
+    return blocks
+
+
+def split_sentences(text):
+    """按中英文句末标点和换行切分句子"""
+    return [s for s in SENTENCE_PATTERN.findall(text) if s.strip()]
+
+
+def hard_split(text, max_tokens):
+    """超长句子按token预算强制切分"""
+    pieces = []
+    start = 0
+    budget = 0
+    for i, char in enumerate(text):
+        budget += 1 if CJK_PATTERN.match(char) else 0.25
+        if budget > max_tokens:
+            pieces.append(text[start:i])
+            start = i
+            budget = 1 if CJK_PATTERN.match(char) else 0.25
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+def block_units(kind, lines, max_tokens):
+    """把超出预算的块拆成更小的单元
+
+    代码块和表格按行拆分，列表按条目拆分，段落按句子拆分，仍超长时强制切分。
+    """
+    if kind in ('code', 'table', 'list'):
+        units = lines
+        separator = '\n'
+    else:
+        units = split_sentences('\n'.join(lines))
+        separator = ''
+
+    for unit in units:
+        if estimate_tokens(unit) > max_tokens:
+            for piece in hard_split(unit, max_tokens):
+                yield piece, separator
+        else:
+            yield unit, separator
+
+
+@timed_stage('chunk')
+def chunk_text(text, max_tokens=2000):
+    """将长文本按结构边界切分为token数均匀的分块
+
+    优先在段落、标题、列表、代码块和表格的边界处切分；单个块超过预算时再按句子
+    切分，单个句子仍超长时强制切分。标题总是与后面的内容放在同一分块。
+    """
+    chunks = []
+    parts = []
+    tokens = 0
+    last_kind = None
+
+    def flush():
+        nonlocal parts, tokens
+        chunk = ''.join(parts).strip()
+        if chunk:
+            chunks.append(chunk)
+        parts, tokens = [], 0
+
+    for kind, lines in split_blocks(text):
+        block = '\n'.join(lines)
+        block_tokens = estimate_tokens(block)
+
+        if tokens + block_tokens > max_tokens:
+            # 当前分块以标题结尾时，把标题移到下一分块，避免标题与正文分离
+            heading = None
+            if last_kind == 'heading' and parts:
+                heading = parts.pop()
+            flush()
+            if heading:
+                parts.append(heading)
+                tokens = estimate_tokens(heading)
+
+        if tokens + block_tokens <= max_tokens:
+            parts.append(block + '\n\n')
+            tokens += block_tokens
+        else:
+            for unit, separator in block_units(kind, lines, max_tokens):
+                unit_tokens = estimate_tokens(unit)
+                if tokens + unit_tokens > max_tokens:
+                    flush()
+                parts.append(unit + separator)
+                tokens += unit_tokens
+            parts.append('\n\n')
+        last_kind = kind
+
+    flush()
+    return chunks
+
+
+def is_cut_point(unit, unit_tokens, target_tokens):
+    """根据单元内容的哈希决定是否在其后切分，概率与单元token数成正比"""
+    digest = hashlib.sha1(unit.encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') / 2 ** 32 < unit_tokens / target_tokens
+
+
+@timed_stage('chunk')
+def chunk_text_stable(text, max_tokens=2000, target_tokens=800):
+    """按内容定义的边界切分文本，用于增量排版
+
+    是否在某个块之后切分只由该块的内容决定（平均分块约 target_tokens），
+    与它在文中的位置无关。局部修改只会改变所在分块及其后一两个分块，
+    更后面的分块内容保持不变，可以直接复用之前的排版结果。
+    """
+    chunks = []
+    parts = []
+    tokens = 0
+    min_tokens = target_tokens // 4
+
+    def flush():
+        nonlocal parts, tokens
+        chunk = ''.join(part for part, _ in parts).strip()
+        if chunk:
+            chunks.append(chunk)
+        parts, tokens = [], 0
+
+    # parts 中每项为 (文本, 是否为标题)
+    for kind, lines in split_blocks(text):
+        block = '\n'.join(lines)
+        block_tokens = estimate_tokens(block)
+        if block_tokens <= max_tokens:
+            units = [(block, '\n\n')]
+        else:
+            units = list(block_units(kind, lines, max_tokens))
+            units[-1] = (units[-1][0], '\n\n')
+
+        for unit, separator in units:
+            unit_tokens = estimate_tokens(unit)
+            if tokens + unit_tokens > max_tokens:
+                # 超出预算时强制切分，标题仍与后面的内容放在一起
+                heading = parts.pop() if parts and parts[-1][1] else None
+                flush()
+                if heading:
+                    parts.append(heading)
+                    tokens = estimate_tokens(heading[0])
+            parts.append((unit + separator, kind == 'heading'))
+            tokens += unit_tokens
+            if kind != 'heading' and tokens >= min_tokens and is_cut_point(unit, unit_tokens, target_tokens):
+                flush()
+
+    flush()
+    return chunks
@@ -0,0 +1,196 @@
+"""请求和响应压缩
+
+- 响应：按 Accept-Encoding 协商，优先使用brotli（需安装 brotli，未安装时只用gzip），只压缩
+  达到一定大小的JSON、HTML和文本响应；SSE流式响应不压缩，保证每个事件及时送达
+- 请求：支持 Content-Encoding 为 gzip、deflate、br 的请求体，读取时逐块解压，解压后的
+  大小超过上限时立即中止，防止压缩炸弹
+"""
+import gzip
+import json
+import zlib
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import get_input_stream
+from config import COMPRESSION_CONFIG
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只使用gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'image/svg+xml', 'text/')
+READ_CHUNK = 64 * 1024
+# 每次解压的输入大小，单次解压的输出随之受限，超出上限时能及时中止
+DECODE_SLICE = 8 * 1024
+# 解压后的请求在 environ 中记录原编码
+DECODED_ENCODING_KEY = 'compression.request_encoding'
+
+
+def response_encodings():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def request_encodings():
+    return ('gzip', 'x-gzip', 'deflate', 'br') if brotli else ('gzip', 'x-gzip', 'deflate')
+
+
+def negotiate(accept_encoding):
+    """根据 Accept-Encoding 选择响应编码，q值相同时优先brotli；不接受压缩时返回None"""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in response_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compressible(content_type, size):
+    """响应是否值得压缩：类型为文本类且达到最小大小，SSE除外"""
+    if not COMPRESSION_CONFIG['ENABLED'] or size < COMPRESSION_CONFIG['MIN_BYTES']:
+        return False
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    return mimetype.startswith(COMPRESSIBLE_TYPES) and mimetype != 'text/event-stream'
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESSION_CONFIG['BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=COMPRESSION_CONFIG['GZIP_LEVEL'], mtime=0)
+
+
+def compress_body(body, accept_encoding):
+    """按协商结果压缩响应体，返回 (响应体, 编码)；不压缩时编码为None"""
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return body, None
+    compressed = compress(body, encoding)
+    if len(compressed) >= len(body):
+        return body, None
+    return compressed, encoding
+
+
+class BodyDecoder:
+    """逐块解压请求体，解压后的总大小超过 limit 时抛出 RequestEntityTooLarge"""
+
+    def __init__(self, encoding, limit=None):
+        if encoding == 'br':
+            self._decompressor = brotli.Decompressor()
+            self._decompress = self._decompressor.process
+        else:
+            # gzip 带文件头，deflate 按HTTP规范为zlib格式
+            wbits = 16 + zlib.MAX_WBITS if encoding in ('gzip', 'x-gzip') else zlib.MAX_WBITS
+            self._decompressor = zlib.decompressobj(wbits)
+            self._decompress = self._decompressor.decompress
+        self.encoding = encoding
+        self.limit = limit
+        self.total = 0
+
+    def decode(self, data):
+        parts = []
+        for start in range(0, len(data), DECODE_SLICE):
+            try:
+                part = self._decompress(data[start:start + DECODE_SLICE])
+            except Exception as e:
+                raise BadRequest(f"请求体解压失败: {str(e)}")
+            self.total += len(part)
+            if self.limit is not None and self.total > self.limit:
+                raise RequestEntityTooLarge("请求体超过大小限制")
+            parts.append(part)
+        return b''.join(parts)
+
+    def finish(self):
+        """请求体读取完毕时调用，检查压缩数据是否完整"""
+        if self.encoding == 'br':
+            finished = self._decompressor.is_finished()
+        else:
+            finished = self._decompressor.eof
+        if not finished:
+            raise BadRequest("请求体解压失败: 压缩数据不完整")
+        return b''
+
+
+class DecodingStream:
+    """解压后的只读流，每次从原始流读取一块再解压"""
+
+    def __init__(self, stream, decoder):
+        self.stream = stream
+        self.decoder = decoder
+        self.buffer = bytearray()
+        self.eof = False
+
+    def _fill(self, size):
+        while not self.eof and (size < 0 or len(self.buffer) < size):
+            chunk = self.stream.read(READ_CHUNK)
+            if chunk:
+                self.buffer += self.decoder.decode(chunk)
+            else:
+                self.eof = True
+                self.buffer += self.decoder.finish()
+
+    def read(self, size=-1):
+        size = -1 if size is None else size
+        self._fill(size)
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        while b'\n' not in self.buffer and not self.eof:
+            self._fill(len(self.buffer) + READ_CHUNK)
+        end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        if size is not None and 0 <= size < end:
+            end = size
+        return self.read(end)
+
+
+def unsupported_encoding(encoding):
+    return Response(
+        json.dumps({"error": f"不支持的请求体编码: {encoding}"}, ensure_ascii=False),
+        status=415,
+        mimetype='application/json'
+    )
+
+
+class DecompressRequestMiddleware:
+    """WSGI中间件：解压带 Content-Encoding 的请求体，应用读到的是解压后的内容
+
+    原 Content-Length 是压缩后的长度，改为标记 wsgi.input_terminated，由Flask按
+    MAX_CONTENT_LENGTH 限制解压后的大小。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if not encoding or encoding == 'identity':
+            return self.app(environ, start_response)
+        if encoding not in request_encodings():
+            return unsupported_encoding(encoding)(environ, start_response)
+
+        stream = get_input_stream(environ)
+        decoder = BodyDecoder(encoding, COMPRESSION_CONFIG['MAX_REQUEST_BYTES'])
+        environ['wsgi.input'] = DecodingStream(stream, decoder)
+        environ['wsgi.input_terminated'] = True
+        environ.pop('CONTENT_LENGTH', None)
+        environ.pop('HTTP_CONTENT_ENCODING', None)
+        environ[DECODED_ENCODING_KEY] = encoding
+        return self.app(environ, start_response)
@@ -1,13 +1,86 @@
-import fitz  # PyMuPDF
 import requests
-import tempfile
 import os
-from bs4 import BeautifulSoup
+import asyncio
+import tempfile
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urlparse
 from werkzeug.utils import secure_filename
 from config import DOC_CONFIG
+from utils.fetcher import url_fetcher, sniff_content_type
+from utils.async_http import async_http_errors
+from utils.html_extract import HTMLExtractor
+from utils.docx_extract import is_docx, docx_to_markdown
+from utils.uploads import read_upload
+from utils.metrics import timed_stage
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def open_pdf(source):
+    """打开PDF，source可以是文件路径或内存中的字节"""
+    import fitz  # PyMuPDF，导入较慢，首次解析PDF时才加载
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype='pdf')
+    return fitz.open(source)
+
+
+def extract_page_range(source, start, end):
+    """提取指定页码范围的文本，在子进程中执行"""
+    with open_pdf(source) as doc:
+        return [doc[i].get_text() for i in range(start, end)]
+
+
+def get_pdf_pool():
+    """获取进程池，首次使用时创建并在请求间复用
+
+    子进程由 forkserver 启动（不支持时用 spawn）：服务进程是多线程的，直接 fork 可能继承
+    其他线程持有的锁而卡死。
+    """
+    global _pdf_pool
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                _pdf_pool = ProcessPoolExecutor(
+                    max_workers=DOC_CONFIG['PDF_WORKERS'],
+                    mp_context=multiprocessing.get_context(method)
+                )
+    return _pdf_pool
+
 
 class DocumentProcessor:
+    # 文件文本提取器：{文件类型: 提取函数}，类型按文件内容判断，与扩展名无关
+    extractors = {}
+
+    @staticmethod
+    def register_extractor(kind, extractor):
+        """注册一种文件类型的提取器，extractor 接收文件字节，返回文本"""
+        DocumentProcessor.extractors[kind] = extractor
+
+    @staticmethod
+    def sniff_file_type(data):
+        """根据文件头判断文件类型：pdf、docx、doc，无法识别时返回None"""
+        kind = sniff_content_type(data[:2048])
+        if kind == 'zip':
+            return 'docx' if is_docx(data) else None
+        if kind == 'ole':
+            return 'doc'
+        return kind if kind == 'pdf' else None
+
+    @staticmethod
+    def extract_text_from_file(data):
+        """按文件内容选择提取器，返回 (文件类型, 文本)"""
+        kind = DocumentProcessor.sniff_file_type(data)
+        extractor = DocumentProcessor.extractors.get(kind)
+        if extractor is None:
+            raise Exception("不支持的文件类型")
+        return kind, extractor(data)
+
     @staticmethod
     def is_allowed_file(filename):
         """检查文件类型是否允许"""
@@ -15,52 +88,96 @@ class DocumentProcessor:
             filename.rsplit('.', 1)[1].lower() in DOC_CONFIG['ALLOWED_EXTENSIONS']
 
     @staticmethod
-    def extract_text_from_pdf(file_path):
-        """从PDF提取文本"""
+    def iter_pdf_pages(source):
+        """逐页产出PDF文本
+
+        页数较多时按页码范围分给进程池并行提取，仍按原始页序产出：同时最多提交进程数两倍的
+        任务，最前面的任务完成后即产出其页面并提交下一个，已提取而未取走的文本不会随页数
+        增长。内存中的PDF先写入一个临时文件，各任务只传递文件路径，不必把整个文件逐个发送
+        给子进程。
+        """
+        with open_pdf(source) as doc:
+            page_count = doc.page_count
+            if page_count < DOC_CONFIG['PDF_PARALLEL_PAGES'] or DOC_CONFIG['PDF_WORKERS'] <= 1:
+                for page in doc:
+                    yield page.get_text()
+                return
+
+        path = source
+        if not isinstance(source, str):
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+                f.write(source)
+                path = f.name
+
+        step = DOC_CONFIG['PDF_PAGES_PER_TASK']
+        window = DOC_CONFIG['PDF_WORKERS'] * 2
+        pending = deque()
+        try:
+            pool = get_pdf_pool()
+            for start in range(0, page_count, step):
+                pending.append(pool.submit(extract_page_range, path, start, min(start + step, page_count)))
+                if len(pending) >= window:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            # 提前结束时取消尚未开始的任务；已开始的任务结果不再使用，删除文件后读取失败也无影响
+            for future in pending:
+                future.cancel()
+            if path is not source:
+                os.unlink(path)
+
+    @staticmethod
+    @timed_stage('pdf_extract')
+    def extract_text_from_pdf(source):
+        """从PDF提取文本，source可以是文件路径或内存中的字节"""
         try:
-            doc = fitz.open(file_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text
+            return "".join(DocumentProcessor.iter_pdf_pages(source))
         except Exception as e:
             raise Exception(f"PDF文件处理失败: {str(e)}")
 
+    @staticmethod
+    @timed_stage('docx_extract')
+    def extract_text_from_docx(source):
+        """从DOCX提取Markdown文本，保留标题、列表和表格"""
+        try:
+            return docx_to_markdown(source)
+        except Exception as e:
+            raise Exception(f"Word文件处理失败: {str(e)}")
+
+    @staticmethod
+    def reject_doc(source):
+        raise Exception("暂不支持旧版Word（.doc）文件，请在Word中另存为 .docx 后上传")
+
+    @staticmethod
+    def extract_text_from_html(html, encoding=None):
+        """从网页HTML提取正文文本，html为字节时根据响应头或meta判断编码"""
+        return HTMLExtractor.extract(html, encoding)
+
+    @staticmethod
+    def extract_text_from_fetched(fetched):
+        """从下载结果提取文本；内容未变化（304）时直接使用上次解析的文本"""
+        text = url_fetcher.load_text(fetched) if fetched.from_cache else None
+        if text is not None:
+            return text
+
+        if fetched.kind == 'html':
+            text = DocumentProcessor.extract_text_from_html(fetched.content, fetched.encoding)
+        elif fetched.kind == 'text':
+            text = fetched.content.decode(fetched.encoding or 'utf-8', errors='replace')
+        else:
+            # PDF、Word等文件
+            _, text = DocumentProcessor.extract_text_from_file(fetched.content)
+
+        url_fetcher.store_text(fetched, text)
+        return text
+
     @staticmethod
     def extract_text_from_url(url):
         """从URL提取文本内容"""
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            # 获取网页内容
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 移除脚本和样式元素
-            for script in soup(["script", "style"]):
-                script.decompose()
-                
-            # 获取正文内容
-            # 常见的文章容器class名称
-            article_classes = ['article', 'post', 'content', 'main-content', 'entry-content']
-            article_content = None
-            
-            # 尝试找到文章主体
-            for class_name in article_classes:
-                article = soup.find(class_=class_name)
-                if article:
-                    article_content = article
-                    break
-            
-            # 如果没找到特定容器，就获取body内容
-            if not article_content:
-                article_content = soup.body
-                
-            # 提取文本
-            text = article_content.get_text(separator='\n', strip=True)
-            return text
-            
+            fetched = url_fetcher.fetch(url)
+            return DocumentProcessor.extract_text_from_fetched(fetched)
         except Exception as e:
             raise Exception(f"URL内容提取失败: {str(e)}")
 
@@ -70,73 +187,61 @@ class DocumentProcessor:
         if not file:
             raise Exception("未收到文件")
 
-        filename = secure_filename(file.filename)
-        if not DocumentProcessor.is_allowed_file(filename):
+        # secure_filename 会去掉中文，扩展名按原文件名检查
+        if not DocumentProcessor.is_allowed_file(file.filename or ''):
             raise Exception("不支持的文件类型")
+        filename = secure_filename(file.filename)
 
-        # 检查文件大小
-        file.seek(0, os.SEEK_END)
-        size = file.tell()
-        file.seek(0)
-        
-        if size > DOC_CONFIG['MAX_FILE_SIZE']:
-            raise Exception("文件大小超过限制")
+        # 接收时已写入内存缓冲区并检查大小，这里直接取出内容
+        data = read_upload(file)
+        size = len(data)
 
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(filename)[1], delete=False) as tmp_file:
-            file.save(tmp_file.name)
-            tmp_path = tmp_file.name
+        _, text = DocumentProcessor.extract_text_from_file(data)
+        return {
+            'filename': filename,
+            'text': text,
+            'size': f"{size / 1024 / 1024:.2f}MB"
+        }
 
+    @staticmethod
+    def download_and_process_file(url):
+        """下载并处理URL文件，按内容而不是URL后缀判断类型"""
         try:
-            if filename.lower().endswith('.pdf'):
-                text = DocumentProcessor.extract_text_from_pdf(tmp_path)
-                # 返回文件名和提取的文本
-                return {
-                    'filename': filename,
-                    'text': text,
-                    'size': f"{size / 1024 / 1024:.2f}MB"
-                }
-            else:
-                raise Exception("不支持的文件类型")
-        finally:
-            os.unlink(tmp_path)
+            fetched = url_fetcher.fetch(url)
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"文件下载失败: {str(e)}")
+
+        text = DocumentProcessor.extract_text_from_fetched(fetched)
+        return DocumentProcessor.describe_download(url, fetched, text)
 
     @staticmethod
-    def download_and_process_file(url):
-        """下载并处理URL文件"""
-        parsed_url = urlparse(url)
-        
-        # 如果是PDF文件
-        if parsed_url.path.lower().endswith('.pdf'):
-            try:
-                response = requests.get(url, timeout=30)
-                response.raise_for_status()
-                
-                # 检查文件大小
-                content_length = int(response.headers.get('content-length', 0))
-                if content_length > DOC_CONFIG['MAX_FILE_SIZE']:
-                    raise Exception("文件大小超过限制")
-
-                # 创建临时文件
-                with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-                    tmp_file.write(response.content)
-                    tmp_path = tmp_file.name
-
-                try:
-                    text = DocumentProcessor.extract_text_from_pdf(tmp_path)
-                    return {
-                        'filename': os.path.basename(parsed_url.path),
-                        'text': text,
-                        'size': f"{content_length / 1024 / 1024:.2f}MB"
-                    }
-                finally:
-                    os.unlink(tmp_path)
-                    
-            except requests.exceptions.RequestException as e:
-                raise Exception(f"PDF下载失败: {str(e)}")
-        else:
-            # 如果是普通网页
+    async def adownload_and_process_file(url):
+        """download_and_process_file 的异步版本：异步下载，PDF和网页解析放到线程中执行"""
+        try:
+            fetched = await url_fetcher.afetch(url)
+        except async_http_errors() as e:
+            raise Exception(f"文件下载失败: {str(e)}")
+
+        text = await asyncio.to_thread(DocumentProcessor.extract_text_from_fetched, fetched)
+        return DocumentProcessor.describe_download(url, fetched, text)
+
+    @staticmethod
+    def describe_download(url, fetched, text):
+        # 如果是PDF、Word等文件
+        if fetched.kind not in ('html', 'text'):
             return {
-                'url': url,
-                'text': DocumentProcessor.extract_text_from_url(url)
-            } 
\ No newline at end of file
+                'filename': os.path.basename(urlparse(url).path) or f"document.{fetched.kind}",
+                'text': text,
+                'size': f"{fetched.size / 1024 / 1024:.2f}MB"
+            }
+
+        # 如果是普通网页
+        return {
+            'url': url,
+            'text': text
+        }
+
+
+DocumentProcessor.register_extractor('pdf', DocumentProcessor.extract_text_from_pdf)
+DocumentProcessor.register_extractor('docx', DocumentProcessor.extract_text_from_docx)
+DocumentProcessor.register_extractor('doc', DocumentProcessor.reject_doc)
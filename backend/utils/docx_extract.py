@@ -0,0 +1,242 @@
+"""DOCX文本提取：流式读取 word/document.xml，按段落转为Markdown
+
+不把整个文档树载入内存：用增量XML解析器逐个处理段落和表格，处理完即释放。
+标题、列表和表格保留为Markdown结构，排版时AI无需再从纯文本中推断文章结构。
+"""
+import re
+import io
+import zipfile
+import xml.etree.ElementTree as ET
+from config import DOC_CONFIG
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+HEADING_STYLE_PATTERN = re.compile(r'^(?:heading|标题)\s*(\d)$', re.I)
+# 有序列表使用的编号格式，其余（bullet、none等）按无序列表处理
+ORDERED_FORMATS = {
+    'decimal', 'decimalZero', 'decimalEnclosedCircle', 'decimalEnclosedParen', 'decimalEnclosedFullstop',
+    'upperRoman', 'lowerRoman', 'upperLetter', 'lowerLetter',
+    'chineseCounting', 'chineseCountingThousand', 'ideographTraditional', 'japaneseCounting'
+}
+MAX_STYLE_DEPTH = 10
+LIST_ITEM_PATTERN = re.compile(r'^\s*(?:-|\d+\.) ')
+
+
+def is_docx(data):
+    """zip文件中是否包含Word正文"""
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            return 'word/document.xml' in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+
+def read_part(archive, name):
+    """读取样式、编号等较小的部件，不存在时返回None"""
+    try:
+        return ET.fromstring(archive.read(name))
+    except KeyError:
+        return None
+
+
+def load_heading_styles(archive):
+    """段落样式ID到标题级别的映射，考虑 basedOn 继承"""
+    root = read_part(archive, 'word/styles.xml')
+    if root is None:
+        return {}
+
+    styles = {}
+    for style in root.iter(f'{W}style'):
+        if style.get(f'{W}type') != 'paragraph':
+            continue
+        name = style.find(f'{W}name')
+        outline = style.find(f'{W}pPr/{W}outlineLvl')
+        based_on = style.find(f'{W}basedOn')
+        styles[style.get(f'{W}styleId')] = (
+            name.get(f'{W}val', '') if name is not None else '',
+            outline.get(f'{W}val') if outline is not None else None,
+            based_on.get(f'{W}val') if based_on is not None else None
+        )
+
+    def level(style_id, depth=0):
+        if style_id not in styles or depth > MAX_STYLE_DEPTH:
+            return None
+        name, outline, based_on = styles[style_id]
+        if name.lower() == 'title':
+            return 1
+        match = HEADING_STYLE_PATTERN.match(name)
+        if match:
+            return int(match.group(1))
+        if outline is not None and outline.isdigit() and int(outline) < 6:
+            return int(outline) + 1
+        return level(based_on, depth + 1)
+
+    return {style_id: level(style_id) for style_id in styles if level(style_id)}
+
+
+def load_list_formats(archive):
+    """编号ID到各级编号格式的映射：{numId: {ilvl: 格式}}"""
+    root = read_part(archive, 'word/numbering.xml')
+    if root is None:
+        return {}
+
+    abstract = {}
+    for item in root.iter(f'{W}abstractNum'):
+        levels = {}
+        for lvl in item.iter(f'{W}lvl'):
+            fmt = lvl.find(f'{W}numFmt')
+            levels[lvl.get(f'{W}ilvl')] = fmt.get(f'{W}val') if fmt is not None else 'bullet'
+        abstract[item.get(f'{W}abstractNumId')] = levels
+
+    formats = {}
+    for num in root.iter(f'{W}num'):
+        ref = num.find(f'{W}abstractNumId')
+        if ref is not None:
+            formats[num.get(f'{W}numId')] = abstract.get(ref.get(f'{W}val'), {})
+    return formats
+
+
+def paragraph_text(paragraph):
+    """段落中的文字，跳过修订删除的内容和域代码"""
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == f'{W}t':
+            parts.append(node.text or '')
+        elif node.tag == f'{W}tab':
+            parts.append('\t')
+        elif node.tag in (f'{W}br', f'{W}cr'):
+            parts.append('\n')
+    return ''.join(parts).strip()
+
+
+def table_markdown(rows):
+    """把表格行转为Markdown表格，第一行作为表头"""
+    width = max(len(row) for row in rows)
+    lines = []
+    for i, row in enumerate(rows):
+        cells = [cell.replace('|', '\\|').replace('\n', ' ') for cell in row] + [''] * (width - len(row))
+        lines.append('| ' + ' | '.join(cells) + ' |')
+        if i == 0:
+            lines.append('|' + ' --- |' * width)
+    return '\n'.join(lines)
+
+
+class DocxReader:
+    """逐块产出Markdown：标题、段落、列表项和表格"""
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.headings = load_heading_styles(archive)
+        self.list_formats = load_list_formats(archive)
+        self.counters = {}
+        self.tables = []  # 嵌套的表格，每个为 [行[单元格[段落]]]
+
+    def check_size(self):
+        info = self.archive.getinfo('word/document.xml')
+        if info.file_size > DOC_CONFIG['DOCX_MAX_XML_BYTES']:
+            raise Exception("Word文档内容过大")
+
+    def paragraph_block(self, paragraph):
+        """把段落转为一行Markdown，空段落返回None"""
+        text = paragraph_text(paragraph)
+        if not text:
+            return None
+
+        props = paragraph.find(f'{W}pPr')
+        style = props.find(f'{W}pStyle') if props is not None else None
+        level = self.headings.get(style.get(f'{W}val')) if style is not None else None
+        outline = props.find(f'{W}outlineLvl') if props is not None else None
+        if outline is not None and outline.get(f'{W}val', '').isdigit() and int(outline.get(f'{W}val')) < 6:
+            level = int(outline.get(f'{W}val')) + 1
+        if level:
+            return '#' * level + ' ' + text.replace('\n', ' ')
+
+        numbering = props.find(f'{W}numPr') if props is not None else None
+        if numbering is not None:
+            num_id = numbering.find(f'{W}numId')
+            ilvl = numbering.find(f'{W}ilvl')
+            num_id = num_id.get(f'{W}val') if num_id is not None else None
+            depth = ilvl.get(f'{W}val', '0') if ilvl is not None else '0'
+            if num_id and num_id != '0':
+                return self.list_item(num_id, depth, text)
+        return text
+
+    def list_item(self, num_id, depth, text):
+        indent = '  ' * int(depth) if depth.isdigit() else ''
+        if self.list_formats.get(num_id, {}).get(depth) not in ORDERED_FORMATS:
+            return f"{indent}- {text}"
+        # 同一列表的编号递增，进入上一级时重置下级编号
+        key = (num_id, depth)
+        self.counters[key] = self.counters.get(key, 0) + 1
+        for other in [k for k in self.counters if k[0] == num_id and k[1] > depth]:
+            del self.counters[other]
+        return f"{indent}{self.counters[key]}. {text}"
+
+    def blocks(self):
+        self.check_size()
+        body = None
+        with self.archive.open('word/document.xml') as stream:
+            for event, element in ET.iterparse(stream, events=('start', 'end')):
+                tag = element.tag
+                if event == 'start':
+                    if tag == f'{W}body':
+                        body = element
+                    elif tag == f'{W}tbl':
+                        self.tables.append([])
+                    elif tag == f'{W}tr' and self.tables:
+                        self.tables[-1].append([])
+                    elif tag == f'{W}tc' and self.tables and self.tables[-1]:
+                        self.tables[-1][-1].append([])
+                    continue
+
+                if tag == f'{W}p':
+                    if self.tables:
+                        # 单元格中只保留文字
+                        table = self.tables[-1]
+                        text = paragraph_text(element)
+                        if text and table and table[-1]:
+                            table[-1][-1].append(text)
+                        element.clear()
+                        continue
+                    block = self.paragraph_block(element)
+                    element.clear()
+                    if block:
+                        yield block
+                elif tag == f'{W}tbl':
+                    rows = [[' '.join(cell) for cell in row] for row in self.tables.pop() if row]
+                    element.clear()
+                    if not rows:
+                        continue
+                    if self.tables:
+                        # 嵌套表格的文字并入外层单元格
+                        outer = self.tables[-1]
+                        if outer and outer[-1]:
+                            outer[-1][-1].append(' '.join(' '.join(row) for row in rows))
+                    else:
+                        yield table_markdown(rows)
+                else:
+                    continue
+
+                # 已处理的顶层块从文档树中移除，内存占用不随文档长度增长
+                if body is not None and not self.tables:
+                    body.clear()
+
+
+def iter_docx_blocks(source):
+    """逐块产出DOCX的Markdown文本，source为文件路径或内存中的字节"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with zipfile.ZipFile(source) as archive:
+        yield from DocxReader(archive).blocks()
+
+
+def docx_to_markdown(source):
+    """DOCX转为Markdown文本，块之间空一行，连续的列表项之间不空行"""
+    parts = []
+    previous_item = False
+    for block in iter_docx_blocks(source):
+        item = bool(LIST_ITEM_PATTERN.match(block))
+        if parts:
+            parts.append('\n' if item and previous_item else '\n\n')
+        parts.append(block)
+        previous_item = item
+    return ''.join(parts)
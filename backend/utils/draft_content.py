@@ -0,0 +1,218 @@
+"""草稿正文的整理：一次遍历HTML完成清理、截断和摘要提取
+
+- 去掉微信会拒绝或过滤的标签（脚本、样式、内嵌框架、表单等）和属性（on* 事件、javascript: 链接）
+- 超过长度限制时在标签边界截断，补齐未闭合的标签，不会截断在标签或实体中间
+- 同时取出正文开头的纯文本作为摘要
+"""
+import re
+from html import unescape
+from utils.html_extract import VOID_TAGS
+
+# 注释、声明、处理指令，以及开始/结束标签（属性值中的 > 不会被当作标签结束）
+TOKEN_PATTERN = re.compile(
+    r'<!--.*?(?:-->|$)|<![^>]*>|<\?[^>]*>'
+    r'|<(/?)([a-zA-Z][\w:-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>',
+    re.S
+)
+ATTR_PATTERN = re.compile(r'([^\s=/>]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s>]+))?')
+# 属性之间可以用 / 分隔，如 <svg/onload=...>
+UNSAFE_ATTR_PATTERN = re.compile(r'(?:^|[\s/])on\w+\s*=|javascript:', re.I)
+ENTITY_TAIL_PATTERN = re.compile(r'&#?\w{0,31}$')
+
+# 连同内容一起去掉的标签
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'iframe', 'frame', 'frameset', 'object', 'embed', 'applet', 'head', 'title'}
+# 只去掉标签本身，保留其中的文字
+DROP_TAGS = {'html', 'body', 'form', 'input', 'button', 'select', 'option', 'textarea', 'link', 'meta', 'base'}
+# 在转为小写的正文中查找需要清理的内容：上述标签、注释和声明、不构成标签的 <，以及事件属性
+CLEANUP_TAG_PATTERN = re.compile(r'<(?:(?:%s)\b|(?![a-z/]))' % '|'.join(sorted(SKIP_TAGS | DROP_TAGS)))
+CLEANUP_ATTR_PATTERN = re.compile(r'[\s/]on\w+\s*=')
+TAG_PATTERN = re.compile(r'<[^>]*(?:>|$)')
+SENTENCE_ENDS = '。！？；.!?'
+TRUNCATED_NOTICE = '<p>...(由于内容长度限制，部分内容已省略)</p>'
+
+
+def clean_attributes(tag, attrs, self_closing):
+    """去掉事件属性和 javascript: 地址后重新拼出开始标签
+
+    不带引号的属性值中出现 /on*= 时整个属性一并去掉（如 <img/src=x/onerror=...>），
+    不依赖各处解析器对这种写法的处理一致。
+    """
+    kept = []
+    for match in ATTR_PATTERN.finditer(attrs):
+        name, value = match.group(1), match.group(2) or ''
+        if name.lower().startswith('on') or 'javascript:' in value.lower().replace(' ', ''):
+            continue
+        if value[:1] not in ('"', "'") and UNSAFE_ATTR_PATTERN.search(value):
+            continue
+        kept.append(' ' + match.group(0))
+    return f"<{tag}{''.join(kept)}{'/' if self_closing else ''}>"
+
+
+class ContentNormalizer:
+    """按顺序处理文字和标签，输出长度（含补齐的结束标签）始终小于 max_length"""
+
+    def __init__(self, max_length, digest_length, reserve=0):
+        self.max_length = max_length
+        self.budget = max_length - 1 - reserve
+        self.digest_length = digest_length
+        self.parts = []
+        self.length = 0
+        self.stack = []
+        self.opened_at = []  # 未闭合标签在 parts 中的位置
+        self.closing = 0  # 补齐当前未闭合标签所需的长度
+        self.skipping = None  # 正在跳过的标签及其嵌套层数
+        self.digest_parts = []
+        self.digest_chars = 0
+        self.truncated = False
+
+    def emit(self, piece):
+        self.parts.append(piece)
+        self.length += len(piece)
+
+    def text(self, raw):
+        """写入一段文字，超出长度时截断并返回False"""
+        if self.skipping or not raw:
+            return True
+        if '<' in raw:
+            raw = raw.replace('<', '&lt;')
+        if self.digest_chars <= self.digest_length:
+            plain = ' '.join(unescape(raw).split())
+            if plain:
+                self.digest_parts.append(plain)
+                self.digest_chars += len(plain)
+
+        available = self.budget - self.length - self.closing
+        if len(raw) <= available:
+            self.emit(raw)
+            return True
+
+        cut = raw[:max(available, 0)]
+        entity = ENTITY_TAIL_PATTERN.search(cut)
+        if entity:
+            cut = cut[:entity.start()]
+        end = max(cut.rfind(mark) for mark in SENTENCE_ENDS)
+        if end >= 0:
+            cut = cut[:end + 1]
+        else:
+            # 没有句子结尾时在最后一个空白处截断，也没有空白时（如整段中文）按字符截断
+            space = max(cut.rfind(' '), cut.rfind('\n'), cut.rfind('\t'))
+            if space > 0:
+                cut = cut[:space].rstrip()
+        if cut:
+            self.emit(cut)
+        self.truncated = True
+        return False
+
+    def start(self, tag, attrs, raw):
+        name = tag.lower()
+        self_closing = attrs.rstrip().endswith('/')
+        closes = name not in VOID_TAGS and not self_closing
+        if self.skipping:
+            if name == self.skipping[0] and closes:
+                self.skipping[1] += 1
+            return True
+        if name in SKIP_TAGS:
+            if closes:
+                self.skipping = [name, 1]
+            return True
+        if name in DROP_TAGS:
+            return True
+
+        piece = clean_attributes(tag, attrs, self_closing) if UNSAFE_ATTR_PATTERN.search(attrs) else raw
+        closer = len(name) + 3 if closes else 0
+        if self.length + len(piece) + self.closing + closer > self.budget:
+            self.truncated = True
+            return False
+        self.emit(piece)
+        if closes:
+            self.stack.append(name)
+            self.opened_at.append(len(self.parts) - 1)
+            self.closing += closer
+        return True
+
+    def end(self, tag):
+        name = tag.lower()
+        if self.skipping:
+            if name == self.skipping[0]:
+                self.skipping[1] -= 1
+                if not self.skipping[1]:
+                    self.skipping = None
+            return
+        if name not in self.stack:
+            return
+        # 结束标签跳过了未闭合的内层标签时一并补齐
+        while True:
+            opened = self.stack.pop()
+            self.opened_at.pop()
+            self.closing -= len(opened) + 3
+            self.emit(f"</{opened}>")
+            if opened == name:
+                return
+
+    def feed(self, html):
+        pos = 0
+        for match in TOKEN_PATTERN.finditer(html):
+            if not self.text(html[pos:match.start()]):
+                return
+            pos = match.end()
+            tag = match.group(2)
+            if tag is None:
+                continue  # 注释和声明
+            if match.group(1):
+                self.end(tag)
+            elif not self.start(tag, match.group(3), match.group(0)):
+                return
+        self.text(html[pos:])
+
+    def result(self):
+        """返回 (整理后的正文, 纯文本摘要)"""
+        if self.truncated:
+            # 截断处留下的空标签直接去掉
+            while self.stack and self.opened_at[-1] == len(self.parts) - 1:
+                self.stack.pop()
+                self.length -= len(self.parts.pop(self.opened_at.pop()))
+        while self.stack:
+            self.emit(f"</{self.stack.pop()}>")
+        if self.truncated and self.length + len(TRUNCATED_NOTICE) < self.max_length:
+            self.emit(TRUNCATED_NOTICE)
+        # 相邻节点的文字之间用空格隔开，避免连在一起
+        digest = ' '.join(' '.join(self.digest_parts).split())
+        return ''.join(self.parts), clip_digest(digest, self.digest_length)
+
+
+def clip_digest(digest, max_length):
+    if len(digest) > max_length:
+        return digest[:max_length - 3] + "..."
+    return digest
+
+
+def needs_cleanup(html):
+    """正文中是否有需要清理的标签或属性（分开查找比合并成一个正则快）"""
+    lower = html.lower()
+    return 'javascript:' in lower or bool(CLEANUP_TAG_PATTERN.search(lower) or CLEANUP_ATTR_PATTERN.search(lower))
+
+
+def leading_text(html, length):
+    """取HTML开头至少 length 个字的纯文本，只处理需要的前缀"""
+    size = length * 8
+    while True:
+        text = ' '.join(unescape(TAG_PATTERN.sub(' ', html[:size])).split())
+        if len(text) > length or size >= len(html):
+            return text
+        size *= 4
+
+
+def normalize_content(html, max_length, digest_length):
+    """整理草稿正文，返回 (正文, 摘要)；正文长度小于 max_length，摘要不超过 digest_length
+
+    常见情况下正文未超长、也没有需要清理的内容，一次正则扫描确认后原样返回，
+    摘要只从开头的一小段提取；否则逐个标签处理。
+    """
+    if len(html) < max_length and not needs_cleanup(html):
+        return html, clip_digest(leading_text(html, digest_length), digest_length)
+
+    # 原文不超过限制时不必为截断提示预留长度
+    reserve = len(TRUNCATED_NOTICE) if len(html) >= max_length else 0
+    normalizer = ContentNormalizer(max_length, digest_length, reserve)
+    normalizer.feed(html)
+    return normalizer.result()
@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from config import FETCH_CONFIG
+from utils.http_client import http_client
+from utils.async_http import async_http_client
+from utils.metrics import observe_upstream, timed_stage
+
+
+def sniff_content_type(head, header_type=''):
+    """根据文件开头的字节判断内容类型，无法判断时参考Content-Type响应头"""
+    stripped = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+    if b'%PDF-' in head[:1024]:
+        return 'pdf'
+    if stripped.startswith(b'PK\x03\x04'):
+        return 'zip'
+    if stripped.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        return 'ole'
+
+    lowered = stripped[:1024].lower()
+    if lowered.startswith((b'<!doctype html', b'<html', b'<head', b'<body')) or b'<html' in lowered:
+        return 'html'
+
+    header_type = header_type.split(';')[0].strip().lower()
+    if header_type == 'application/pdf':
+        return 'pdf'
+    if header_type in ('text/html', 'application/xhtml+xml'):
+        return 'html'
+    if header_type.startswith('text/'):
+        return 'text'
+    return 'unknown'
+
+
+def charset_from_header(header_type):
+    """读取Content-Type中显式声明的字符集，未声明时返回None交给解析器判断"""
+    for param in header_type.split(';')[1:]:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset' and value.strip():
+            return value.strip().strip('"\'')
+    return None
+
+
+class FetchResult:
+    def __init__(self, url, content, kind, encoding=None, from_cache=False, cache_key=None):
+        self.url = url
+        self.content = content
+        self.kind = kind
+        self.encoding = encoding
+        self.from_cache = from_cache
+        self.cache_key = cache_key
+
+    @property
+    def size(self):
+        return len(self.content)
+
+
+class URLFetcher:
+    """流式下载URL内容：边读边检查大小，超限立即中止；按URL缓存并用ETag/Last-Modified条件请求"""
+
+    def __init__(self, cache_dir, max_bytes, max_cache_entries=200):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_cache_entries = max_cache_entries
+        self._lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.json', base + '.body', base + '.txt'
+
+    def _load_meta(self, key):
+        meta_path = self._paths(key)[0]
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key, meta, content):
+        meta_path, body_path, text_path = self._paths(key)
+        # 先写临时文件再替换，避免多个进程同时写入时读到不完整的内容
+        for path, data, mode in ((body_path, content, 'wb'), (meta_path, json.dumps(meta), 'w')):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        # 内容已更新，之前解析出的文本作废
+        if os.path.exists(text_path):
+            os.unlink(text_path)
+        self._evict()
+
+    def _evict(self):
+        """缓存条目超出上限时删除最久未更新的条目"""
+        with self._lock:
+            metas = [name for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+            if len(metas) <= self.max_cache_entries:
+                return
+            metas.sort(key=lambda name: os.path.getmtime(os.path.join(self.cache_dir, name)))
+            for name in metas[:len(metas) - self.max_cache_entries]:
+                for path in self._paths(name[:-5]):
+                    if os.path.exists(path):
+                        os.unlink(path)
+
+    def load_text(self, result):
+        """读取该内容之前解析出的文本，没有则返回None"""
+        if not self.cache_dir or not result.cache_key:
+            return None
+        text_path = self._paths(result.cache_key)[2]
+        try:
+            with open(text_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store_text(self, result, text):
+        """保存解析出的文本，内容未变化时下次可跳过解析"""
+        if not self.cache_dir or not result.cache_key:
+            return
+        text_path = self._paths(result.cache_key)[2]
+        tmp_path = f"{text_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, text_path)
+
+    def _prepare(self, url):
+        """返回 (缓存键, 上次下载的元数据, 条件请求头)"""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest() if self.cache_dir else None
+        meta = self._load_meta(key) if key else None
+        if meta and not os.path.exists(self._paths(key)[1]):
+            meta = None
+
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        return key, meta, headers
+
+    def _cached_result(self, url, key, meta):
+        """内容未变化（304）时读取缓存的内容"""
+        with open(self._paths(key)[1], 'rb') as f:
+            content = f.read()
+        os.utime(self._paths(key)[0])
+        return FetchResult(url, content, meta['kind'], meta.get('encoding'), from_cache=True, cache_key=key)
+
+    def _build_result(self, url, key, content, response_headers):
+        """根据下载内容和响应头生成FetchResult，带ETag/Last-Modified时写入缓存"""
+        header_type = response_headers.get('content-type', '')
+        kind = sniff_content_type(content[:2048], header_type)
+        encoding = charset_from_header(header_type)
+        result = FetchResult(url, content, kind, encoding, cache_key=key)
+
+        etag = response_headers.get('etag')
+        last_modified = response_headers.get('last-modified')
+        if key and (etag or last_modified):
+            self._store(key, {
+                'url': url,
+                'etag': etag,
+                'last_modified': last_modified,
+                'kind': kind,
+                'encoding': encoding,
+                'fetched': time.time()
+            }, content)
+        else:
+            result.cache_key = None
+        return result
+
+    @staticmethod
+    def _check_declared_size(response_headers, max_bytes):
+        # 响应头声明的大小已超限时直接中止，但不依赖该值
+        declared = response_headers.get('content-length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise Exception("文件大小超过限制")
+
+    @timed_stage('url_fetch')
+    def fetch(self, url, max_bytes=None):
+        """下载URL内容，返回FetchResult；超过大小限制时抛出异常"""
+        max_bytes = max_bytes or self.max_bytes
+        key, meta, headers = self._prepare(url)
+
+        start = time.perf_counter()
+        response = http_client.get('fetch', url, headers=headers, stream=True)
+        try:
+            if response.status_code == 304 and meta:
+                return self._cached_result(url, key, meta)
+
+            response.raise_for_status()
+            self._check_declared_size(response.headers, max_bytes)
+
+            buffer = bytearray()
+            for block in response.iter_content(chunk_size=64 * 1024):
+                buffer += block
+                if len(buffer) > max_bytes:
+                    raise Exception("文件大小超过限制")
+        finally:
+            response.close()
+            observe_upstream('fetch', time.perf_counter() - start)
+
+        return self._build_result(url, key, bytes(buffer), response.headers)
+
+    async def afetch(self, url, max_bytes=None):
+        """fetch 的异步版本，缓存文件的读写放到线程中执行"""
+        with timed_stage('url_fetch'):
+            max_bytes = max_bytes or self.max_bytes
+            key, meta, headers = await asyncio.to_thread(self._prepare, url)
+
+            start = time.perf_counter()
+            try:
+                async with async_http_client.stream('fetch', 'GET', url, headers=headers) as response:
+                    if response.status_code == 304 and meta:
+                        return await asyncio.to_thread(self._cached_result, url, key, meta)
+
+                    response.raise_for_status()
+                    self._check_declared_size(response.headers, max_bytes)
+
+                    buffer = bytearray()
+                    async for block in response.aiter_bytes(64 * 1024):
+                        buffer += block
+                        if len(buffer) > max_bytes:
+                            raise Exception("文件大小超过限制")
+            finally:
+                observe_upstream('fetch', time.perf_counter() - start)
+
+            return await asyncio.to_thread(self._build_result, url, key, bytes(buffer), response.headers)
+
+
+url_fetcher = URLFetcher(
+    FETCH_CONFIG['CACHE_DIR'] if FETCH_CONFIG['ENABLE_CACHE'] else None,
+    FETCH_CONFIG['MAX_BYTES'],
+    max_cache_entries=FETCH_CONFIG['MAX_CACHE_ENTRIES']
+)
@@ -0,0 +1,318 @@
+import re
+import time
+import queue
+import asyncio
+import logging
+from concurrent.futures import as_completed
+from config import FORMAT_CONFIG
+from utils.llm import LLMClient
+from utils.chunker import chunk_text
+from utils.styler import LocalStyler
+from utils.oplog import ContextThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+FORMAT_PROMPT = """你是一个专业的微信公众号排版专家。请按照以下规则对文章进行排版：
+1. 标题层级：
+   - 主标题使用24px，加粗，#333333
+   - 二级标题使用18px，加粗，#666666
+   - 三级标题使用16px，#888888
+2. 正文：
+   - 字体大小15px
+   - 行高1.75
+   - 颜色#333333
+3. 段落间距：
+   - 段落之间空一行
+   - 标题与正文之间留适当间距
+4. 特殊格式：
+   - 重要内容使用加粗标签
+   - 引用使用blockquote标签
+   - 列表使用ul/ol和li标签
+5. 图片：
+   - 图片使用img标签，宽度自适应
+   - 图片下方留适当的空白
+6. 超链接：
+   - 超链接使用a标签，颜色#1E9FFF
+7. 代码：
+   - 代码使用pre标签，字体大小14px，#888888
+   - 代码块使用code标签，字体大小14px，#888888
+8. 表格：
+   - 表格使用table标签
+   - 表头使用thead标签
+   - 表体使用tbody标签
+   - 单元格使用td标签
+9. 其他：
+   - 保持原文的意思，只对原文进行排版，不要添加任何新的内容
+
+
+请将输入的文本转换为带有适当HTML标签和样式的格式。保持文章的整体结构清晰，视觉层次分明。
+
+注意：输入可能是长文章中的一部分，请保持格式一致性。"""
+
+# 混合模式下AI只负责标出文章结构，样式由本地按 STYLE_CONFIG 统一添加
+STRUCTURE_PROMPT = """你是一个专业的微信公众号编辑。请为输入的文本标出文章结构，输出Markdown：
+1. 根据内容为文章和各部分添加标题：主标题使用 #，二级标题使用 ##，三级标题使用 ###
+2. 重要内容使用 **加粗**
+3. 引用使用 > 开头
+4. 并列的要点使用 - 或 1. 开头的列表
+5. 代码使用 ``` 代码块，表格使用 | 分隔的Markdown表格
+6. 不要输出HTML标签或样式，不要添加任何新的内容，保持原文的意思和文字不变
+
+注意：输入可能是长文章中的一部分。"""
+
+FORMAT_MODES = ('llm', 'local', 'hybrid')
+CODE_FENCE_PATTERN = re.compile(r'^\s*```(?:markdown|md)?\s*\n(.*?)\n\s*```\s*$', re.S)
+
+
+class ArticleFormatter:
+    @staticmethod
+    def build_messages(chunk, mode='llm'):
+        """提示词中不包含分块序号和总数，文章局部修改后其余分块的请求保持不变，可直接命中缓存"""
+        prompt = STRUCTURE_PROMPT if mode == 'hybrid' else FORMAT_PROMPT
+        return [
+            {
+                "role": "system",
+                "content": prompt
+            },
+            {
+                "role": "user",
+                "content": chunk
+            }
+        ]
+
+    @staticmethod
+    def finish_chunk(content, mode='llm'):
+        """处理AI返回的内容：混合模式下由本地样式引擎把Markdown渲染为HTML"""
+        if mode == 'hybrid':
+            # 去掉AI可能包裹在外层的代码块标记
+            match = CODE_FENCE_PATTERN.match(content)
+            return LocalStyler.render(match.group(1) if match else content)
+        return content
+
+    @staticmethod
+    def format_chunk(chunk, index, total, on_delta=None, mode='llm'):
+        """对单个分块进行排版，传入on_delta时以流式方式接收结果
+
+        mode 为 llm 时由AI直接输出带样式的HTML；local 时只用本地样式引擎；
+        hybrid 时AI只标出Markdown结构，再由本地样式引擎生成HTML。
+        """
+        if mode == 'local':
+            return LocalStyler.render(chunk)
+
+        messages = ArticleFormatter.build_messages(chunk, mode)
+        content = LLMClient.chat(messages, temperature=0.6, on_delta=on_delta)
+        return ArticleFormatter.finish_chunk(content, mode)
+
+    @staticmethod
+    def format_chunk_with_retry(chunk, index, total, on_delta=None, on_retry=None, mode='llm'):
+        """单个分块失败时只重试该分块"""
+        attempts = FORMAT_CONFIG['CHUNK_RETRIES'] + 1
+        for attempt in range(attempts):
+            if attempt > 0 and on_retry:
+                on_retry()
+            try:
+                return ArticleFormatter.format_chunk(chunk, index, total, on_delta, mode)
+            except Exception as e:
+                logger.warning(f"第{index+1}块文本第{attempt+1}次处理失败: {str(e)}")
+                if attempt + 1 >= attempts:
+                    raise Exception(f"处理第{index+1}块文本时出错") from e
+                time.sleep(FORMAT_CONFIG['RETRY_BACKOFF'] * (2 ** attempt))
+
+    @staticmethod
+    def format_article(content, mode='llm'):
+        """排版整篇文章：本地模式整篇渲染，其余模式分块并发排版后合并"""
+        if mode == 'local':
+            return LocalStyler.render(content)
+        chunks = chunk_text(content, FORMAT_CONFIG['CHUNK_MAX_TOKENS'])
+        return "\n".join(ArticleFormatter.format_chunks(chunks, mode))
+
+    @staticmethod
+    def format_chunks(chunks, mode='llm', done=None):
+        """并发排版所有分块，并按原始顺序合并结果
+
+        done 为 {序号: 排版结果}，其中的分块直接使用已有结果，不再调用AI。
+        """
+        total = len(chunks)
+        done = done or {}
+        results = [done.get(i) for i in range(total)]
+        pending = [i for i in range(total) if i not in done]
+        if not pending:
+            return results
+
+        max_workers = max(1, min(FORMAT_CONFIG['MAX_WORKERS'], len(pending)))
+
+        with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(ArticleFormatter.format_chunk_with_retry, chunks[i], i, total, mode=mode): i
+                for i in pending
+            }
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            except Exception:
+                # 某个分块最终失败，取消尚未开始的分块
+                for future in futures:
+                    future.cancel()
+                raise
+
+        return results
+
+    @staticmethod
+    def format_chunks_stream(chunks, mode='llm', done=None):
+        """并发排版所有分块，每完成一块立即产出事件
+
+        done 为 {序号: 排版结果}，这些分块不再调用AI，也不产出 chunk 事件，
+        只计入进度。
+
+        依次产出 (事件名, 数据) 元组：
+        - progress: 已完成的分块数和总分块数
+        - delta: 上游开启流式时的增量内容
+        - reset: 某个分块重试，之前收到的增量内容作废
+        - chunk: 某个分块的完整排版结果（带原始序号）
+        """
+        total = len(chunks)
+        if total == 0:
+            return
+
+        done = done or {}
+        pending = [i for i in range(total) if i not in done]
+        max_workers = max(1, min(FORMAT_CONFIG['MAX_WORKERS'], len(pending)))
+        # 混合模式的AI输出是Markdown，需整块渲染后才能展示，不转发增量内容
+        upstream_stream = FORMAT_CONFIG['UPSTREAM_STREAM'] and mode == 'llm'
+        events = queue.Queue()
+        executor = ContextThreadPoolExecutor(max_workers=max_workers)
+
+        def worker(chunk, index):
+            on_delta = on_retry = None
+            if upstream_stream:
+                on_delta = lambda delta: events.put(("delta", {"index": index, "content": delta}))
+                on_retry = lambda: events.put(("reset", {"index": index}))
+            try:
+                content = ArticleFormatter.format_chunk_with_retry(
+                    chunk, index, total, on_delta, on_retry, mode
+                )
+                events.put(("chunk", {"index": index, "content": content}))
+            except Exception as e:
+                events.put(("error", {"index": index, "error": str(e)}))
+
+        try:
+            for i in pending:
+                executor.submit(worker, chunks[i], i)
+
+            completed = len(done)
+            yield "progress", {"current": completed, "total": total}
+            while completed < total:
+                event, data = events.get()
+                if event == "error":
+                    raise Exception(data["error"])
+                yield event, data
+                if event == "chunk":
+                    completed += 1
+                    yield "progress", {"current": completed, "total": total}
+        finally:
+            # 客户端断开或出错时不再处理剩余分块
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    async def aformat_chunk(chunk, index, total, on_delta=None, mode='llm'):
+        """format_chunk 的异步版本，本地渲染放到线程中执行"""
+        if mode == 'local':
+            return await asyncio.to_thread(LocalStyler.render, chunk)
+
+        messages = ArticleFormatter.build_messages(chunk, mode)
+        content = await LLMClient.achat(messages, temperature=0.6, on_delta=on_delta)
+        if mode == 'hybrid':
+            return await asyncio.to_thread(ArticleFormatter.finish_chunk, content, mode)
+        return content
+
+    @staticmethod
+    async def aformat_chunk_with_retry(chunk, index, total, on_delta=None, on_retry=None, mode='llm'):
+        """format_chunk_with_retry 的异步版本"""
+        attempts = FORMAT_CONFIG['CHUNK_RETRIES'] + 1
+        for attempt in range(attempts):
+            if attempt > 0 and on_retry:
+                on_retry()
+            try:
+                return await ArticleFormatter.aformat_chunk(chunk, index, total, on_delta, mode)
+            except Exception as e:
+                logger.warning(f"第{index+1}块文本第{attempt+1}次处理失败: {str(e)}")
+                if attempt + 1 >= attempts:
+                    raise Exception(f"处理第{index+1}块文本时出错") from e
+                await asyncio.sleep(FORMAT_CONFIG['RETRY_BACKOFF'] * (2 ** attempt))
+
+    @staticmethod
+    async def aformat_article(content, mode='llm'):
+        """format_article 的异步版本"""
+        if mode == 'local':
+            return await asyncio.to_thread(LocalStyler.render, content)
+        chunks = await asyncio.to_thread(chunk_text, content, FORMAT_CONFIG['CHUNK_MAX_TOKENS'])
+        return "\n".join(await ArticleFormatter.aformat_chunks(chunks, mode))
+
+    @staticmethod
+    async def aformat_chunks(chunks, mode='llm', done=None):
+        """format_chunks 的异步版本，同一请求同时处理的分块数同样不超过 MAX_WORKERS"""
+        total = len(chunks)
+        done = done or {}
+        results = [done.get(i) for i in range(total)]
+        pending = [i for i in range(total) if i not in done]
+        if not pending:
+            return results
+
+        slots = asyncio.Semaphore(max(1, FORMAT_CONFIG['MAX_WORKERS']))
+
+        async def worker(i):
+            async with slots:
+                results[i] = await ArticleFormatter.aformat_chunk_with_retry(chunks[i], i, total, mode=mode)
+
+        tasks = [asyncio.create_task(worker(i)) for i in pending]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # 某个分块最终失败或请求被取消时，取消其余分块
+            for task in tasks:
+                task.cancel()
+        return results
+
+    @staticmethod
+    async def aformat_chunks_stream(chunks, mode='llm', done=None):
+        """format_chunks_stream 的异步版本，产出的事件相同"""
+        total = len(chunks)
+        if total == 0:
+            return
+
+        done = done or {}
+        pending = [i for i in range(total) if i not in done]
+        slots = asyncio.Semaphore(max(1, FORMAT_CONFIG['MAX_WORKERS']))
+        upstream_stream = FORMAT_CONFIG['UPSTREAM_STREAM'] and mode == 'llm'
+        events = asyncio.Queue()
+
+        async def worker(chunk, index):
+            on_delta = on_retry = None
+            if upstream_stream:
+                on_delta = lambda delta: events.put_nowait(("delta", {"index": index, "content": delta}))
+                on_retry = lambda: events.put_nowait(("reset", {"index": index}))
+            try:
+                async with slots:
+                    content = await ArticleFormatter.aformat_chunk_with_retry(
+                        chunk, index, total, on_delta, on_retry, mode
+                    )
+                events.put_nowait(("chunk", {"index": index, "content": content}))
+            except Exception as e:
+                events.put_nowait(("error", {"index": index, "error": str(e)}))
+
+        tasks = [asyncio.create_task(worker(chunks[i], i)) for i in pending]
+        try:
+            completed = len(done)
+            yield "progress", {"current": completed, "total": total}
+            while completed < total:
+                event, data = await events.get()
+                if event == "error":
+                    raise Exception(data["error"])
+                yield event, data
+                if event == "chunk":
+                    completed += 1
+                    yield "progress", {"current": completed, "total": total}
+        finally:
+            # 客户端断开或出错时不再处理剩余分块
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,248 @@
+import re
+from html.parser import HTMLParser
+from config import HTML_CONFIG
+from utils.metrics import timed_stage
+
+_etree = False  # 尚未尝试导入
+
+
+def load_lxml():
+    """首次解析网页时才导入 lxml，未安装时返回None（lxml 为可选依赖，此时使用标准库解析器）"""
+    global _etree
+    if _etree is False:
+        try:
+            from lxml import etree
+        except ImportError:
+            etree = None
+        _etree = etree
+    return _etree
+
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'head', 'title', 'form', 'button', 'select'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+# 这些元素中的文字被视为正文段落，其得分累加到父级和祖父级容器
+PARAGRAPH_TAGS = {'p', 'pre', 'blockquote', 'td', 'li', 'h2', 'h3', 'h4'}
+POSITIVE_HINTS = re.compile(r'article|content|post|entry|main|body|text|story|blog', re.I)
+NEGATIVE_HINTS = re.compile(r'nav|footer|header|comment|sidebar|side|menu|share|related|recommend|ad-|ads|banner|copyright|breadcrumb', re.I)
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.I)
+
+
+class ContentScorer:
+    """单次遍历HTML事件流，为容器元素打分并记录其文本范围
+
+    同时作为 lxml 解析器的 target 和标准库 HTMLParser 的回调使用，不构建DOM树。
+    得分基于段落文字长度和逗号数（类似readability），再按链接文字占比和
+    class/id提示调整；最终取得分最高的容器作为正文。
+    """
+
+    def __init__(self):
+        self.segments = []
+        self.pending = []
+        self.stack = []
+        self.skip_depth = 0
+        self.link_depth = 0
+        self.text_len = 0
+        self.link_len = 0
+        self.commas = 0
+        self.best = None
+        self.best_score = 0
+
+    def _flush_text(self):
+        if not self.pending:
+            return
+        text = ''.join(self.pending).strip()
+        self.pending = []
+        if text:
+            self.segments.append(text)
+            self.text_len += len(text)
+            self.commas += text.count(',') + text.count('，')
+            if self.link_depth:
+                self.link_len += len(text)
+
+    def start(self, tag, attrs):
+        tag = tag.lower() if isinstance(tag, str) else ''
+        if tag in VOID_TAGS:
+            return
+        self._flush_text()
+        # 未闭合的段落和列表项遇到同级标签时隐式结束（lxml会自动处理）
+        if tag in ('p', 'li') and self.stack and self.stack[-1][0] == tag:
+            self._close(self.stack.pop())
+        if self.skip_depth or tag in SKIP_TAGS:
+            self.skip_depth += 1
+            self.stack.append([tag, None])
+            return
+        if tag == 'a':
+            self.link_depth += 1
+
+        attrs = dict(attrs)
+        hint = f"{attrs.get('class') or ''} {attrs.get('id') or ''}"
+        bonus = 0
+        if POSITIVE_HINTS.search(hint):
+            bonus += 25
+        if NEGATIVE_HINTS.search(hint):
+            bonus -= 25
+        if tag in ('article', 'main'):
+            bonus += 25
+        # [标签, 起始文本段, 起始文字数, 起始链接文字数, 起始逗号数, 累计得分, 提示加分]
+        self.stack.append([tag, len(self.segments), self.text_len, self.link_len, self.commas, 0.0, bonus])
+
+    def end(self, tag):
+        tag = tag.lower() if isinstance(tag, str) else ''
+        if tag in VOID_TAGS:
+            return
+        # 标准库解析器不会自动补全未闭合的标签，向上找到匹配的开始标签
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth][0] == tag:
+                break
+        else:
+            return
+        self._flush_text()
+        while len(self.stack) > depth:
+            self._close(self.stack.pop())
+
+    def _close(self, entry):
+        if entry[1] is None:
+            self.skip_depth -= 1
+            return
+        tag, start_seg, start_text, start_links, start_commas, score, bonus = entry
+        if tag == 'a':
+            self.link_depth -= 1
+
+        text_len = self.text_len - start_text
+        if text_len == 0:
+            return
+        link_density = (self.link_len - start_links) / text_len
+
+        if tag in PARAGRAPH_TAGS and text_len >= 25:
+            contribution = 1 + (self.commas - start_commas) + min(text_len / 100, 3)
+            if self.stack and self.stack[-1][1] is not None:
+                self.stack[-1][5] += contribution
+            if len(self.stack) > 1 and self.stack[-2][1] is not None:
+                self.stack[-2][5] += contribution / 2
+
+        if score:
+            final = (score + bonus) * (1 - link_density)
+            if final > self.best_score:
+                self.best_score = final
+                self.best = (start_seg, len(self.segments))
+
+    def data(self, text):
+        if not self.skip_depth:
+            self.pending.append(text)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        self._flush_text()
+        while self.stack:
+            self._close(self.stack.pop())
+        if self.best:
+            start, end = self.best
+            return '\n'.join(self.segments[start:end])
+        return '\n'.join(self.segments)
+
+
+class StdlibParser(HTMLParser):
+    """把标准库 HTMLParser 的回调转发给 ContentScorer"""
+
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, attrs)
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+
+def decode_html(html, encoding=None):
+    """把字节解码为文本：优先使用响应头字符集，其次使用meta声明，最后按UTF-8"""
+    if isinstance(html, str):
+        return html
+    if not encoding:
+        match = META_CHARSET.search(html[:4096])
+        if match:
+            encoding = match.group(1).decode('ascii', errors='ignore')
+    try:
+        return html.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        return html.decode('utf-8', errors='replace')
+
+
+class HTMLExtractor:
+    @staticmethod
+    def available_engines():
+        """返回当前环境可用的解析引擎"""
+        return (['lxml'] if load_lxml() is not None else []) + ['html.parser', 'bs4']
+
+    @staticmethod
+    def resolve_engine(engine=None):
+        engine = engine or HTML_CONFIG['ENGINE']
+        if engine == 'auto':
+            return 'lxml' if load_lxml() is not None else 'html.parser'
+        if engine == 'lxml' and load_lxml() is None:
+            raise Exception("未安装lxml，无法使用lxml解析引擎")
+        return engine
+
+    @staticmethod
+    @timed_stage('html_parse')
+    def extract(html, encoding=None, engine=None):
+        """从网页HTML提取正文文本，每段文字一行"""
+        engine = HTMLExtractor.resolve_engine(engine)
+        if engine == 'bs4':
+            return HTMLExtractor.extract_with_bs4(html, encoding)
+
+        scorer = ContentScorer()
+        text = decode_html(html, encoding)
+
+        if engine == 'lxml':
+            parser = load_lxml().HTMLParser(target=scorer, remove_comments=True)
+            parser.feed(text)
+            return parser.close()
+
+        parser = StdlibParser(scorer)
+        parser.feed(text)
+        parser.close()
+        return scorer.close()
+
+    @staticmethod
+    def extract_with_bs4(html, encoding=None):
+        """原有的BeautifulSoup提取方式：按固定class名称查找正文容器"""
+        from bs4 import BeautifulSoup
+
+        # 获取网页内容
+        if isinstance(html, bytes):
+            soup = BeautifulSoup(html, 'html.parser', from_encoding=encoding)
+        else:
+            soup = BeautifulSoup(html, 'html.parser')
+        
+        # 移除脚本和样式元素
+        for script in soup(["script", "style"]):
+            script.decompose()
+            
+        # 获取正文内容
+        # 常见的文章容器class名称
+        article_classes = ['article', 'post', 'content', 'main-content', 'entry-content']
+        article_content = None
+        
+        # 尝试找到文章主体
+        for class_name in article_classes:
+            article = soup.find(class_=class_name)
+            if article:
+                article_content = article
+                break
+        
+        # 如果没找到特定容器，就获取body内容
+        if not article_content:
+            article_content = soup.body or soup
+            
+        # 提取文本
+        return article_content.get_text(separator='\n', strip=True)
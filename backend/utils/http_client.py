@@ -0,0 +1,104 @@
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import HTTP_CONFIG
+from utils.metrics import observe_upstream
+
+
+class JitterRetry(Retry):
+    """在指数退避的基础上增加随机抖动，避免多个请求同时重试"""
+
+    def __init__(self, *args, jitter=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.jitter = jitter
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.jitter = self.jitter
+        return retry
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return backoff
+        return backoff + random.uniform(0, self.jitter)
+
+
+class HttpClient:
+    """进程内共享的HTTP客户端，每个上游一个带连接池和重试的会话"""
+
+    def __init__(self, config):
+        self.config = config
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self, upstream):
+        options = self.config[upstream]
+        retries = JitterRetry(
+            total=options['RETRIES'],
+            connect=options['RETRIES'],
+            read=options['RETRIES'],
+            status=options['RETRIES'],
+            backoff_factor=options['BACKOFF'],
+            jitter=options['JITTER'],
+            status_forcelist=options['STATUS_FORCELIST'],
+            allowed_methods=frozenset(options['RETRY_METHODS']),
+            respect_retry_after_header=options['RESPECT_RETRY_AFTER'],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=options['POOL_CONNECTIONS'],
+            pool_maxsize=options['POOL_SIZE'],
+            max_retries=retries
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get_session(self, upstream):
+        """获取指定上游的共享会话，首次使用时创建"""
+        session = self._sessions.get(upstream)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(upstream)
+                if session is None:
+                    session = self._create_session(upstream)
+                    self._sessions[upstream] = session
+        return session
+
+    def timeout(self, upstream):
+        """返回指定上游的 (连接超时, 读取超时)"""
+        options = self.config[upstream]
+        return (options['CONNECT_TIMEOUT'], options['READ_TIMEOUT'])
+
+    def request(self, upstream, method, url, **kwargs):
+        """通过共享会话发起请求，未指定超时时使用上游的默认超时
+
+        非流式请求的耗时计入当前请求的操作记录；流式请求由调用方读完响应后自行记录。
+        """
+        kwargs.setdefault('timeout', self.timeout(upstream))
+        start = time.perf_counter()
+        response = self.get_session(upstream).request(method, url, **kwargs)
+        if not kwargs.get('stream'):
+            observe_upstream(upstream, time.perf_counter() - start)
+        return response
+
+    def get(self, upstream, url, **kwargs):
+        return self.request(upstream, 'GET', url, **kwargs)
+
+    def post(self, upstream, url, **kwargs):
+        return self.request(upstream, 'POST', url, **kwargs)
+
+    def close(self):
+        """关闭所有会话及其连接池"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+http_client = HttpClient(HTTP_CONFIG)
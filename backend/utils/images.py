@@ -0,0 +1,110 @@
+import os
+import re
+import time
+import base64
+import sqlite3
+import hashlib
+import threading
+
+IMG_SRC_PATTERN = re.compile(r'(<img\b[^>]*?\bsrc\s*=\s*)(["\'])(.*?)\2', re.I | re.S)
+# 已经在微信CDN上的图片无需再上传
+WECHAT_IMAGE_HOSTS = ('mmbiz.qpic.cn', 'mmbiz.qlogo.cn')
+# ImageIndex 的锁数量，不同图片偶尔共用一把锁只会让上传稍有等待
+IMAGE_LOCK_STRIPES = 64
+
+
+def sniff_image_type(data):
+    """根据文件头判断图片格式，返回扩展名；不是微信支持的格式时返回None"""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    return None
+
+
+def decode_data_uri(src):
+    """解析 data:image/...;base64, 形式的内嵌图片"""
+    header, _, payload = src.partition(',')
+    if ';base64' not in header:
+        return None
+    try:
+        return base64.b64decode(payload)
+    except ValueError:
+        return None
+
+
+def find_image_sources(html):
+    """按出现顺序返回HTML中所有图片地址（去重）"""
+    sources = []
+    seen = set()
+    for match in IMG_SRC_PATTERN.finditer(html):
+        src = match.group(3).strip()
+        if src and src not in seen:
+            seen.add(src)
+            sources.append(src)
+    return sources
+
+
+def replace_image_sources(html, mapping):
+    """把图片地址替换为新的地址，未在mapping中的保持不变"""
+    def replace(match):
+        src = match.group(3).strip()
+        if src in mapping:
+            return f"{match.group(1)}{match.group(2)}{mapping[src]}{match.group(2)}"
+        return match.group(0)
+    return IMG_SRC_PATTERN.sub(replace, html)
+
+
+class ImageIndex:
+    """图片内容哈希到微信图片地址的持久化索引，相同图片只上传一次"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._locks = [threading.Lock() for _ in range(IMAGE_LOCK_STRIPES)]
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "hash TEXT PRIMARY KEY, url TEXT, media_id TEXT, created REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # 预加载后 fork 出的工作进程不能沿用父进程打开的连接
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def content_hash(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def lock(self, digest):
+        """同一张图片同时只允许一个线程上传；按哈希分配固定数量的锁，不为每张图片各建一个"""
+        return self._locks[int(digest[:8], 16) % IMAGE_LOCK_STRIPES]
+
+    def get(self, digest):
+        """返回 (url, media_id)，未上传过时返回 (None, None)"""
+        row = self._connect().execute("SELECT url, media_id FROM images WHERE hash = ?", (digest,)).fetchone()
+        return row if row else (None, None)
+
+    def set_url(self, digest, url):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO images (hash, url, created) VALUES (?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET url = excluded.url",
+                (digest, url, time.time())
+            )
+
+    def set_media_id(self, digest, media_id):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO images (hash, media_id, created) VALUES (?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET media_id = excluded.media_id",
+                (digest, media_id, time.time())
+            )
@@ -0,0 +1,194 @@
+import time
+import uuid
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from config import FORMAT_CONFIG
+from utils.chunker import chunk_text_stable
+from utils.formatter import ArticleFormatter
+from utils.oplog import record_operation
+
+
+def chunk_hash(chunk):
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+
+class DocumentState:
+    """某篇文档最近一次排版的分块哈希和排版结果"""
+
+    def __init__(self, doc_id):
+        self.doc_id = doc_id
+        self.revision = None
+        self.mode = None
+        self.hashes = []
+        self.outputs = []
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def plan(self, chunks, mode, base_revision):
+        """对比新旧分块
+
+        返回 (新分块哈希, 可复用的排版结果 {新序号: 结果}, 客户端可直接保留的分块 {新序号: 旧序号})。
+        只有客户端当前的版本与服务端一致时，才能让客户端保留旧分块。
+        """
+        hashes = [chunk_hash(chunk) for chunk in chunks]
+        with self.lock:
+            if mode != self.mode:
+                return hashes, {}, {}
+            old_index = {}
+            for i, digest in enumerate(self.hashes):
+                old_index.setdefault(digest, i)
+            outputs = self.outputs
+            synced = base_revision is not None and base_revision == self.revision
+
+        reuse, keep = {}, {}
+        for i, digest in enumerate(hashes):
+            if digest in old_index:
+                reuse[i] = outputs[old_index[digest]]
+                if synced:
+                    keep[i] = old_index[digest]
+        return hashes, reuse, keep
+
+    def commit(self, hashes, outputs, mode):
+        """保存本次排版结果，返回新的版本号"""
+        with self.lock:
+            self.hashes = hashes
+            self.outputs = outputs
+            self.mode = mode
+            # 版本号不可预测，服务重启或多进程部署时客户端的旧版本号不会被误认为有效
+            self.revision = uuid.uuid4().hex[:16]
+            self.updated = time.time()
+            return self.revision
+
+
+class DocumentStore:
+    """按文档ID保存最近一次的排版结果，超出数量上限时淘汰最久未使用的文档"""
+
+    def __init__(self, max_documents, ttl):
+        self.max_documents = max_documents
+        self.ttl = ttl
+        self.documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doc_id):
+        with self._lock:
+            now = time.time()
+            expired = [key for key, state in self.documents.items() if now - state.updated > self.ttl]
+            for key in expired:
+                del self.documents[key]
+
+            state = self.documents.get(doc_id)
+            if state is None:
+                state = DocumentState(doc_id)
+                self.documents[doc_id] = state
+            self.documents.move_to_end(doc_id)
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
+            return state
+
+
+document_store = DocumentStore(FORMAT_CONFIG['MAX_DOCUMENTS'], FORMAT_CONFIG['DOCUMENT_TTL'])
+
+
+class IncrementalFormatter:
+    """增量排版：只把内容有变化的分块发送给AI，返回相对于客户端当前版本的补丁
+
+    补丁中的 chunks 按新分块顺序排列，每项为 {"keep": 旧序号}（客户端沿用自己的旧分块）
+    或 {"content": 排版结果}。
+    """
+
+    @staticmethod
+    def split(content):
+        return chunk_text_stable(
+            content, FORMAT_CONFIG['CHUNK_MAX_TOKENS'], FORMAT_CONFIG['INCREMENTAL_TARGET_TOKENS']
+        )
+
+    @staticmethod
+    def prepare(doc_id, base_revision, content, mode):
+        """分块并与该文档上次的结果对比，返回 (文档状态, 分块, 哈希, 可复用结果, 可保留分块)"""
+        state = document_store.get(doc_id)
+        chunks = IncrementalFormatter.split(content)
+        hashes, reuse, keep = state.plan(chunks, mode, base_revision)
+        record_operation(chunks=len(chunks), reformatted=len(chunks) - len(reuse))
+        return state, chunks, hashes, reuse, keep
+
+    @staticmethod
+    def build_patch(doc_id, revision, outputs, reuse, keep):
+        return {
+            "doc_id": doc_id,
+            "revision": revision,
+            "total": len(outputs),
+            "reformatted": len(outputs) - len(reuse),
+            "chunks": [
+                {"keep": keep[i]} if i in keep else {"content": output}
+                for i, output in enumerate(outputs)
+            ]
+        }
+
+    @staticmethod
+    def format(doc_id, base_revision, content, mode='llm'):
+        """增量排版整篇文档，返回补丁"""
+        state, chunks, hashes, reuse, keep = IncrementalFormatter.prepare(doc_id, base_revision, content, mode)
+        outputs = ArticleFormatter.format_chunks(chunks, mode, done=reuse)
+        revision = state.commit(hashes, outputs, mode)
+        return IncrementalFormatter.build_patch(doc_id, revision, outputs, reuse, keep)
+
+    @staticmethod
+    async def aformat(doc_id, base_revision, content, mode='llm'):
+        """format 的异步版本"""
+        state, chunks, hashes, reuse, keep = await asyncio.to_thread(
+            IncrementalFormatter.prepare, doc_id, base_revision, content, mode
+        )
+        outputs = await ArticleFormatter.aformat_chunks(chunks, mode, done=reuse)
+        revision = state.commit(hashes, outputs, mode)
+        return IncrementalFormatter.build_patch(doc_id, revision, outputs, reuse, keep)
+
+    @staticmethod
+    def format_stream(doc_id, base_revision, content, mode='llm'):
+        """增量排版的流式版本
+
+        先产出 patch 事件（新分块总数和客户端可保留的分块），再对需要更新的分块产出
+        chunk 事件，最后产出带新版本号的 done 事件。
+        """
+        state, chunks, hashes, reuse, keep = IncrementalFormatter.prepare(doc_id, base_revision, content, mode)
+        yield from IncrementalFormatter.patch_events(chunks, reuse, keep)
+
+        outputs = [reuse.get(i) for i in range(len(chunks))]
+        for event, data in ArticleFormatter.format_chunks_stream(chunks, mode, done=reuse):
+            if event == "chunk":
+                outputs[data["index"]] = data["content"]
+            yield event, data
+
+        revision = state.commit(hashes, outputs, mode)
+        yield "done", {"doc_id": doc_id, "revision": revision, "total": len(chunks)}
+
+    @staticmethod
+    def patch_events(chunks, reuse, keep):
+        """补丁开头的事件：patch 事件，以及服务端有结果但客户端没有的分块"""
+        yield "patch", {
+            "total": len(chunks),
+            "reformatted": len(chunks) - len(reuse),
+            "keep": [[i, old] for i, old in keep.items()]
+        }
+        for i, output in reuse.items():
+            if i not in keep:
+                yield "chunk", {"index": i, "content": output}
+
+    @staticmethod
+    async def aformat_stream(doc_id, base_revision, content, mode='llm'):
+        """format_stream 的异步版本"""
+        state, chunks, hashes, reuse, keep = await asyncio.to_thread(
+            IncrementalFormatter.prepare, doc_id, base_revision, content, mode
+        )
+        for event, data in IncrementalFormatter.patch_events(chunks, reuse, keep):
+            yield event, data
+
+        outputs = [reuse.get(i) for i in range(len(chunks))]
+        async for event, data in ArticleFormatter.aformat_chunks_stream(chunks, mode, done=reuse):
+            if event == "chunk":
+                outputs[data["index"]] = data["content"]
+            yield event, data
+
+        revision = state.commit(hashes, outputs, mode)
+        yield "done", {"doc_id": doc_id, "revision": revision, "total": len(chunks)}
@@ -0,0 +1,173 @@
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+
+class Job:
+    """后台任务，记录状态、进度和结果"""
+
+    FINISHED = ('succeeded', 'failed', 'cancelled')
+
+    def __init__(self, kind, dedupe_key=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.dedupe_key = dedupe_key
+        self.status = 'queued'
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.updated = self.created
+        self.future = None
+        self._cancel = threading.Event()
+        self._changed = threading.Condition()
+        self._version = 0
+
+    @property
+    def finished(self):
+        return self.status in self.FINISHED
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _touch(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.updated = time.time()
+            self._version += 1
+            self._changed.notify_all()
+
+    def report(self, **progress):
+        """更新任务进度，任务已取消时抛出JobCancelled"""
+        self.check_cancelled()
+        self._touch(progress=dict(self.progress, **progress))
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def wait_for_change(self, version, timeout):
+        """等待任务状态变化，返回最新版本号"""
+        with self._changed:
+            if self._version == version:
+                self._changed.wait(timeout)
+            return self._version
+
+    def to_dict(self):
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "created": self.created,
+            "updated": self.updated
+        }
+        if self.status == 'succeeded':
+            data["result"] = self.result
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    """进程内的任务队列和工作线程池
+
+    相同内容的任务在未完成或成功时会被合并，只执行一次。
+    """
+
+    def __init__(self, max_workers=4, result_ttl=3600):
+        self.result_ttl = result_ttl
+        self._handlers = {}
+        self._jobs = {}
+        self._dedupe = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+    def register(self, kind, handler):
+        """注册任务处理函数，handler(job, payload) 的返回值作为任务结果"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind, payload, dedupe_key=None):
+        """提交任务，返回任务对象（可能是已存在的相同任务）"""
+        if kind not in self._handlers:
+            raise Exception(f"不支持的任务类型: {kind}")
+
+        with self._lock:
+            self._cleanup()
+            if dedupe_key:
+                existing = self._jobs.get(self._dedupe.get((kind, dedupe_key)))
+                if existing and existing.status not in ('failed', 'cancelled'):
+                    return existing
+
+            job = Job(kind, dedupe_key)
+            self._jobs[job.id] = job
+            if dedupe_key:
+                self._dedupe[(kind, dedupe_key)] = job.id
+            job.future = self._executor.submit(self._run, job, payload)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """取消任务：排队中的直接取消，运行中的在下一个检查点停止"""
+        job = self.get(job_id)
+        if not job:
+            return None
+        if not job.finished:
+            job._cancel.set()
+            if job.future and job.future.cancel():
+                job._touch(status='cancelled')
+        return job
+
+    def events(self, job_id, timeout=15):
+        """逐次产出任务状态快照，直到任务结束；超时未变化时产出None作为心跳"""
+        job = self.get(job_id)
+        if not job:
+            return
+        version = -1
+        while True:
+            current = job.wait_for_change(version, timeout)
+            if current == version:
+                yield None
+                continue
+            version = current
+            snapshot = job.to_dict()
+            yield snapshot
+            if snapshot["status"] in Job.FINISHED:
+                return
+
+    def _run(self, job, payload):
+        if job.cancelled:
+            job._touch(status='cancelled')
+            return
+        job._touch(status='running')
+        try:
+            result = self._handlers[job.kind](job, payload)
+            job.check_cancelled()
+            job._touch(status='succeeded', result=result)
+        except JobCancelled:
+            job._touch(status='cancelled')
+        except Exception as e:
+            logger.error(f"任务 {job.id}（{job.kind}）执行失败: {str(e)}")
+            job._touch(status='failed', error=str(e))
+
+    def _cleanup(self):
+        """清理超过保留时间的已结束任务"""
+        deadline = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.updated < deadline]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if job.dedupe_key and self._dedupe.get((job.kind, job.dedupe_key)) == job_id:
+                del self._dedupe[(job.kind, job.dedupe_key)]
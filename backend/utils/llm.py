@@ -0,0 +1,253 @@
+import json
+import time
+import asyncio
+import threading
+from config import API_KEY, API_URL, API_MODEL, CACHE_CONFIG, LLM_CONFIG, RATE_LIMIT_CONFIG
+from utils.cache import llm_cache
+from utils.http_client import http_client
+from utils.async_http import async_http_client
+from utils.ratelimit import rate_limiter, estimate_request_tokens, parse_retry_after
+from utils.metrics import timed_stage, observe_upstream, LLM_REQUESTS, LLM_TTFB_SECONDS, LLM_TOKENS
+
+# 限制同时发往AI上游的请求数，所有排版、分析和后台任务共用
+llm_slots = threading.BoundedSemaphore(LLM_CONFIG['MAX_CONCURRENT_CALLS'])
+# 异步模式下的并发上限，只在事件循环中使用
+async_llm_slots = asyncio.Semaphore(LLM_CONFIG['ASYNC_MAX_CONCURRENT_CALLS'])
+
+
+class StreamReader:
+    """逐行解析上游 stream: true 返回的SSE数据，同步和异步读取共用"""
+
+    def __init__(self, on_delta, start):
+        self.on_delta = on_delta
+        self.start = start
+        self.parts = []
+        self.usage = None
+        self.ttfb = None
+
+    def feed(self, line):
+        """处理一行数据，收到 [DONE] 时返回False"""
+        if not line or not line.startswith('data:'):
+            return True
+        payload = line[5:].strip()
+        if payload == '[DONE]':
+            return False
+        result = json.loads(payload)
+        # token用量在最后一段数据中返回
+        self.usage = result.get("usage") or self.usage
+        if not result.get("choices"):
+            return True
+        delta = result["choices"][0].get("delta", {}).get("content")
+        if delta:
+            if self.ttfb is None:
+                self.ttfb = time.perf_counter() - self.start
+            self.parts.append(delta)
+            self.on_delta(delta)
+        return True
+
+    def result(self):
+        """返回 (完整内容, token用量, 收到第一段内容的耗时)"""
+        if not self.parts:
+            raise Exception("AI返回结果格式错误")
+        return "".join(self.parts), self.usage, self.ttfb
+
+
+class LLMClient:
+    @staticmethod
+    def build_request(messages, temperature, max_tokens=None, stream=False):
+        """返回 (请求头, 请求体)"""
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {API_KEY}"
+        }
+        api_data = {
+            "model": API_MODEL,
+            "messages": messages,
+            "temperature": temperature
+        }
+        if max_tokens:
+            api_data["max_tokens"] = max_tokens
+        if stream:
+            api_data["stream"] = True
+        return headers, api_data
+
+    @staticmethod
+    def parse_result(result):
+        """解析非流式返回的结果，返回 (内容, token用量)"""
+        if "choices" in result and len(result["choices"]) > 0:
+            return result["choices"][0]["message"]["content"], result.get("usage")
+        raise Exception("AI返回结果格式错误")
+
+    @staticmethod
+    def record_success(ttfb, usage):
+        LLM_REQUESTS.inc(result='ok')
+        LLM_TTFB_SECONDS.observe(ttfb)
+        if usage:
+            LLM_TOKENS.inc(usage.get("prompt_tokens", 0), type='prompt')
+            LLM_TOKENS.inc(usage.get("completion_tokens", 0), type='completion')
+
+    @staticmethod
+    def cache_hit(cached, on_delta):
+        observe_upstream('llm', 0, cache_hit=True)
+        LLM_REQUESTS.inc(result='cache_hit')
+        if on_delta:
+            on_delta(cached)
+        return cached
+
+    @staticmethod
+    def retry_after(response, attempt):
+        """上游返回429时记录暂停时间并返回True，由调用方重新排队后重试；重试次数用完时抛出异常"""
+        if response.status_code != 429:
+            return False
+        LLM_REQUESTS.inc(result='rate_limited')
+        delay = parse_retry_after(response.headers.get('Retry-After'))
+        if delay is None:
+            delay = RATE_LIMIT_CONFIG['DEFAULT_RETRY_AFTER'] * (2 ** attempt)
+        rate_limiter.block(delay)
+        if attempt >= RATE_LIMIT_CONFIG['RETRIES_429']:
+            raise Exception("AI服务请求过于频繁，请稍后重试")
+        return True
+
+    @staticmethod
+    def chat(messages, temperature, max_tokens=None, on_delta=None):
+        """调用AI对话接口，相同请求直接返回缓存结果
+
+        传入on_delta时以 stream: true 方式请求，并逐段回调增量内容。
+        发送前在限流队列中等待RPM/TPM额度；上游返回429时按 Retry-After 暂停后重试。
+        """
+        use_cache = CACHE_CONFIG['ENABLED']
+        if use_cache:
+            key = llm_cache.make_key(API_MODEL, messages, temperature, max_tokens)
+            cached = llm_cache.get(key)
+            if cached is not None:
+                return LLMClient.cache_hit(cached, on_delta)
+
+        stream = on_delta is not None
+        headers, api_data = LLMClient.build_request(messages, temperature, max_tokens, stream)
+        estimated = estimate_request_tokens(messages, max_tokens)
+
+        attempt = 0
+        while True:
+            with timed_stage('llm_rate_limit'):
+                rate_limiter.acquire(estimated)
+            # 等待并发名额的时间单独统计，便于区分上游变慢和本地排队
+            with timed_stage('llm_wait'):
+                llm_slots.acquire()
+            try:
+                with timed_stage('llm'):
+                    start = time.perf_counter()
+                    try:
+                        response = http_client.post(
+                            'llm',
+                            API_URL,
+                            headers=headers,
+                            json=api_data,
+                            stream=stream
+                        )
+                        if LLMClient.retry_after(response, attempt):
+                            response.close()
+                            attempt += 1
+                            continue
+
+                        if stream:
+                            content, usage, ttfb = LLMClient.read_stream(response, on_delta, start)
+                            observe_upstream('llm', time.perf_counter() - start)
+                        else:
+                            ttfb = response.elapsed.total_seconds()
+                            content, usage = LLMClient.parse_result(response.json())
+                    except Exception:
+                        LLM_REQUESTS.inc(result='error')
+                        raise
+            finally:
+                llm_slots.release()
+            break
+
+        LLMClient.record_success(ttfb, usage)
+        if usage:
+            rate_limiter.adjust(usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0) - estimated)
+        if use_cache:
+            llm_cache.set(key, content)
+        return content
+
+    @staticmethod
+    def read_stream(response, on_delta, start):
+        """解析上游 stream: true 返回的SSE数据，逐段回调
+
+        返回 (完整内容, token用量, 收到第一段内容的耗时)。
+        """
+        reader = StreamReader(on_delta, start)
+        try:
+            response.raise_for_status()
+            # SSE 固定为UTF-8编码，上游未声明 charset 时 requests 会按 ISO-8859-1 解码
+            response.encoding = 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                if not reader.feed(line):
+                    break
+        finally:
+            response.close()
+        return reader.result()
+
+    @staticmethod
+    async def achat(messages, temperature, max_tokens=None, on_delta=None):
+        """chat 的异步版本，供异步模式使用：等待上游和限流额度时不占用线程
+
+        缓存读写和限流状态的读写涉及SQLite，放到线程中执行。
+        """
+        use_cache = CACHE_CONFIG['ENABLED']
+        if use_cache:
+            key = llm_cache.make_key(API_MODEL, messages, temperature, max_tokens)
+            cached = await asyncio.to_thread(llm_cache.get, key)
+            if cached is not None:
+                return LLMClient.cache_hit(cached, on_delta)
+
+        stream = on_delta is not None
+        headers, api_data = LLMClient.build_request(messages, temperature, max_tokens, stream)
+        estimated = estimate_request_tokens(messages, max_tokens)
+
+        attempt = 0
+        while True:
+            with timed_stage('llm_rate_limit'):
+                await rate_limiter.aacquire(estimated)
+            with timed_stage('llm_wait'):
+                await async_llm_slots.acquire()
+            try:
+                with timed_stage('llm'):
+                    start = time.perf_counter()
+                    try:
+                        if stream:
+                            reader = StreamReader(on_delta, start)
+                            async with async_http_client.stream(
+                                'llm', 'POST', API_URL, headers=headers, json=api_data
+                            ) as response:
+                                if await asyncio.to_thread(LLMClient.retry_after, response, attempt):
+                                    attempt += 1
+                                    continue
+                                response.raise_for_status()
+                                async for line in response.aiter_lines():
+                                    if not reader.feed(line):
+                                        break
+                            content, usage, ttfb = reader.result()
+                            observe_upstream('llm', time.perf_counter() - start)
+                        else:
+                            response = await async_http_client.post('llm', API_URL, headers=headers, json=api_data)
+                            if await asyncio.to_thread(LLMClient.retry_after, response, attempt):
+                                attempt += 1
+                                continue
+                            ttfb = response.elapsed.total_seconds()
+                            content, usage = LLMClient.parse_result(response.json())
+                    except Exception:
+                        LLM_REQUESTS.inc(result='error')
+                        raise
+            finally:
+                async_llm_slots.release()
+            break
+
+        LLMClient.record_success(ttfb, usage)
+        if usage:
+            await asyncio.to_thread(
+                rate_limiter.adjust,
+                usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0) - estimated
+            )
+        if use_cache:
+            await asyncio.to_thread(llm_cache.set, key, content)
+        return content
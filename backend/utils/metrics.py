@@ -0,0 +1,140 @@
+import time
+import threading
+from contextlib import contextmanager
+from utils.oplog import record_stage, record_upstream
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """按固定分桶统计耗时分布"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            counts, total, observed = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value, observed + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, observed) in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, {'le': format_value(bound)})} {count}")
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, {'le': '+Inf'})} {observed}")
+                lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}")
+                lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {observed}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(self.prefix + name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(self.prefix + name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """输出 Prometheus 文本格式"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry('wechat_formatter_')
+
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', "接口请求耗时（流式响应计到发送完毕）", ['method', 'endpoint', 'status']
+)
+STAGE_SECONDS = registry.histogram(
+    'stage_duration_seconds', "各处理阶段耗时", ['stage']
+)
+UPSTREAM_SECONDS = registry.histogram(
+    'upstream_request_duration_seconds', "上游HTTP请求耗时", ['upstream']
+)
+LLM_TTFB_SECONDS = registry.histogram(
+    'llm_time_to_first_byte_seconds', "AI请求首字节耗时（流式请求为收到第一段内容的时间）"
+)
+LLM_REQUESTS = registry.counter(
+    'llm_requests_total', "AI请求数", ['result']
+)
+LLM_TOKENS = registry.counter(
+    'llm_tokens_total', "AI上游返回的token用量", ['type']
+)
+
+
+def observe_upstream(upstream, seconds, cache_hit=False):
+    """记录一次上游调用：计入上游耗时直方图和当前请求的操作记录"""
+    if not cache_hit:
+        UPSTREAM_SECONDS.observe(seconds, upstream=upstream)
+    record_upstream(upstream, seconds, cache_hit)
+
+
+@contextmanager
+def timed_stage(stage):
+    """统计代码块耗时，计入阶段耗时直方图和当前请求的耗时明细；也可作为装饰器使用"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        record_stage(stage, elapsed)
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from config import OPLOG_CONFIG
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，单进程运行时不需要文件锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 当前请求的操作记录，工作线程通过 ContextThreadPoolExecutor 继承
+current_operation = contextvars.ContextVar('current_operation', default=None)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """提交任务时复制当前上下文，使工作线程中的上游调用也计入所属请求的记录"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class OperationRecord:
+    """一次请求的操作记录：接口、分块数、字节数、各阶段耗时、上游耗时和缓存命中"""
+
+    def __init__(self, request_id, method, endpoint):
+        self.request_id = request_id
+        self.started = time.time()
+        self.fields = {"method": method, "endpoint": endpoint}
+        self.upstream = {}
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            self.fields.update(fields)
+
+    def add_upstream(self, service, seconds, cache_hit=False):
+        with self._lock:
+            stats = self.upstream.setdefault(service, {"calls": 0, "cache_hits": 0, "latency_ms": []})
+            if cache_hit:
+                stats["cache_hits"] += 1
+            else:
+                stats["calls"] += 1
+                stats["latency_ms"].append(round(seconds * 1000, 1))
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            count, total = self.stages.get(stage, (0, 0.0))
+            self.stages[stage] = (count + 1, total + seconds)
+
+    def server_timing(self):
+        """生成 Server-Timing 响应头；并发执行的同名阶段（如多个分块的AI请求）耗时累加"""
+        with self._lock:
+            entries = [
+                f'{stage};desc="{count}";dur={total * 1000:.1f}'
+                for stage, (count, total) in self.stages.items()
+            ]
+        entries.append(f"total;dur={(time.time() - self.started) * 1000:.1f}")
+        return ', '.join(entries)
+
+    def to_dict(self):
+        with self._lock:
+            return dict(
+                ts=time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                request_id=self.request_id,
+                duration_ms=round((time.time() - self.started) * 1000, 1),
+                **self.fields,
+                stages={stage: {"count": count, "ms": round(total * 1000, 1)} for stage, (count, total) in self.stages.items()},
+                upstream={name: dict(stats, latency_ms=list(stats["latency_ms"])) for name, stats in self.upstream.items()}
+            )
+
+
+def record_operation(**fields):
+    """向当前请求的操作记录添加字段，不在请求中时忽略"""
+    record = current_operation.get()
+    if record is not None:
+        record.update(**fields)
+
+
+def record_upstream(service, seconds, cache_hit=False):
+    """记录一次上游调用的耗时或缓存命中，不在请求中时忽略"""
+    record = current_operation.get()
+    if record is not None:
+        record.add_upstream(service, seconds, cache_hit)
+
+
+def record_stage(stage, seconds):
+    """记录一个处理阶段的耗时，不在请求中时忽略"""
+    record = current_operation.get()
+    if record is not None:
+        record.add_stage(stage, seconds)
+
+
+class OperationLog:
+    """JSONL操作日志：请求线程只把记录放入有界队列，由后台线程攒批写入
+
+    队列写满时丢弃记录并计数，不阻塞请求；文件超过大小上限时轮转为 .1、.2 ……，
+    多个进程写同一文件时用文件锁保证每批记录完整写入。
+    """
+
+    def __init__(self, path, max_queue=10000, batch_size=200, flush_interval=1.0, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        atexit.register(self.close)
+
+    def write(self, record):
+        """提交一条记录，立即返回"""
+        self._ensure_writer()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_writer(self):
+        # 预加载后 fork 出的工作进程没有父进程的写入线程，需要重新启动
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='oplog-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # 攒够一批或等待超时后写入
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            batch.append({"ts": time.strftime('%Y-%m-%dT%H:%M:%S'), "event": "dropped", "count": dropped})
+        data = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in batch).encode('utf-8')
+
+        try:
+            with open(self.path + '.lock', 'a') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                        self._rotate()
+                    with open(self.path, 'ab') as f:
+                        f.write(data)
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.warning(f"写入操作日志失败: {str(e)}")
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.unlink(self.path)
+
+    def close(self, timeout=5):
+        """写完队列中剩余的记录后停止后台线程"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        thread.join(timeout)
+        self._thread = None
+        if self.dropped:
+            self._write_batch([])
+
+
+class NullOperationLog:
+    """关闭操作日志时使用"""
+
+    def write(self, record):
+        pass
+
+    def close(self, timeout=5):
+        pass
+
+
+if OPLOG_CONFIG['ENABLED']:
+    operation_log = OperationLog(
+        OPLOG_CONFIG['PATH'],
+        max_queue=OPLOG_CONFIG['MAX_QUEUE'],
+        batch_size=OPLOG_CONFIG['BATCH_SIZE'],
+        flush_interval=OPLOG_CONFIG['FLUSH_INTERVAL'],
+        max_bytes=OPLOG_CONFIG['MAX_BYTES'],
+        backup_count=OPLOG_CONFIG['BACKUP_COUNT']
+    )
+else:
+    operation_log = NullOperationLog()
@@ -0,0 +1,285 @@
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from config import RATE_LIMIT_CONFIG
+from utils.chunker import estimate_tokens
+
+# 当前请求所属的客户端，同一客户端的AI请求在限流队列中排在一起
+current_client = contextvars.ContextVar('current_client', default=None)
+
+
+def client_identity(headers, remote_addr):
+    """客户端标识：优先使用 X-Client-ID，其次是反向代理传入的 X-Forwarded-For 中的第一个地址"""
+    client_id = headers.get('X-Client-ID')
+    if client_id:
+        return client_id
+    forwarded = headers.get('X-Forwarded-For')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return remote_addr
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 响应头（秒数或HTTP日期），返回需要等待的秒数，无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_request_tokens(messages, max_tokens=None):
+    """估算一次AI请求消耗的token数：提示词加上预计的输出
+
+    未限制输出长度时按最后一条消息的长度估算输出（排版的输出与输入长度相当）。
+    """
+    prompt_tokens = sum(estimate_tokens(message.get('content', '')) for message in messages)
+    completion_tokens = max_tokens or (estimate_tokens(messages[-1].get('content', '')) if messages else 0)
+    return prompt_tokens + completion_tokens
+
+
+class FairQueue:
+    """按客户端轮转的排队：每个客户端一个先进先出队列，轮流放行各客户端的队首
+
+    一篇长文章的几十个分块不会让其他客户端的请求排在它们全部之后。
+    """
+
+    def __init__(self):
+        self.queues = OrderedDict()
+
+    def add(self, client, ticket):
+        self.queues.setdefault(client, deque()).append(ticket)
+
+    def head(self):
+        for queue in self.queues.values():
+            return queue[0]
+        return None
+
+    def remove(self, client, ticket):
+        queue = self.queues[client]
+        queue.remove(ticket)
+        # 放行过的客户端移到末尾，下一次轮到其他客户端
+        del self.queues[client]
+        if queue:
+            self.queues[client] = queue
+
+
+class RateLimiter:
+    """AI上游的令牌桶限流，同时限制每分钟请求数（RPM）和每分钟token数（TPM）
+
+    桶的状态保存在SQLite中，多个工作进程共用同一份额度；上游返回429时记录 Retry-After，
+    所有进程在此之前都暂停发送。进程内的等待者按客户端轮转排队，同一时刻只有队首在
+    等待额度，额度不足时等待而不是报错。
+    """
+
+    def __init__(self, db_path, rpm=0, tpm=0, burst_seconds=10, max_wait=120):
+        self.db_path = db_path
+        self.limits = {"requests": rpm, "tokens": tpm}
+        self.burst_seconds = burst_seconds
+        self.max_wait = max_wait
+        self._local = threading.local()
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._queue = FairQueue()
+        self._cond = threading.Condition()
+        self._async_queue = FairQueue()
+        self._async_cond = None
+        if self.db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit ("
+                "name TEXT PRIMARY KEY, value REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        """每个线程复用一个SQLite连接，手动管理事务"""
+        conn = getattr(self._local, 'conn', None)
+        # 预加载后 fork 出的工作进程不能沿用父进程打开的连接
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """读写限流状态 {名称: (值, 更新时间)}，SQLite写锁保证多进程之间的读-改-写不交错"""
+        if not self.db_path:
+            with self._lock:
+                yield self._memory
+            return
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = {name: (value, updated) for name, value, updated in conn.execute("SELECT * FROM rate_limit")}
+            before = dict(state)
+            yield state
+            for name, row in state.items():
+                if before.get(name) != row:
+                    conn.execute("INSERT OR REPLACE INTO rate_limit (name, value, updated) VALUES (?, ?, ?)", (name, *row))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _blocked_until(self):
+        if not self.db_path:
+            with self._lock:
+                return self._memory.get('blocked', (0, 0))[0]
+        row = self._connect().execute("SELECT value FROM rate_limit WHERE name = 'blocked'").fetchone()
+        return row[0] if row else 0
+
+    def capacity(self, name):
+        return self.limits[name] * self.burst_seconds / 60
+
+    def _level(self, state, name, now):
+        """按经过的时间补充后的桶内余量"""
+        rate = self.limits[name]
+        capacity = self.capacity(name)
+        value, updated = state.get(name, (capacity, now))
+        return min(capacity, value + (now - updated) * rate / 60)
+
+    def try_reserve(self, tokens):
+        """额度充足时扣除并返回0，否则返回还需等待的秒数（不扣除）"""
+        now = time.time()
+        if not any(self.limits.values()):
+            # 未配置额度时只需检查是否处于429暂停期，无需加写锁
+            return max(0.0, self._blocked_until() - now)
+
+        with self._transaction() as state:
+            blocked_until = state.get('blocked', (0, 0))[0]
+            if blocked_until > now:
+                return blocked_until - now
+
+            levels, wait = {}, 0.0
+            for name, amount in (("requests", 1), ("tokens", tokens)):
+                rate = self.limits[name]
+                if not rate:
+                    continue
+                levels[name] = self._level(state, name, now)
+                # 单次消耗超过桶容量时只要求桶满，扣除后余量为负，后续请求相应多等
+                needed = min(amount, self.capacity(name))
+                if levels[name] < needed:
+                    wait = max(wait, (needed - levels[name]) * 60 / rate)
+            if wait > 0:
+                return wait
+
+            for name, amount in (("requests", 1), ("tokens", tokens)):
+                if name in levels:
+                    state[name] = (levels[name] - amount, now)
+            return 0.0
+
+    def adjust(self, tokens):
+        """按上游返回的实际用量修正之前估算扣除的token数，tokens为实际多用的数量（可为负）"""
+        if not self.limits["tokens"] or not tokens:
+            return
+        now = time.time()
+        with self._transaction() as state:
+            state["tokens"] = (min(self.capacity("tokens"), self._level(state, "tokens", now) - tokens), now)
+
+    def block(self, seconds):
+        """上游返回429后，所有进程在 seconds 秒内暂停发送"""
+        until = time.time() + seconds
+        with self._transaction() as state:
+            if state.get('blocked', (0, 0))[0] < until:
+                state['blocked'] = (until, time.time())
+
+    def acquire(self, tokens, client=None):
+        """排队等待额度；超过 max_wait 仍未获得时抛出异常"""
+        client = client if client is not None else current_client.get()
+        ticket = object()
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            self._queue.add(client, ticket)
+            while self._queue.head() is not ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.remove(client, ticket)
+                    self._cond.notify_all()
+                    raise Exception("AI服务请求过于频繁，请稍后重试")
+                self._cond.wait(remaining)
+        try:
+            while True:
+                wait = self.try_reserve(tokens)
+                if wait <= 0:
+                    return
+                if time.monotonic() + wait > deadline:
+                    raise Exception("AI服务请求过于频繁，请稍后重试")
+                time.sleep(wait)
+        finally:
+            with self._cond:
+                self._queue.remove(client, ticket)
+                self._cond.notify_all()
+
+    async def aacquire(self, tokens, client=None):
+        """acquire 的异步版本，排队和等待时不占用线程"""
+        client = client if client is not None else current_client.get()
+        if self._async_cond is None:
+            self._async_cond = asyncio.Condition()
+        cond = self._async_cond
+        ticket = object()
+        deadline = time.monotonic() + self.max_wait
+        async with cond:
+            self._async_queue.add(client, ticket)
+            try:
+                await asyncio.wait_for(
+                    cond.wait_for(lambda: self._async_queue.head() is ticket),
+                    max(0.0, deadline - time.monotonic())
+                )
+            except asyncio.TimeoutError:
+                # 超时取消等待后已重新持有锁
+                self._async_queue.remove(client, ticket)
+                cond.notify_all()
+                raise Exception("AI服务请求过于频繁，请稍后重试")
+        try:
+            while True:
+                wait = await asyncio.to_thread(self.try_reserve, tokens)
+                if wait <= 0:
+                    return
+                if time.monotonic() + wait > deadline:
+                    raise Exception("AI服务请求过于频繁，请稍后重试")
+                await asyncio.sleep(wait)
+        finally:
+            async with cond:
+                self._async_queue.remove(client, ticket)
+                cond.notify_all()
+
+
+class NullRateLimiter:
+    """关闭限流时使用"""
+
+    def acquire(self, tokens, client=None):
+        pass
+
+    async def aacquire(self, tokens, client=None):
+        pass
+
+    def adjust(self, tokens):
+        pass
+
+    def block(self, seconds):
+        pass
+
+
+if RATE_LIMIT_CONFIG['ENABLED']:
+    rate_limiter = RateLimiter(
+        RATE_LIMIT_CONFIG['DB_PATH'],
+        rpm=RATE_LIMIT_CONFIG['RPM'],
+        tpm=RATE_LIMIT_CONFIG['TPM'],
+        burst_seconds=RATE_LIMIT_CONFIG['BURST_SECONDS'],
+        max_wait=RATE_LIMIT_CONFIG['MAX_WAIT']
+    )
+else:
+    rate_limiter = NullRateLimiter()
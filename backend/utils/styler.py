@@ -0,0 +1,225 @@
+import re
+from html import escape, unescape
+from config import STYLE_CONFIG
+from utils.chunker import split_blocks, LIST_PATTERN
+
+CODE_SPAN_PATTERN = re.compile(r'(`+)(.+?)\1')
+# 地址中允许成对的括号，如维基百科的链接
+URL_PATTERN = r'((?:[^()\s]|\([^()\s]*\))+)(?:\s+&quot;.*?&quot;)?'
+IMAGE_PATTERN = re.compile(r'!\[([^\]]*)\]\(' + URL_PATTERN + r'\)')
+LINK_PATTERN = re.compile(r'\[([^\]]+)\]\(' + URL_PATTERN + r'\)')
+# 图片和链接先替换为占位符，加粗和斜体不会改动其中的地址
+PLACEHOLDER_PATTERN = re.compile(r'\x00(\d+)\x00')
+LINK_SCHEMES = ('http://', 'https://')
+IMAGE_SCHEMES = LINK_SCHEMES + ('data:image/',)
+BOLD_PATTERN = re.compile(r'\*\*(.+?)\*\*|__(.+?)__')
+ITALIC_PATTERN = re.compile(r'(?<!\*)\*(?![\s*])(.+?)(?<![\s*])\*(?!\*)')
+HEADING_PATTERN = re.compile(r'^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$')
+TABLE_SEPARATOR_PATTERN = re.compile(r'^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$')
+RULE_PATTERN = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+ORDERED_PATTERN = re.compile(r'^\s*\d+[.)、]\s')
+
+
+def css(**props):
+    """把样式字典转为内联style字符串，忽略空值"""
+    return '; '.join(
+        f"{re.sub(r'([A-Z])', lambda m: '-' + m.group(1).lower(), name)}: {value}"
+        for name, value in props.items() if value
+    )
+
+
+class LocalStyler:
+    """按 STYLE_CONFIG 把 Markdown 或纯文本转换为带内联样式的微信公众号HTML，不调用AI"""
+
+    @staticmethod
+    def styles(config=None):
+        """根据样式配置生成各元素的内联样式"""
+        config = config or STYLE_CONFIG
+        text = config['text']
+        section = config.get('section', {})
+        code = config.get('code', {})
+        quote = config.get('quote', {})
+        table = config.get('table', {})
+        spacing = config.get('spacing', '1em')
+        heading_margin = f"{spacing} 0 0.5em"
+
+        return {
+            'h1': css(fontSize=config['title']['size'], color=config['title']['color'],
+                      fontWeight=config['title'].get('weight'), margin=heading_margin),
+            'h2': css(fontSize=config['subtitle']['size'], color=config['subtitle']['color'],
+                      fontWeight=config['subtitle'].get('weight'), margin=heading_margin),
+            'h3': css(fontSize=section.get('size', text['size']), color=section.get('color', text['color']),
+                      fontWeight=section.get('weight'), margin=heading_margin),
+            'p': css(fontSize=text['size'], color=text['color'], lineHeight=text['lineHeight'],
+                     margin=f"{spacing} 0"),
+            'list': css(fontSize=text['size'], color=text['color'], lineHeight=text['lineHeight'],
+                        margin=f"{spacing} 0", paddingLeft='2em'),
+            'li': css(margin='0.25em 0'),
+            'blockquote': css(fontSize=text['size'], color=quote.get('color', text['color']),
+                              lineHeight=text['lineHeight'], background=quote.get('background'),
+                              borderLeft=f"4px solid {quote.get('border', '#dddddd')}",
+                              padding='10px 15px', margin=f"{spacing} 0"),
+            'pre': css(fontSize=code.get('size', '14px'), color=code.get('color'),
+                       background=code.get('background'), padding='12px', borderRadius='4px',
+                       overflowX='auto', whiteSpace='pre-wrap', wordBreak='break-all',
+                       margin=f"{spacing} 0", lineHeight='1.5'),
+            'code': css(fontSize=code.get('size', '14px'), color=code.get('color'),
+                        background=code.get('background'), padding='2px 4px', borderRadius='3px'),
+            'a': css(color=config.get('link', {}).get('color', '#1E9FFF'), textDecoration='none'),
+            'img': css(maxWidth='100%', height='auto', display='block', margin=f"{spacing} auto"),
+            'table': css(width='100%', borderCollapse='collapse', fontSize=text['size'],
+                         color=text['color'], margin=f"{spacing} 0"),
+            'th': css(border=f"1px solid {table.get('border', '#dddddd')}", padding='6px 10px',
+                      background=table.get('headerBackground'), fontWeight='bold'),
+            'td': css(border=f"1px solid {table.get('border', '#dddddd')}", padding='6px 10px'),
+            'hr': css(border='none', borderTop=f"1px solid {table.get('border', '#dddddd')}",
+                      margin=f"{spacing} 0")
+        }
+
+    @staticmethod
+    def render_inline(text, styles):
+        """处理行内格式：代码、图片、链接、加粗和斜体"""
+        parts = []
+        last = 0
+        for match in CODE_SPAN_PATTERN.finditer(text):
+            parts.append(LocalStyler.render_spans(text[last:match.start()], styles))
+            parts.append(f'<code style="{styles["code"]}">{escape(match.group(2))}</code>')
+            last = match.end()
+        parts.append(LocalStyler.render_spans(text[last:], styles))
+        return ''.join(parts)
+
+    @staticmethod
+    def render_emphasis(text):
+        text = BOLD_PATTERN.sub(lambda m: f'<strong>{m.group(1) or m.group(2)}</strong>', text)
+        return ITALIC_PATTERN.sub(lambda m: f'<em>{m.group(1)}</em>', text)
+
+    @staticmethod
+    def render_spans(text, styles):
+        """转义文本后处理图片、链接、加粗和斜体；地址不是 http(s)（图片另允许 data:image/）时按原文显示"""
+        text = escape(text.replace('\x00', ''))
+        spans = []
+
+        def hold(html):
+            spans.append(html)
+            return f'\x00{len(spans) - 1}\x00'
+
+        def image(m):
+            if not unescape(m.group(2)).lower().startswith(IMAGE_SCHEMES):
+                return m.group(0)
+            return hold(f'<img src="{m.group(2)}" alt="{m.group(1)}" style="{styles["img"]}">')
+
+        def link(m):
+            if not unescape(m.group(2)).lower().startswith(LINK_SCHEMES):
+                return m.group(0)
+            return hold(f'<a href="{m.group(2)}" style="{styles["a"]}">{LocalStyler.render_emphasis(m.group(1))}</a>')
+
+        def restore(m):
+            # 链接文字中可能含有图片的占位符
+            return PLACEHOLDER_PATTERN.sub(restore, spans[int(m.group(1))])
+
+        text = IMAGE_PATTERN.sub(image, text)
+        text = LINK_PATTERN.sub(link, text)
+        return PLACEHOLDER_PATTERN.sub(restore, LocalStyler.render_emphasis(text))
+
+    @staticmethod
+    def render_lines(lines, styles):
+        """多行内容用换行标签连接"""
+        return '<br>'.join(LocalStyler.render_inline(line, styles) for line in lines)
+
+    @staticmethod
+    def render_table(lines, styles):
+        """竖线表格，第二行为分隔行时第一行作为表头"""
+        rows = [
+            [cell.strip() for cell in line.strip().strip('|').split('|')]
+            for line in lines
+        ]
+        header = None
+        if len(lines) > 1 and TABLE_SEPARATOR_PATTERN.match(lines[1]):
+            header = rows[0]
+            rows = rows[2:]
+
+        html = [f'<table style="{styles["table"]}">']
+        if header:
+            cells = ''.join(f'<th style="{styles["th"]}">{LocalStyler.render_inline(c, styles)}</th>' for c in header)
+            html.append(f'<thead><tr>{cells}</tr></thead>')
+        html.append('<tbody>')
+        for row in rows:
+            cells = ''.join(f'<td style="{styles["td"]}">{LocalStyler.render_inline(c, styles)}</td>' for c in row)
+            html.append(f'<tr>{cells}</tr>')
+        html.append('</tbody></table>')
+        return ''.join(html)
+
+    @staticmethod
+    def render_list(lines, styles):
+        """渲染列表，有序和无序标记切换时拆分为不同的列表"""
+        lists = []
+        for line in lines:
+            if LIST_PATTERN.match(line):
+                tag = 'ol' if ORDERED_PATTERN.match(line) else 'ul'
+                if not lists or lists[-1][0] != tag:
+                    lists.append((tag, []))
+                lists[-1][1].append([LIST_PATTERN.sub('', line, count=1).strip()])
+            elif lists:
+                # 缩进的续行并入上一条
+                lists[-1][1][-1].append(line.strip())
+
+        html = []
+        for tag, items in lists:
+            body = ''.join(
+                f'<li style="{styles["li"]}">{LocalStyler.render_lines(item, styles)}</li>'
+                for item in items
+            )
+            html.append(f'<{tag} style="{styles["list"]}">{body}</{tag}>')
+        return ''.join(html)
+
+    @staticmethod
+    def render_code(lines, styles):
+        """围栏代码块，去掉首尾的围栏行"""
+        body = lines[1:-1] if len(lines) > 1 and lines[-1].strip().startswith(('```', '~~~')) else lines[1:]
+        code = escape('\n'.join(body))
+        return f'<pre style="{styles["pre"]}"><code>{code}</code></pre>'
+
+    @staticmethod
+    def render_paragraph(lines, styles):
+        """段落中每一行单独成段；以 > 开头的连续行渲染为引用"""
+        html = []
+        quote = []
+
+        def flush_quote():
+            if quote:
+                html.append(f'<blockquote style="{styles["blockquote"]}">{LocalStyler.render_lines(quote, styles)}</blockquote>')
+                quote.clear()
+
+        for line in lines:
+            stripped = line.strip()
+            if stripped.startswith('>'):
+                quote.append(stripped.lstrip('>').strip())
+                continue
+            flush_quote()
+            if RULE_PATTERN.match(stripped):
+                html.append(f'<hr style="{styles["hr"]}">')
+            else:
+                html.append(f'<p style="{styles["p"]}">{LocalStyler.render_inline(stripped, styles)}</p>')
+        flush_quote()
+        return ''.join(html)
+
+    @staticmethod
+    def render(text, config=None):
+        """把 Markdown 或纯文本转换为带内联样式的HTML"""
+        styles = LocalStyler.styles(config)
+        html = []
+        for kind, lines in split_blocks(text):
+            if kind == 'heading':
+                match = HEADING_PATTERN.match(lines[0])
+                level = min(len(match.group(1)), 3)
+                tag = f'h{level}'
+                html.append(f'<{tag} style="{styles[tag]}">{LocalStyler.render_inline(match.group(2), styles)}</{tag}>')
+            elif kind == 'code':
+                html.append(LocalStyler.render_code(lines, styles))
+            elif kind == 'table':
+                html.append(LocalStyler.render_table(lines, styles))
+            elif kind == 'list':
+                html.append(LocalStyler.render_list(lines, styles))
+            else:
+                html.append(LocalStyler.render_paragraph(lines, styles))
+        return '\n'.join(html)
@@ -0,0 +1,113 @@
+import asyncio
+from config import ANALYZE_CONFIG
+from utils.llm import LLMClient
+from utils.chunker import chunk_text, estimate_tokens
+from utils.ai_generator import AIGenerator
+from utils.oplog import ContextThreadPoolExecutor
+
+# 提示词中不包含分块序号，文档局部修改后其余分块的请求保持不变，可直接命中缓存
+MAP_PROMPT = """你是一个专业的文档分析助手。下面是一篇长文档中的一个片段，请提炼其中的要点。
+要求：
+1. 保留关键事实、数据、结论和论证
+2. 保留片段中出现的小标题结构
+3. 只输出要点，不要添加片段以外的内容
+4. 字数控制在原文的五分之一以内"""
+
+REDUCE_PROMPT = """你是一个专业的文档分析助手。下面是同一篇文档中连续几个部分的要点，请合并为一份完整的要点摘要。
+要求：
+1. 去除重复内容，保持原有顺序
+2. 保留关键事实、数据和结论
+3. 只输出要点，不要添加新的内容"""
+
+
+class DocumentSummarizer:
+    @staticmethod
+    def summarize_part(system_prompt, text):
+        """对一段文本生成要点，结果按内容缓存"""
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ]
+        return LLMClient.chat(messages, temperature=0.3, max_tokens=ANALYZE_CONFIG['PART_MAX_TOKENS'])
+
+    @staticmethod
+    async def asummarize_part(system_prompt, text):
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ]
+        return await LLMClient.achat(messages, temperature=0.3, max_tokens=ANALYZE_CONFIG['PART_MAX_TOKENS'])
+
+    @staticmethod
+    def map_parts(system_prompt, texts):
+        """并发处理多段文本，结果保持原始顺序"""
+        if len(texts) == 1:
+            return [DocumentSummarizer.summarize_part(system_prompt, texts[0])]
+        max_workers = max(1, min(ANALYZE_CONFIG['MAX_WORKERS'], len(texts)))
+        with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda text: DocumentSummarizer.summarize_part(system_prompt, text), texts))
+
+    @staticmethod
+    def generate_article(text, instruction, on_stage=None):
+        """根据文档内容生成公众号文章
+
+        文档较短时直接生成；较长时先分块并发提炼要点（map），再逐层合并要点（reduce），
+        最后根据合并后的要点生成文章。每一层的请求都经过缓存，重复分析同一文档时只有
+        变化的分块会重新请求AI。
+        """
+        if estimate_tokens(text) <= ANALYZE_CONFIG['DIRECT_MAX_TOKENS']:
+            if on_stage:
+                on_stage("generate")
+            return AIGenerator.generate_article(f"{instruction}\n\n{text}")
+
+        chunks = chunk_text(text, ANALYZE_CONFIG['MAP_CHUNK_TOKENS'])
+        if on_stage:
+            on_stage("map")
+        summaries = DocumentSummarizer.map_parts(MAP_PROMPT, chunks)
+
+        # 要点总量仍然过长时，按组合并，直到可以一次生成文章
+        fan_in = max(2, ANALYZE_CONFIG['REDUCE_FAN_IN'])
+        while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries)) > ANALYZE_CONFIG['DIRECT_MAX_TOKENS']:
+            if on_stage:
+                on_stage("reduce")
+            groups = ["\n\n".join(summaries[i:i + fan_in]) for i in range(0, len(summaries), fan_in)]
+            summaries = DocumentSummarizer.map_parts(REDUCE_PROMPT, groups)
+
+        if on_stage:
+            on_stage("generate")
+        return AIGenerator.generate_article(f"{instruction}（以下为长文档各部分的要点）\n\n" + "\n\n".join(summaries))
+
+    @staticmethod
+    async def amap_parts(system_prompt, texts):
+        """map_parts 的异步版本，同时处理的分块数同样不超过 MAX_WORKERS"""
+        slots = asyncio.Semaphore(max(1, ANALYZE_CONFIG['MAX_WORKERS']))
+
+        async def summarize(text):
+            async with slots:
+                return await DocumentSummarizer.asummarize_part(system_prompt, text)
+
+        return list(await asyncio.gather(*(summarize(text) for text in texts)))
+
+    @staticmethod
+    async def agenerate_article(text, instruction, on_stage=None):
+        """generate_article 的异步版本，分块等CPU密集的处理放到线程中执行"""
+        if estimate_tokens(text) <= ANALYZE_CONFIG['DIRECT_MAX_TOKENS']:
+            if on_stage:
+                on_stage("generate")
+            return await AIGenerator.agenerate_article(f"{instruction}\n\n{text}")
+
+        chunks = await asyncio.to_thread(chunk_text, text, ANALYZE_CONFIG['MAP_CHUNK_TOKENS'])
+        if on_stage:
+            on_stage("map")
+        summaries = await DocumentSummarizer.amap_parts(MAP_PROMPT, chunks)
+
+        fan_in = max(2, ANALYZE_CONFIG['REDUCE_FAN_IN'])
+        while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries)) > ANALYZE_CONFIG['DIRECT_MAX_TOKENS']:
+            if on_stage:
+                on_stage("reduce")
+            groups = ["\n\n".join(summaries[i:i + fan_in]) for i in range(0, len(summaries), fan_in)]
+            summaries = await DocumentSummarizer.amap_parts(REDUCE_PROMPT, groups)
+
+        if on_stage:
+            on_stage("generate")
+        return await AIGenerator.agenerate_article(f"{instruction}（以下为长文档各部分的要点）\n\n" + "\n\n".join(summaries))
@@ -0,0 +1,114 @@
+"""上传文件的流式接收
+
+multipart 请求体边接收边解析，文件内容直接写入内存缓冲区交给文本提取，不再先落到临时
+文件再读回；文件超过 DOC_CONFIG['MAX_FILE_SIZE'] 时在读取过程中立即中止，不等整个请求体
+接收完。
+"""
+import io
+from flask import Request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from config import DOC_CONFIG
+
+
+class UploadBuffer(io.BytesIO):
+    """上传文件的内存缓冲区，写入超过大小上限时抛出 RequestEntityTooLarge"""
+
+    def __init__(self, limit=None):
+        super().__init__()
+        self.limit = DOC_CONFIG['MAX_FILE_SIZE'] if limit is None else limit
+
+    def write(self, data):
+        if self.tell() + len(data) > self.limit:
+            raise RequestEntityTooLarge("文件大小超过限制")
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    """Flask请求类：multipart 中的文件写入 UploadBuffer，而不是超过500KB就转存的临时文件"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadBuffer()
+
+
+def read_upload(file):
+    """读取上传文件的全部内容；UploadBuffer 直接取出内容，不再复制"""
+    stream = getattr(file, 'stream', file)
+    if isinstance(stream, UploadBuffer):
+        return stream.getvalue()
+    data = file.read(DOC_CONFIG['MAX_FILE_SIZE'] + 1)
+    if len(data) > DOC_CONFIG['MAX_FILE_SIZE']:
+        raise RequestEntityTooLarge("文件大小超过限制")
+    return data
+
+
+class MultipartReader:
+    """python-multipart 解析回调：取出指定字段的第一个文件写入 UploadBuffer，其余字段忽略"""
+
+    def __init__(self, field):
+        from python_multipart.multipart import parse_options_header
+
+        self._parse_options = parse_options_header
+        self.field = field
+        self.filename = None
+        self.buffer = None
+        self._target = None
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._disposition = b''
+
+    def on_part_begin(self):
+        self._target = None
+        self._disposition = b''
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if bytes(self._header_field).lower() == b'content-disposition':
+            self._disposition = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def on_headers_finished(self):
+        _, options = self._parse_options(self._disposition)
+        name = options.get(b'name', b'').decode('utf-8', errors='replace')
+        if self.buffer is None and name == self.field and b'filename' in options:
+            self.filename = options[b'filename'].decode('utf-8', errors='replace')
+            self.buffer = self._target = UploadBuffer()
+
+    def on_part_data(self, data, start, end):
+        if self._target is not None:
+            self._target.write(data[start:end])
+
+    def on_part_end(self):
+        self._target = None
+
+    def callbacks(self):
+        return {
+            name: getattr(self, name) for name in (
+                'on_part_begin', 'on_header_field', 'on_header_value', 'on_header_end',
+                'on_headers_finished', 'on_part_data', 'on_part_end'
+            )
+        }
+
+
+async def aread_upload(request, field='file'):
+    """边接收边解析Starlette请求中的multipart请求体，返回 (文件名, UploadBuffer)，没有该文件时均为None"""
+    from python_multipart.multipart import MultipartParser, parse_options_header
+
+    _, options = parse_options_header(request.headers.get('content-type', ''))
+    boundary = options.get(b'boundary')
+    if not boundary:
+        raise BadRequest("multipart请求缺少boundary")
+
+    reader = MultipartReader(field)
+    parser = MultipartParser(boundary, reader.callbacks())
+    async for chunk in request.stream():
+        parser.write(chunk)
+    parser.finalize()
+    if reader.buffer is not None:
+        reader.buffer.seek(0)
+    return reader.filename, reader.buffer
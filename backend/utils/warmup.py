@@ -0,0 +1,137 @@
+"""工作进程启动预热和就绪状态
+
+- preload_modules：导入PDF解析等较重的依赖。各模块平时在首次使用时才导入，生产环境预加载
+  应用时由 serve.py 在主进程中调用，fork 出的工作进程按写时复制共享这部分内存
+- Warmup：工作进程开始接收请求前按 SERVER_CONFIG['WARMUP'] 建立到AI服务、微信接口的
+  长连接并获取 access_token，/ready 在预热完成前返回503。异步模式（asgi.py）中AI服务请求
+  经 httpx 客户端发出，由 arun 在工作进程的事件循环中预热该客户端
+"""
+import time
+import asyncio
+import logging
+import importlib
+import threading
+from config import API_URL, SERVER_CONFIG, WECHAT_CONFIG
+from utils.http_client import http_client
+from utils.html_extract import load_lxml
+
+logger = logging.getLogger(__name__)
+
+# 首次使用时才导入的较重依赖
+HEAVY_MODULES = ('fitz',)
+
+
+def preload_modules():
+    """导入较重的可选依赖，未安装的跳过"""
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    load_lxml()
+
+
+def warm_pool(upstream, url):
+    """向上游发一个HEAD请求，在连接池中留下一条已建立（含TLS握手）的长连接；响应状态码不重要"""
+    http_client.get_session(upstream).head(url, timeout=http_client.timeout(upstream), allow_redirects=False).close()
+
+
+async def awarm_pool(upstream, url):
+    """warm_pool 的异步版本，在当前事件循环的 httpx 客户端中留下一条长连接"""
+    from utils.async_http import async_http_client
+
+    await async_http_client.get_client(upstream).head(url)
+
+
+def warm_wechat():
+    from utils.wechat import get_wechat_api
+
+    warm_pool('wechat', WECHAT_CONFIG['API_BASE'])
+    get_wechat_api().get_access_token()
+
+
+WARMUP_STEPS = {
+    "imports": preload_modules,
+    "llm": lambda: warm_pool('llm', API_URL),
+    "wechat": warm_wechat
+}
+
+# 异步模式中替换同名步骤，需在事件循环中执行
+ASYNC_WARMUP_STEPS = {
+    "llm": lambda: awarm_pool('llm', API_URL)
+}
+
+
+class Warmup:
+    """按顺序执行预热步骤，单个步骤失败只记录错误，不影响就绪"""
+
+    def __init__(self, steps):
+        unknown = [step for step in steps if step not in WARMUP_STEPS]
+        if unknown:
+            raise Exception(f"未知的预热步骤: {', '.join(unknown)}")
+        self.steps = steps
+        self.results = {}
+        self.ready = not steps
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _claim(self):
+        """标记预热已开始，已开始过时返回False"""
+        with self._lock:
+            if self._started:
+                return False
+            self._started = True
+            return True
+
+    def _record(self, step, start, error=None):
+        if error is None:
+            self.results[step] = {"ok": True}
+        else:
+            logger.warning(f"预热步骤 {step} 失败: {str(error)}")
+            self.results[step] = {"ok": False, "error": str(error)}
+        self.results[step]["seconds"] = round(time.perf_counter() - start, 3)
+
+    def _run_step(self, step):
+        start = time.perf_counter()
+        try:
+            WARMUP_STEPS[step]()
+        except Exception as e:
+            self._record(step, start, e)
+            return
+        self._record(step, start)
+
+    def run(self):
+        """执行预热，已执行过时直接返回；可重复调用"""
+        if not self._claim():
+            return
+        for step in self.steps:
+            self._run_step(step)
+        self.ready = True
+
+    async def arun(self):
+        """异步模式的预热：ASYNC_WARMUP_STEPS 中的步骤在当前事件循环中执行，其余步骤在线程中执行"""
+        if not self._claim():
+            return
+        for step in self.steps:
+            if step not in ASYNC_WARMUP_STEPS:
+                await asyncio.to_thread(self._run_step, step)
+                continue
+            start = time.perf_counter()
+            try:
+                await ASYNC_WARMUP_STEPS[step]()
+            except Exception as e:
+                self._record(step, start, e)
+                continue
+            self._record(step, start)
+        self.ready = True
+
+    def start(self):
+        """在后台线程中执行预热（未由启动入口执行时，例如开发服务器）"""
+        if not self._started:
+            threading.Thread(target=self.run, name='warmup', daemon=True).start()
+
+    def status(self):
+        return {"ready": self.ready, "steps": dict(self.results)}
+
+
+warmup = Warmup(SERVER_CONFIG['WARMUP'])
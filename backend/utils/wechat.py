@@ -1,7 +1,41 @@
 import requests
-import json
+import os
 import time
-from config import WECHAT_CONFIG
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlparse
+from config import WECHAT_CONFIG, IMAGE_CONFIG
+from utils.http_client import http_client
+from utils.fetcher import url_fetcher
+from utils.oplog import ContextThreadPoolExecutor
+from utils.metrics import timed_stage
+from utils.draft_content import normalize_content, clip_digest
+from utils.images import (
+    ImageIndex, WECHAT_IMAGE_HOSTS, sniff_image_type, decode_data_uri,
+    find_image_sources, replace_image_sources
+)
+
+logger = logging.getLogger(__name__)
+
+# access_token 失效相关的错误码，收到后刷新token并重试一次
+TOKEN_INVALID_ERRCODES = (40001, 40014, 42001)
+
+# 限制同时提交草稿的请求数，所有WeChatAPI实例共用
+draft_slots = threading.BoundedSemaphore(WECHAT_CONFIG['MAX_CONCURRENT_DRAFTS'])
+
+_wechat_api = None
+_wechat_api_lock = threading.Lock()
+
+
+def get_wechat_api():
+    """获取共用的 WeChatAPI 实例，首次发布时才创建（建表、打开图片索引），不用发布的进程无需初始化"""
+    global _wechat_api
+    if _wechat_api is None:
+        with _wechat_api_lock:
+            if _wechat_api is None:
+                _wechat_api = WeChatAPI()
+    return _wechat_api
 
 class WeChatAPI:
     def __init__(self):
@@ -9,77 +43,100 @@ class WeChatAPI:
         self.token_expires = 0
         self.appid = WECHAT_CONFIG['APPID']
         self.secret = WECHAT_CONFIG['SECRET']
+        self.token_db = WECHAT_CONFIG['TOKEN_DB_PATH']
+        self._token_lock = threading.Lock()
+        if self.token_db:
+            os.makedirs(os.path.dirname(os.path.abspath(self.token_db)), exist_ok=True)
+            with sqlite3.connect(self.token_db, timeout=30) as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS access_token ("
+                    "appid TEXT PRIMARY KEY, token TEXT NOT NULL, expires REAL NOT NULL)"
+                )
+        self.image_index = ImageIndex(IMAGE_CONFIG['DB_PATH']) if IMAGE_CONFIG['ENABLED'] else None
+
+    def get_access_token(self, stale_token=None):
+        """获取access_token
 
-    def get_access_token(self):
-        if self.access_token and time.time() < self.token_expires:
+        同一进程内只有一个线程刷新token；多进程之间通过SQLite写锁保证同一时刻只有一个
+        进程向微信请求新token，其余进程等待后直接读取共享的结果。stale_token 为调用方
+        确认已失效的token，存储中仍是该token时才强制刷新。
+        """
+        if self.access_token and self.access_token != stale_token and time.time() < self.token_expires:
             return self.access_token
 
-        url = f"https://api.weixin.qq.com/cgi-bin/token?grant_type=client_credential&appid={self.appid}&secret={self.secret}"
-        response = requests.get(url)
+        with self._token_lock:
+            if self.access_token and self.access_token != stale_token and time.time() < self.token_expires:
+                return self.access_token
+
+            if not self.token_db:
+                self._save_token(*self._request_token())
+                return self.access_token
+
+            conn = sqlite3.connect(self.token_db, timeout=60, isolation_level=None)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT token, expires FROM access_token WHERE appid = ?", (self.appid,)
+                ).fetchone()
+                if row and row[0] != stale_token and time.time() < row[1]:
+                    token, expires = row
+                else:
+                    token, expires = self._request_token()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO access_token (appid, token, expires) VALUES (?, ?, ?)",
+                        (self.appid, token, expires)
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+            self._save_token(token, expires)
+            return self.access_token
+
+    def _save_token(self, token, expires):
+        self.access_token = token
+        self.token_expires = expires
+
+    @timed_stage('wechat_token')
+    def _request_token(self):
+        """向微信请求新的access_token，返回 (token, 过期时间)"""
+        url = f"{WECHAT_CONFIG['API_BASE']}/token?grant_type=client_credential&appid={self.appid}&secret={self.secret}"
+        response = http_client.get('wechat', url)
         result = response.json()
 
         if 'access_token' in result:
-            self.access_token = result['access_token']
-            self.token_expires = time.time() + 7000  # Token有效期7200秒，预留200秒
-            return self.access_token
+            expires_in = result.get('expires_in', 7200)
+            return result['access_token'], time.time() + expires_in - 200  # 预留200秒
         else:
             raise Exception(f"获取access_token失败: {result}")
 
-    def add_draft(self, title, content, thumb_media_id=None, digest=None):
-        """添加到草稿箱"""
-        access_token = self.get_access_token()
-        url = f"https://api.weixin.qq.com/cgi-bin/draft/add?access_token={access_token}"
-        
+    def build_article(self, title, content, thumb_media_id=None, digest=None):
+        """按草稿接口的要求整理单篇图文"""
+        # 把正文图片转存到微信，未指定封面时使用第一张图片
+        if self.image_index:
+            content, cover_media_id = self.prepare_images(content, need_cover=not thumb_media_id)
+            thumb_media_id = thumb_media_id or cover_media_id
+
         # 检查是否提供了有效的thumb_media_id
         if not thumb_media_id:
             thumb_media_id = WECHAT_CONFIG['DEFAULT_THUMB_MEDIA_ID']
             
         # 如果DEFAULT_THUMB_MEDIA_ID为空或无效，则不使用thumb_media_id参数
 
-        # 处理内容长度限制
-        max_content_length = WECHAT_CONFIG['MAX_CONTENT_LENGTH']
-        if len(content) > max_content_length:
-            # 在合适的句子结束处截断
-            content = content[:max_content_length]
-            last_period = content.rfind('。')
-            if last_period > 0:
-                content = content[:last_period + 1]
-            content += "\n...(由于内容长度限制，部分内容已省略)"
-
-        # 处理摘要长度限制
-        # 微信公众号摘要(description)长度限制为120字符
-        max_digest_length = 120
-        
-        # 如果没有提供摘要，则自动生成
-        if digest is None:
-            # 清理HTML标签，只保留纯文本
-            import re
-            clean_content = re.sub(r'<[^>]+>', '', content)
-            
-            # 提取纯文本摘要
-            digest = clean_content[:max_digest_length].strip()
-            if len(digest) >= max_digest_length:
-                digest = digest[:max_digest_length-3] + "..."
-        else:
-            # 确保提供的摘要不超过长度限制
-            if len(digest) > max_digest_length:
-                digest = digest[:max_digest_length-3] + "..."
-
-        # 确保所有文本内容都被正确解码
-        try:
-            if isinstance(title, str):
-                title = title.encode('utf-8').decode('unicode_escape')
-            if isinstance(content, str):
-                content = content.encode('utf-8').decode('unicode_escape')
-            if isinstance(digest, str):
-                digest = digest.encode('utf-8').decode('unicode_escape')
-        except Exception as e:
-            print(f"Unicode解码警告: {str(e)}")
+        # 清理正文、按长度限制截断并提取摘要，一次遍历完成
+        content, auto_digest = normalize_content(
+            content, WECHAT_CONFIG['MAX_CONTENT_LENGTH'], WECHAT_CONFIG['MAX_DIGEST_LENGTH']
+        )
+        # 未提供摘要时使用正文开头的文字
+        digest = clip_digest(digest.strip(), WECHAT_CONFIG['MAX_DIGEST_LENGTH']) if digest else auto_digest
 
         article = {
-            "title": title[:64],  # 标题长度限制
+            "title": title.strip()[:WECHAT_CONFIG['MAX_TITLE_LENGTH']],
             "author": "Lxz",
-            "digest": ' ',  # 使用处理后的摘要
+            "digest": digest,
             "content": content,
             "need_open_comment": 0,
             "only_fans_can_comment": 0,
@@ -90,19 +147,147 @@ class WeChatAPI:
         if thumb_media_id and thumb_media_id != "":
             article["thumb_media_id"] = thumb_media_id
 
+        return article
+
+    def add_draft(self, title, content, thumb_media_id=None, digest=None):
+        """添加到草稿箱"""
+        article = self.build_article(title, content, thumb_media_id=thumb_media_id, digest=digest)
+        return self.post_draft([article])
+
+    def add_drafts(self, articles):
+        """批量添加到草稿箱
+
+        articles 为包含 title、content 及可选 thumb_media_id、digest 的字典列表，
+        每 MAX_ARTICLES_PER_DRAFT 篇合并为一次 draft/add 请求（一个多图文草稿）。
+        返回每个草稿的 media_id 及其包含的文章序号。
+        """
+        built = [
+            self.build_article(
+                item['title'],
+                item['content'],
+                thumb_media_id=item.get('thumb_media_id'),
+                digest=item.get('digest')
+            )
+            for item in articles
+        ]
+
+        per_draft = WECHAT_CONFIG['MAX_ARTICLES_PER_DRAFT']
+        drafts = []
+        for start in range(0, len(built), per_draft):
+            media_id = self.post_draft(built[start:start + per_draft])
+            drafts.append({
+                "media_id": media_id,
+                "articles": list(range(start, min(start + per_draft, len(built))))
+            })
+        return drafts
+
+    def post_with_token(self, path, **kwargs):
+        """携带access_token调用微信接口，token失效时刷新后重试一次，返回解析后的结果"""
+        access_token = self.get_access_token()
+        for attempt in range(2):
+            url = f"{WECHAT_CONFIG['API_BASE']}/{path}"
+            url += ('&' if '?' in path else '?') + f"access_token={access_token}"
+            try:
+                result = http_client.post('wechat', url, **kwargs).json()
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"请求失败: {str(e)}")
+
+            if attempt == 0 and result.get('errcode') in TOKEN_INVALID_ERRCODES:
+                access_token = self.get_access_token(stale_token=access_token)
+                continue
+            return result
+
+    @timed_stage('wechat_draft_add')
+    def post_draft(self, articles):
+        """调用 draft/add 提交一个草稿"""
         data = {
-            "articles": [article]
+            "articles": articles
         }
 
+        with draft_slots:
+            result = self.post_with_token('draft/add', json=data)
+
+        if 'media_id' in result:
+            return result['media_id']
+        error_msg = result.get('errmsg', '未知错误')
+        raise Exception(f"添加草稿失败: {error_msg}")
+
+    @timed_stage('wechat_upload_image')
+    def upload_image(self, data, ext):
+        """上传正文图片（media/uploadimg），返回微信图片地址"""
+        files = {'media': (f"image.{ext}", data, f"image/{'jpeg' if ext == 'jpg' else ext}")}
+        result = self.post_with_token('media/uploadimg', files=files)
+        if 'url' in result:
+            return result['url']
+        raise Exception(f"上传图片失败: {result.get('errmsg', '未知错误')}")
+
+    @timed_stage('wechat_upload_cover')
+    def upload_cover(self, data, ext):
+        """上传封面图片为永久素材，返回 media_id"""
+        files = {'media': (f"cover.{ext}", data, f"image/{'jpeg' if ext == 'jpg' else ext}")}
+        result = self.post_with_token('material/add_material?type=image', files=files)
+        if 'media_id' in result:
+            return result['media_id']
+        raise Exception(f"上传封面失败: {result.get('errmsg', '未知错误')}")
+
+    def transfer_image(self, src):
+        """下载一张图片并转存到微信，已上传过的相同内容直接复用
+
+        返回 (微信图片地址, 内容哈希, 图片数据, 扩展名)，无法转存时返回None。
+        """
         try:
-            response = requests.post(url, json=data)
-            result = response.json()
-            
-            if 'media_id' in result:
-                return result['media_id']
+            if src.startswith('data:'):
+                data = decode_data_uri(src)
+            elif urlparse(src).scheme in ('http', 'https'):
+                data = url_fetcher.fetch(src, max_bytes=IMAGE_CONFIG['MAX_BYTES']).content
             else:
-                error_msg = result.get('errmsg', '未知错误')
-                raise Exception(f"添加草稿失败: {error_msg}")
-            
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"请求失败: {str(e)}")
\ No newline at end of file
+                return None
+
+            ext = sniff_image_type(data or b'')
+            if not ext:
+                logger.warning(f"跳过不支持的图片格式: {src[:100]}")
+                return None
+
+            digest = ImageIndex.content_hash(data)
+            with self.image_index.lock(digest):
+                url, _ = self.image_index.get(digest)
+                if not url:
+                    url = self.upload_image(data, ext)
+                    self.image_index.set_url(digest, url)
+            return url, digest, data, ext
+        except Exception as e:
+            logger.warning(f"图片转存失败，保留原地址 {src[:100]}: {str(e)}")
+            return None
+
+    def prepare_images(self, content, need_cover=True):
+        """发布前处理正文图片：并发下载、按内容去重上传、改写src，并选出封面
+
+        返回 (改写后的内容, 封面media_id)；没有可用图片或无需封面时封面为None。
+        """
+        sources = [
+            src for src in find_image_sources(content)
+            if urlparse(src).hostname not in WECHAT_IMAGE_HOSTS
+        ]
+        if not sources:
+            return content, None
+
+        max_workers = max(1, min(IMAGE_CONFIG['MAX_WORKERS'], len(sources)))
+        with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(self.transfer_image, sources))
+
+        mapping = {src: result[0] for src, result in zip(sources, results) if result}
+        content = replace_image_sources(content, mapping)
+
+        cover_media_id = None
+        first = next((result for result in results if result), None)
+        if need_cover and first:
+            _, digest, data, ext = first
+            try:
+                with self.image_index.lock(digest):
+                    _, cover_media_id = self.image_index.get(digest)
+                    if not cover_media_id:
+                        cover_media_id = self.upload_cover(data, ext)
+                        self.image_index.set_media_id(digest, cover_media_id)
+            except Exception as e:
+                logger.warning(f"封面上传失败，使用默认封面: {str(e)}")
+        return content, cover_media_id